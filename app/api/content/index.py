@@ -6,7 +6,7 @@ from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFi
 import magic
 import nanoid
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import BinaryIO, Optional, List, Union
 import httpx
 import hashlib
 from datetime import datetime, timezone
@@ -14,7 +14,7 @@ import asyncio
 import validators
 import re
 from app.api.file.file import upload_file_size_is_valid, upload_file_type_is_valid, DEFAULT_UPLOAD_PATH, \
-    storage
+    storage, iter_upload
 from app import (
     settings,
 )
@@ -25,6 +25,7 @@ from app.database.repositories.knowledge_base_repository import (
 from app.database.repositories.content_repository import (
     content_repository,
 )
+from app.database.repositories.storage_blob_repository import storage_blob_repository
 from app.database.models.knowledge_base import KnowledgeBase, ContentKnowledgeBaseMapping
 from enum import Enum
 from app.database.utils import require_user
@@ -43,15 +44,18 @@ from app.services.youtube_audio_file_service import YouTubeAudioFileService
 from app.services.youtube_audio_file_service_ng import YouTubeAudioFileServiceNG
 from app.services.youtube_service import YouTubeService, YouTubeVideoInfo
 from app.workers import content as content_worker
+from app.workers import ingest as ingest_worker
+from app.workers import rag as rag_worker
 import json
 from app.services.content_processor import ContentProcessor
-import tempfile
 from mutagen import File as MutagenFile
 import urllib.parse
 from app.services.spotify_service import spotify_service
+from app.services.blob_storage import store_blob
 from app.services.twitter import TwitterService
 from sqlalchemy import update, select, and_
-from app.database.session import get_async_session
+from app.database.dataset_versions import dataset_versions
+from app.database.session import after_commit, get_async_session, unit_of_work
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/content", tags=["Content"])
@@ -185,7 +189,8 @@ async def create_content(request: CreateContentRequest):
     if existing_content:
         # Update the timestamp for existing content
         await content_repository.update(
-            content_id=existing_content.id, updated_at=datetime.utcnow()
+            content_id=existing_content.id, updated_at=datetime.utcnow(),
+            returning=False,
         )
         return success(
             data=ContentResponse.model_validate(existing_content.__dict__),
@@ -203,9 +208,9 @@ async def create_content(request: CreateContentRequest):
     )
 
     if is_youtube_url:
-        asyncio.create_task(ContentProcessor.process_youtube_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_youtube_content")
     else:
-        asyncio.create_task(ContentProcessor.process_article_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_article_content")
 
     return success(data=ContentResponse.model_validate(content.__dict__))
 
@@ -333,65 +338,58 @@ async def batch_create(items: List[MediaItem] = Body(..., description="The list
 async def _process_upload_file(
     file: UploadFile, 
     media_type: ContentMediaType,
-    audio_language: Optional[str] = None
+    audio_language: Optional[str] = None,
+    current_uri: Optional[str] = None,
 ) -> dict:
     """
     Common function to process uploaded files for content
+
+    A storage reference is taken for the returned uri; the caller releases it
+    (storage_blob_repository.release) if the content does not end up pointing at it.
     
     Args:
         file: The uploaded file
         media_type: The type of media being uploaded  
         audio_language: Optional language code for audio files
+        current_uri: The file the content already references, not referenced twice
         
     Returns:
         dict: Processing results containing file info and metadata
     """
     if not file or file.size <= 0:
         raise ValueError("Valid file must be provided")
+    if file.size > settings.content_upload_max_size:
+        raise ValueError("File size is too large.", ResponseCode.FILE_SIZE_TOO_LARGE)
     
     # Process file info
     file_type = await get_file_mime_type(file)
     file_name = file.filename
-    timestamp = int(time.time())
-    file_hash = hashlib.md5(f"{context_user.get().uid}{timestamp}{file_name}".encode()).hexdigest()
     file_extension = os.path.splitext(file_name)[1]
-    new_file_name = f"{file_hash}{file_extension}"
-    uri = os.path.join(DEFAULT_UPLOAD_PATH, f"{new_file_name}")
-    file_content = await file.read()
-    
-    # Check audio duration if needed
+
+    # Check audio duration if needed, reading the metadata straight from the spooled upload
     duration = None
     if is_audio_type(media_type):
         try:
-            with tempfile.NamedTemporaryFile(mode='wb', delete=False) as tmp_file:
-                try:
-                    tmp_file.write(file_content)
-                    tmp_file.flush()
-                    
-                    duration = get_audio_duration(tmp_file.name)
-                    if duration > settings.single_audio_max_seconds_duration:
-                        raise ValueError("Audio file duration exceeds 60 minutes limit", 
-                                        ResponseCode.SINGLE_AUDIO_EXCEEDS_DURATION_LIMIT)
-                
-                except Exception as e:
-                    logger.error(f"Failed to get audio duration: {str(e)}")
-                    raise ValueError("Failed to process audio file")
-                finally:
-                    try:
-                        os.unlink(tmp_file.name)
-                    except Exception as e:
-                        logger.warning(f"Failed to delete temporary file: {str(e)}")
-        except ValueError as e:
-            if len(e.args) > 1:
-                raise ValueError(e.args[0], e.args[1])
-            raise ValueError("Failed to process audio file")
+            await file.seek(0)
+            duration = await asyncio.to_thread(get_audio_duration, file.file)
         except Exception as e:
             logger.error(f"Failed to check audio duration: {str(e)}")
             raise ValueError("Failed to process audio file")
+        if duration > settings.single_audio_max_seconds_duration:
+            raise ValueError("Audio file duration exceeds 60 minutes limit", 
+                            ResponseCode.SINGLE_AUDIO_EXCEEDS_DURATION_LIMIT)
     
-    # Save file
-    await storage.save(uri, file_content)
-    logger.info(f"File saved to {uri}")
+    # Hash the spooled upload first (local read, enforcing the size limit), so identical
+    # files map to the same content-addressed key and are written to storage only once
+    digest = hashlib.sha256()
+    file_size = 0
+    async for chunk in iter_upload(file, settings.content_upload_max_size, digest):
+        file_size += len(chunk)
+    sha256 = digest.hexdigest()
+    uri = await store_blob(
+        sha256, file_size, file_extension, iter_upload(file, settings.content_upload_max_size),
+        current_uri=current_uri,
+    )
     
     # Extract title from filename
     title = os.path.splitext(file_name)[0]
@@ -401,6 +399,8 @@ async def _process_upload_file(
         "title": title,
         "uri": uri,
         "duration": duration,
+        "size": file_size,
+        "sha256": sha256,
         "language": is_audio_type(media_type) and normalize_language_code(audio_language) or None
     }
 
@@ -417,6 +417,7 @@ async def create_upload_and_pends(
     file: UploadFile = File(..., description="The file content to be created."),
     audio_language: Optional[str] = Form(None, description="The language of the audio file."),
 ):
+    file_data, content = None, None
     try:
         # Process uploaded file
         file_data = await _process_upload_file(file, media_type, audio_language)
@@ -438,9 +439,9 @@ async def create_upload_and_pends(
         
         # Schedule processing
         if is_audio_type(content.media_type):
-            asyncio.create_task(ContentProcessor.audio_asr(content.id))
+            ingest_worker.ingest_process.delay(content.id, "audio_asr")
         else:
-            asyncio.create_task(ContentProcessor.process_file(content.id))
+            ingest_worker.ingest_process.delay(content.id, "process_file")
 
         return success(data=ContentResponse.model_validate(content.__dict__))
     except ValueError as e:
@@ -450,6 +451,10 @@ async def create_upload_and_pends(
     except Exception as e:
         logger.error(f"Error in upload_and_pends: {str(e)}")
         return failed("Failed to process upload")
+    finally:
+        # 内容没有创建成功时释放上传登记的存储引用
+        if file_data and not content:
+            await storage_blob_repository.release(file_data["uri"])
     
 
 @router.post(
@@ -463,6 +468,7 @@ async def upload_and_pends(
     file: UploadFile = File(..., description="The file content to be created."),
     audio_language: Optional[str] = Form(None, description="The language of the audio file."),
 ):
+    existing_content, file_data, content = None, None, None
     try:
         # Validate existing content
         existing_content = await content_repository.get_by_uid(uid)
@@ -473,7 +479,9 @@ async def upload_and_pends(
             return failed("Content status is fullfilled")
         
         # Process uploaded file
-        file_data = await _process_upload_file(file, existing_content.media_type, audio_language)
+        file_data = await _process_upload_file(
+            file, existing_content.media_type, audio_language, existing_content.file_name_in_storage
+        )
         
         # Update content with file information
         content = await content_repository.update(
@@ -488,12 +496,15 @@ async def upload_and_pends(
 
         if not content:
             return failed("Failed to update content")
+
+        if existing_content.file_name_in_storage and existing_content.file_name_in_storage != file_data["uri"]:
+            await storage_blob_repository.release(existing_content.file_name_in_storage)
         
         # Schedule processing
         if is_audio_type(existing_content.media_type):
-            asyncio.create_task(ContentProcessor.audio_asr(existing_content.id))
+            ingest_worker.ingest_process.delay(existing_content.id, "audio_asr")
         else:
-            asyncio.create_task(ContentProcessor.process_file(existing_content.id))
+            ingest_worker.ingest_process.delay(existing_content.id, "process_file")
 
         return success(data=ContentResponse.model_validate(content.__dict__))
     except ValueError as e:
@@ -503,6 +514,10 @@ async def upload_and_pends(
     except Exception as e:
         logger.error(f"Error in upload_and_pends: {str(e)}")
         return failed("Failed to process upload")
+    finally:
+        # 内容没有更新成功时释放上传登记的存储引用（与原文件相同时没有新登记）
+        if file_data and not content and file_data["uri"] != existing_content.file_name_in_storage:
+            await storage_blob_repository.release(file_data["uri"])
 
 
 @router.post(
@@ -524,7 +539,8 @@ async def create_by_url(
     existing_content = await content_repository.get_by_url(url)
     if existing_content:
         await content_repository.update(
-            content_id=existing_content.id, updated_at=datetime.utcnow()
+            content_id=existing_content.id, updated_at=datetime.utcnow(),
+            returning=False,
         )
         return success(
             data=ContentResponse.model_validate(existing_content.__dict__),
@@ -560,13 +576,13 @@ async def create_by_url(
     )
 
     if is_youtube_url:
-        asyncio.create_task(ContentProcessor.process_youtube_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_youtube_content")
     elif is_spotify_url:
-        asyncio.create_task(ContentProcessor.process_spotify_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_spotify_content")
     elif is_twitter_url:
-        asyncio.create_task(ContentProcessor.process_twitter_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_twitter_content")
     else:
-        asyncio.create_task(ContentProcessor.process_article_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_article_content")
 
     return success(data=ContentResponse.model_validate(content.__dict__))
 
@@ -689,19 +705,21 @@ async def get_contents_by_uids(uids: List[str]):
     description="Retrieve content by its unique identifier (UID).",
 )
 async def get_content_by_uid(uid: str):
-    content = await content_repository.get_by_uid(uid, False)
+    # 整个请求共用一个数据库会话
+    async with unit_of_work():
+        content = await content_repository.get_by_uid(uid, False)
 
-    if not content:
-        logger.error(f"Content not found, UID: {uid}") 
-        return failed("Content not found")
-    response_data = await process_content_dict(content.__dict__, logger)
-    user = context_user.get()
-    if user:
-        belonged_kbs = await knowledge_base_repository.get_knowledge_bases_by_content_or_user(content.id, user.id)
-        # Transform the knowledge base data to match KnowledgeBaseInfo model
-        response_data["belonged_kbs"] = [
-            {"uid": kb["uid"], "name": kb["name"]} for kb in belonged_kbs
-        ] if belonged_kbs else None
+        if not content:
+            logger.error(f"Content not found, UID: {uid}") 
+            return failed("Content not found")
+        response_data = await process_content_dict(content.__dict__, logger)
+        user = context_user.get()
+        if user:
+            belonged_kbs = await knowledge_base_repository.get_knowledge_bases_by_content_or_user(content.id, user.id)
+            # Transform the knowledge base data to match KnowledgeBaseInfo model
+            response_data["belonged_kbs"] = [
+                {"uid": kb["uid"], "name": kb["name"]} for kb in belonged_kbs
+            ] if belonged_kbs else None
 
     return success(data=ContentResponse.model_validate(response_data))
 
@@ -751,7 +769,7 @@ def process_content_for_list(content: Content) -> dict:
 )
 async def get_user_contents(cursor: Optional[str] = None, limit: int = 100):
     contents, next_cursor = await content_repository.get_all_by_user_id(
-        cursor=cursor, limit=limit
+        cursor=cursor, limit=limit, list_view=True
     )
 
     response_data = UserContentsData(
@@ -792,19 +810,19 @@ async def retry_content(request: RetryContentRequest):
     )
 
     if content.media_type == ContentMediaType.video:
-        asyncio.create_task(ContentProcessor.process_youtube_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_youtube_content")
     elif is_audio_type(content.media_type):
         if content.media_type == ContentMediaType.spotify_audio:
             # 处理音频文件
-            asyncio.create_task(ContentProcessor.process_spotify_content(content.id))
+            ingest_worker.ingest_process.delay(content.id, "process_spotify_content")
         else:
-            asyncio.create_task(ContentProcessor.audio_asr(content.id))
+            ingest_worker.ingest_process.delay(content.id, "audio_asr")
     elif content.media_type == ContentMediaType.article:
-        asyncio.create_task(ContentProcessor.process_article_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_article_content")
     elif content.media_type == ContentMediaType.twitter:
-        asyncio.create_task(ContentProcessor.process_twitter_content(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_twitter_content")
     else:
-        asyncio.create_task(ContentProcessor.process_file(content.id))
+        ingest_worker.ingest_process.delay(content.id, "process_file")
 
     return success(data=ContentResponse.model_validate(content.__dict__))
 
@@ -844,9 +862,20 @@ async def delete_content(uid: str):
 
     # 执行软删除
     await content_repository.update(
-        content_id=content.id, is_deleted=True, updated_at=datetime.utcnow()
+        content_id=content.id, is_deleted=True, updated_at=datetime.utcnow(),
+        returning=False,
     )
 
+    # 包含该内容的知识库内容集合发生变化，重新生成欢迎问题
+    kbs = await knowledge_base_repository.get_knowledge_bases_by_content_ids([content.id])
+    await rag_worker.schedule_kb_welcome_questions(kbs)
+
+    # 最后一个引用释放时才删除 RAGFlow 数据集
+    if content.dataset_id:
+        rag_worker.rag_release.delay(content.id, content.dataset_id)
+    if content.file_name_in_storage:
+        await storage_blob_repository.release(content.file_name_in_storage)
+
     return success(data=ContentResponse.model_validate(content.__dict__))
 
 
@@ -884,12 +913,12 @@ def parse_subtitles(subtitles):
         logger.error(f"Failed to parse subtitles: {str(e)}")
         return None
 
-def get_audio_duration(file_path: str) -> float:
+def get_audio_duration(file_path: Union[str, BinaryIO]) -> float:
     """
     Get the duration of an audio file in seconds by reading metadata.
     
     Args:
-        file_path: Path to the audio file
+        file_path: Path to the audio file, or a seekable binary file object
         
     Returns:
         Duration in seconds as a float
@@ -966,9 +995,11 @@ async def copy_contents(request: CopyContentsRequest):
                     file_name_in_storage=content.file_name_in_storage,
                     batch_id=nanoid.generate().lower(),  # Generate a new batch ID
                 )
+                if content.file_name_in_storage:
+                    await storage_blob_repository.retain(content.file_name_in_storage)
                 
                 # Update all the fields that weren't included in the create method
-                await content_repository.update(
+                new_content = await content_repository.update(
                     content_id=new_content.id,
                     title=content.title,
                     content_hash=content.content_hash,
@@ -985,6 +1016,7 @@ async def copy_contents(request: CopyContentsRequest):
                     ai_mermaid=content.ai_mermaid,
                     ai_structure=content.ai_structure,
                     ai_tags=content.ai_tags,
+                    ai_cache_key=content.ai_cache_key,
                     media_seconds_duration=content.media_seconds_duration,
                     video_duration=content.video_duration,
                     video_embed_url=getattr(content, 'video_embed_url', None),
@@ -997,8 +1029,6 @@ async def copy_contents(request: CopyContentsRequest):
                     dataset_id=content.dataset_id
                 )
                 
-                # Refresh the content to get the updated data
-                new_content = await content_repository.get_by_id(new_content.id)
                 content_dict = await process_content_dict(new_content.__dict__, logger)
                 copied_contents.append(ContentResponse.model_validate(content_dict))
                 logger.info(f"Successfully copied content with UID {content.uid} to new content with UID {new_uid}")
@@ -1109,6 +1139,9 @@ async def edit_content(request: EditContentRequest):
                     existing_mappings_result = await session.execute(existing_mappings_query)
                     existing_mappings = existing_mappings_result.scalars().all()
                     
+                    changed_kb_ids = {mapping.knowledge_base_id for mapping in existing_mappings}
+                    changed_kb_ids.update(kb.id for kb in kbs or [])
+
                     # 将所有现有映射标记为已删除
                     for mapping in existing_mappings:
                         mapping.is_deleted = True
@@ -1153,6 +1186,10 @@ async def edit_content(request: EditContentRequest):
                 await session.rollback()
                 logger.error(f"Failed to update content and add to knowledge base: {str(e)}")
                 return failed("Failed to update content")
+
+        if request.add_to_kb_ids is not None:
+            await after_commit(dataset_versions.bump, (), changed_kb_ids)
+            rag_worker.welcome_questions_refresh.delay(kb_ids=list(changed_kb_ids))
         
         # 事务结束后，更新内容对象为最新状态（如果已更新）
         if updated_content and update_fields:
@@ -1,12 +1,15 @@
+import asyncio
 import logging
 import os
 import time
-from typing import Optional, List
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Optional, List
 from datetime import datetime
 import aiofiles
 
 import boto3
 import botocore.exceptions
+from botocore.config import Config
 import httpx
 from fastapi import APIRouter, UploadFile, status, Request, File
 from pydantic import BaseModel, Field
@@ -24,12 +27,28 @@ class ObjectStorage:
     async def save(self, uri: str, file: bytes):
         raise NotImplementedError
 
+    async def save_stream(self, uri: str, chunks: AsyncIterator[bytes]) -> int:
+        """Save a file from an async iterator of chunks, return the number of bytes written."""
+        raise NotImplementedError
+
+    async def open(self):
+        """Acquire long-lived resources, called on application startup."""
+
+    async def close(self):
+        """Release long-lived resources, called on application shutdown."""
+
     async def search(self, filename: str, uri: str = None) -> list:
         raise NotImplementedError
 
     async def download(self, uri: str) -> bytes:
         raise NotImplementedError
 
+    async def size(self, uri: str) -> int:
+        raise NotImplementedError
+
+    def stream(self, uri: str, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
     def get_url(self, uri: str) -> str:
         raise NotImplementedError
 
@@ -73,6 +92,23 @@ class LocalStorage(ObjectStorage):
             async with aiofiles.open(file_path, "wb") as f:
                 await f.write(file)
 
+    async def save_stream(self, uri, chunks):
+        file_path = os.path.join(self.root_path, uri)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        size = 0
+        try:
+            async with aiofiles.open(file_path, "wb") as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            # 不留下写了一半的文件
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        return size
+
     async def download(self, uri) -> bytes:
         file_path = os.path.join(self.root_path, uri)
         if os.path.isdir(file_path):
@@ -82,6 +118,15 @@ class LocalStorage(ObjectStorage):
         async with aiofiles.open(file_path, "r") as f:
             return await f.read()
 
+    async def size(self, uri) -> int:
+        return os.path.getsize(os.path.join(self.root_path, uri))
+
+    async def stream(self, uri, chunk_size=1024 * 1024):
+        """Read the file in chunks, only one chunk is held in memory at a time."""
+        async with aiofiles.open(os.path.join(self.root_path, uri), "rb") as f:
+            while chunk := await f.read(chunk_size):
+                yield chunk
+
     async def search(self, filename, uri=None):
         path = os.path.join(self.root_path, uri) if uri else self.root_path
         file_paths = await self._search_file(filename, path)
@@ -110,19 +155,33 @@ class LocalStorage(ObjectStorage):
 class S3Storage(ObjectStorage):
     """S3 storage implementation.
     Credentials configuration - see https://boto3.amazonaws.com/v1/documentation/api/latest/guide/quickstart.html#configuration
+
+    One S3 client (and its connection pool) is shared by all calls made on the event loop
+    that opened it: the API loop opens it on startup, a worker loop on first use. Calls from
+    any other loop fall back to a short-lived client.
     """
 
-    def __init__(self, bucket_name: str, prefix=None, endpoint_url=None):
+    # S3 要求除最后一块外每个分片至少 5 MiB
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, bucket_name: str, prefix=None, endpoint_url=None, api_endpoint_url=None,
+                 max_pool_connections: int = 50, part_size: int = 8 * 1024 * 1024):
+        self.api_endpoint_url = api_endpoint_url
         if not self._check_bucket_exist(bucket_name):
             raise RuntimeError("S3 Bucket {} not found".format(bucket_name))
         self.bucket_name = bucket_name
         self.prefix = prefix
         self.endpoint_url = endpoint_url
+        self.part_size = max(part_size, self.MIN_PART_SIZE)
         self.session = aioboto3.Session()
+        self._client_config = Config(max_pool_connections=max_pool_connections)
+        self._client = None
+        self._client_loop = None
+        self._exit_stack: Optional[AsyncExitStack] = None
 
     def _check_bucket_exist(self, bucket_name: str) -> bool:
         """Check if the bucket exists."""
-        s3 = boto3.client("s3")
+        s3 = boto3.client("s3", endpoint_url=self.api_endpoint_url)
         try:
             s3.head_bucket(Bucket=bucket_name)
             return True
@@ -134,6 +193,43 @@ class S3Storage(ObjectStorage):
                 return True
             raise e
 
+    def _new_client(self):
+        return self.session.client("s3", endpoint_url=self.api_endpoint_url, config=self._client_config)
+
+    async def open(self):
+        """Open the shared client on the running event loop."""
+        if self._client is not None:
+            return
+        exit_stack = AsyncExitStack()
+        client = await exit_stack.enter_async_context(self._new_client())
+        if self._client is not None:
+            # 并发的首次调用已经打开了共享客户端
+            await exit_stack.aclose()
+            return
+        self._client = client
+        self._client_loop = asyncio.get_running_loop()
+        self._exit_stack = exit_stack
+
+    async def close(self):
+        """Close the shared client, must run on the loop that opened it."""
+        if self._exit_stack is None:
+            return
+        exit_stack = self._exit_stack
+        self._client = None
+        self._client_loop = None
+        self._exit_stack = None
+        await exit_stack.aclose()
+
+    @asynccontextmanager
+    async def _s3(self):
+        if self._client is None:
+            await self.open()
+        if self._client_loop is asyncio.get_running_loop():
+            yield self._client
+            return
+        async with self._new_client() as s3:
+            yield s3
+
     def _get_object_key_name(self, uri: str) -> str:
         """Get the object key name."""
         if self.prefix:
@@ -142,12 +238,12 @@ class S3Storage(ObjectStorage):
 
     async def exist(self, uri: str) -> bool:
         """Check if the file exists."""
-        async with self.session.client("s3") as s3:
+        async with self._s3() as s3:
             try:
-                await s3.get_object(Bucket=self.bucket_name, Key=self._get_object_key_name(uri))
+                await s3.head_object(Bucket=self.bucket_name, Key=self._get_object_key_name(uri))
                 return True
             except botocore.exceptions.ClientError as e:
-                if e.response["Error"]["Code"] == "NoSuchKey":
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
                     return False
                 else:
                     raise e
@@ -158,16 +254,71 @@ class S3Storage(ObjectStorage):
             # Ignore folder creation
             return
 
-        async with self.session.client("s3") as s3:
+        async with self._s3() as s3:
             await s3.put_object(
                 Bucket=self.bucket_name, 
                 Key=self._get_object_key_name(uri), 
                 Body=file
             )
 
+    async def save_stream(self, uri: str, chunks: AsyncIterator[bytes]) -> int:
+        """Save file to S3 with a multipart upload, holding at most one part in memory.
+
+        Files smaller than one part are sent with a single put_object.
+        """
+        key = self._get_object_key_name(uri)
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+
+        async with self._s3() as s3:
+            try:
+                async for chunk in chunks:
+                    buffer.extend(chunk)
+                    size += len(chunk)
+                    while len(buffer) >= self.part_size:
+                        if upload_id is None:
+                            upload = await s3.create_multipart_upload(Bucket=self.bucket_name, Key=key)
+                            upload_id = upload["UploadId"]
+                        part = bytes(buffer[:self.part_size])
+                        del buffer[:self.part_size]
+                        parts.append(await self._upload_part(s3, key, upload_id, len(parts) + 1, part))
+
+                if upload_id is None:
+                    await s3.put_object(Bucket=self.bucket_name, Key=key, Body=bytes(buffer))
+                    return size
+
+                if buffer:
+                    parts.append(await self._upload_part(s3, key, upload_id, len(parts) + 1, bytes(buffer)))
+                await s3.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+                return size
+            except BaseException:
+                if upload_id is not None:
+                    try:
+                        await s3.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+                    except Exception as e:
+                        logger.warning(f"Failed to abort multipart upload of {key}: {str(e)}")
+                raise
+
+    async def _upload_part(self, s3, key: str, upload_id: str, part_number: int, body: bytes) -> dict:
+        response = await s3.upload_part(
+            Bucket=self.bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
     async def search(self, filename, uri=None) -> List[str]:
         """Search the file."""
-        async with self.session.client("s3") as s3:
+        async with self._s3() as s3:
             prefix = self._get_object_key_name(uri) if uri else ""
             response = await s3.list_objects_v2(Bucket=self.bucket_name, Prefix=prefix)
             uris = [
@@ -181,7 +332,7 @@ class S3Storage(ObjectStorage):
 
     async def download(self, uri: str) -> bytes:
         """Download the file."""
-        async with self.session.client("s3") as s3:
+        async with self._s3() as s3:
             try:
                 response = await s3.get_object(
                     Bucket=self.bucket_name, 
@@ -195,6 +346,38 @@ class S3Storage(ObjectStorage):
                 else:
                     raise e
 
+    async def size(self, uri: str) -> int:
+        """Get the size of the file in bytes."""
+        async with self._s3() as s3:
+            try:
+                response = await s3.head_object(
+                    Bucket=self.bucket_name,
+                    Key=self._get_object_key_name(uri)
+                )
+                return response["ContentLength"]
+            except botocore.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                    raise FileNotFoundError("File not found: {}".format(uri))
+                else:
+                    raise e
+
+    async def stream(self, uri: str, chunk_size: int = 1024 * 1024):
+        """Download the file in chunks, only one chunk is held in memory at a time."""
+        async with self._s3() as s3:
+            try:
+                response = await s3.get_object(
+                    Bucket=self.bucket_name,
+                    Key=self._get_object_key_name(uri)
+                )
+            except botocore.exceptions.ClientError as e:
+                if e.response["Error"]["Code"] == "NoSuchKey":
+                    raise FileNotFoundError("File not found: {}".format(uri))
+                else:
+                    raise e
+            async with response["Body"] as body:
+                while chunk := await body.read(chunk_size):
+                    yield chunk
+
     def get_url(self, uri: str) -> str:
         """Presign the URL of the file."""
         if self.endpoint_url:
@@ -215,6 +398,9 @@ elif settings.storage_type == StorageType.S3:
         bucket_name=settings.s3_bucket_name,
         prefix=settings.s3_prefix,
         endpoint_url=settings.s3_endpoint_url,
+        api_endpoint_url=settings.s3_api_endpoint_url or None,
+        max_pool_connections=settings.s3_max_pool_connections,
+        part_size=settings.s3_multipart_part_size,
     )
 else:
     raise ValueError("Invalid storage type: {}".format(settings.storage_type))
@@ -229,9 +415,15 @@ router = APIRouter(prefix="/api/files", tags=["Files"])
 
 @router.on_event("startup")
 async def startup_event():
+    await storage.open()
     await init_storage()
 
 
+@router.on_event("shutdown")
+async def shutdown_event():
+    await storage.close()
+
+
 class FileEntityResponse(BaseModel):
     url: str = Field(
         description="The URL of the uploaded file.",
@@ -274,7 +466,29 @@ def upload_file_type_is_valid(file: UploadFile, file_extensions: Optional[str] =
     return True
 
 
-def upload_file(file: UploadFile) -> dict:
+# 上传文件每次读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def iter_upload(file: UploadFile, max_size: int, digest=None,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Read an UploadFile chunk by chunk from its spooled temp file.
+    The size limit is enforced on the bytes actually read, not the declared size, and each
+    chunk is fed to digest (a hashlib object) when given.
+    """
+    await file.seek(0)
+    size = 0
+    while chunk := await file.read(chunk_size):
+        size += len(chunk)
+        if size > max_size:
+            raise ValueError("File size is too large.", ResponseCode.FILE_SIZE_TOO_LARGE)
+        if digest is not None:
+            digest.update(chunk)
+        yield chunk
+
+
+async def upload_file(file: UploadFile) -> dict:
     """
     Upload a file to the server and check if it meets certain criteria.
     :param file: The file to upload, of type UploadFile (fastapi).
@@ -293,9 +507,11 @@ def upload_file(file: UploadFile) -> dict:
     # add device id to the file name
     uri = os.path.join(DEFAULT_UPLOAD_PATH, f"{int(time.time())}-{file.filename}")
 
-    # save the file
-    file_content = file.file.read()
-    storage.save(uri, file_content)
+    # stream the file to storage
+    try:
+        await storage.save_stream(uri, iter_upload(file, settings.max_file_size))
+    except ValueError:
+        return {"code": ResponseCode.FILE_SIZE_TOO_LARGE, "message": "File size is too large.", "data": {"url": ""}}
 
     return {"code": ResponseCode.SUCCESS, "message": "File uploaded successfully.",
             "data": {"url": storage.get_url(uri)}}
@@ -312,7 +528,7 @@ def upload_file(file: UploadFile) -> dict:
     response_model=CommonResponse[UploadAndCheckFaceResponse],
 )
 async def upload_and_check_face(file: UploadFile):
-    upload_result = upload_file(file)
+    upload_result = await upload_file(file)
     logger.info(f"upload result: {upload_result}")
     if upload_result["code"] != ResponseCode.SUCCESS:
         # handle upload failed
@@ -364,7 +580,7 @@ async def upload_and_check_face(file: UploadFile):
     response_model=CommonResponse[FileEntityResponse],
 )
 async def upload(file: UploadFile) -> FileEntityResponse:
-    upload_result = upload_file(file)
+    upload_result = await upload_file(file)
 
     if upload_result["code"] != ResponseCode.SUCCESS:
         # handle error response
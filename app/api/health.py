@@ -2,6 +2,11 @@ import logging
 
 from fastapi import APIRouter, status
 
+from app.database.session import get_pool_status
+from app.libs.auth.principal_cache import principal_cache
+from app.libs.llm.rate_limit import llm_scheduler
+from app.services.chat_dataset_cache import chat_dataset_cache
+
 router = APIRouter(prefix="/api/health", tags=["Health"], include_in_schema=False)
 
 logger = logging.getLogger(__name__)
@@ -10,3 +15,22 @@ logger = logging.getLogger(__name__)
 @router.get("", status_code=status.HTTP_200_OK)
 def health():
     return {"status": "ok"}
+
+
+@router.get("/db_pool", status_code=status.HTTP_200_OK)
+def db_pool():
+    return {"status": "ok", "pool": get_pool_status()}
+
+
+@router.get("/caches", status_code=status.HTTP_200_OK)
+def caches():
+    return {
+        "status": "ok",
+        "principal": principal_cache.stats(),
+        "chat_datasets": chat_dataset_cache.stats(),
+    }
+
+
+@router.get("/llm_rate_limits", status_code=status.HTTP_200_OK)
+def llm_rate_limits():
+    return {"status": "ok", "buckets": llm_scheduler.stats()}
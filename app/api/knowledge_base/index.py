@@ -25,6 +25,7 @@ from app.database.models.content import ContentMediaType
 from app.database.models.content import ProcessingStatus
 from app.database.users_dao import user_repository
 from app.services.youtube_audio_file_service import YouTubeAudioFileService
+from app.workers import rag as rag_worker
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/kb", tags=["Knowledge Base"])
@@ -137,13 +138,15 @@ async def update_knowledge_base(request: UpdateKnowledgeBaseRequest):
         
         if error_msg:
             return failed(error_msg)
-                
+
+        # 认证缓存中的用户不含资料字段，昵称和头像从库中读取
+        owner = await user_repository.get_account_by_id(user.id)
         return success(data=KnowledgeBaseResponse.model_validate({
             **updated_kb.__dict__,
             "uid": updated_kb.uid,
             "user_uid": user.uid,
-            "user_name": get_default_nickname(user.name, user.uid) ,
-            "user_picture": get_default_avatar(user.picture)  ,
+            "user_name": get_default_nickname(owner.name if owner else None, user.uid),
+            "user_picture": get_default_avatar(owner.picture if owner else None),
             "subscriber_count": 0,
             "content_count": 0,
             "owned": True,
@@ -169,12 +172,13 @@ async def save_knowledge_base(request: CreateKnowledgeBaseRequest):
             description=request.description,
             visibility=request.visibility,
         )
+        owner = await user_repository.get_account_by_id(user.id)
         return success(data=KnowledgeBaseResponse.model_validate({
             **kb.__dict__,
             "uid": kb.uid,
             "user_uid": user.uid,
-            "user_name": get_default_nickname(user.name, user.uid),
-            "user_picture": get_default_avatar(user.picture),
+            "user_name": get_default_nickname(owner.name if owner else None, user.uid),
+            "user_picture": get_default_avatar(owner.picture if owner else None),
             "subscriber_count": 0,
             "content_count": 0,
             "owned": True,
@@ -384,6 +388,7 @@ async def add_contents_to_kb(request: ContentToKnowledgeBaseRequest):
                 kb_id=kb.id,
                 user_id=user.id,
             )
+            rag_worker.welcome_questions_refresh.delay(kb_ids=[kb.id])
 
         return success(data={
             "total": len(unique_content_uids),
@@ -438,6 +443,7 @@ async def remove_content_from_kb(request: ContentToKnowledgeBaseRequest):
                 kb_id=kb.id,
                 user_id=user.id,
             )
+            rag_worker.welcome_questions_refresh.delay(kb_ids=[kb.id])
 
         return success(data={
             "total": len(unique_content_uids),
@@ -470,7 +476,7 @@ async def get_kb_contents(kb_uid: str, offset: int = 0, limit: int = 20):
             limit=limit,
         )
 
-        contents = await content_repository.get_by_ids(content_ids)
+        contents = await content_repository.get_by_ids(content_ids, list_view=True)
         
         return success(data=[
             ContentResponse.model_validate(process_content_for_list(content))
@@ -26,13 +26,26 @@ from app.database.models.knowledge_base import KnowledgeBase
 from app.database.repositories.knowledge_base_repository import knowledge_base_repository, content_kb_mapping_repository
 from app.database.repositories.content_repository import content_repository
 from app.database.repositories.chat_repository import chat_assistant_repository, session_record_repository
+from app.database.session import unit_of_work
 from app.api.file.file import storage
 from app.libs.rag import rag_object
 from app.libs.rag.rag_utils import rag_utils
 from app.libs.rag.document_chat import DocumentChat, create_document_chat
+from app.services.chat_dataset_cache import chat_dataset_cache
+from app.services.welcome_questions import DEFAULT_WELCOME_QUESTIONS, welcome_questions
 from app.workers import rag as rag_worker
 import asyncio
 logger = logging.getLogger(__name__)
+
+# 引用补全只需要的内容列
+REFERENCE_COLUMNS = (
+    Content.dataset_id,
+    Content.dataset_doc_id,
+    Content.source,
+    Content.uid,
+    Content.title,
+    Content.media_type,
+)
 # Initialize RAGFlow client and RAG helper
 
 
@@ -45,6 +58,8 @@ class CompletionStatus(str, Enum):
     COMPLETED = "completed"    # 完成
     ERROR = "error"           # 错误
     FOLOWUP_PREPARING = "followup_preparing"  # 准备 followup_question
+    REFERENCE_READY = "reference_ready"  # 引用丰富完成
+    FOLLOWUP_READY = "followup_ready"  # followup_question 生成完成
 
 class ChatSessionsResponse(BaseModel):
     sessions: List[Dict]
@@ -193,14 +208,13 @@ def filter_processed_articles(articles: list[Content]) -> list[Content]:
 async def get_user_all_dataset_ids() -> Tuple[List[str], int]:
     """Get all dataset IDs from user's content"""
     try:
-        articles = await content_repository.get_all_rag_read_or_processing_content_without_pagination()
-    
-        dataset_ids = []
-        for article in articles:
-            if article.dataset_id and article.rag_status == RAGProcessingStatus.completed:
-                dataset_ids.append(article.dataset_id)
-
-        return dataset_ids, len(articles)
+        user = context_user.get()
+        return await chat_dataset_cache.get_or_load(
+            user.id,
+            ChatStartType.INBOX.value,
+            None,
+            lambda: content_repository.get_rag_dataset_ids(user.id),
+        )
     except Exception as e:
         logger.error(f"Error getting dataset IDs: {str(e)}")
         return [], 0
@@ -208,37 +222,30 @@ async def get_user_all_dataset_ids() -> Tuple[List[str], int]:
 async def get_user_database_dataset_ids() -> Tuple[List[str], int]:
     """Get all dataset IDs from user's content"""
     try:
-        articles = await knowledge_base_repository.get_kb_contents_from_owned_and_subscribed()
-        dataset_ids = []
-
-        processed_articles = filter_processed_articles(articles)
-
-        for article in articles:
-            if article.dataset_id and article.rag_status == RAGProcessingStatus.completed:
-                dataset_ids.append(article.dataset_id)
-        return dataset_ids, len(articles)
+        user = context_user.get()
+        return await chat_dataset_cache.get_or_load(
+            user.id,
+            ChatStartType.MY_KNOWLEDGE_BASES.value,
+            None,
+            lambda: knowledge_base_repository.get_dataset_ids_from_owned_and_subscribed(user.id),
+            kb_ids_loader=lambda: knowledge_base_repository.get_user_knowledge_base_ids(user.id),
+        )
     except Exception as e:
         logger.error(f"Error getting dataset IDs: {str(e)}")
-        return []
+        return [], 0
     
 async def get_user_single_dataset_ids(kb_id: int) -> Tuple[List[str], int]:
     try:
-        content_ids, _ = await content_kb_mapping_repository.get_knowledge_base_contents(
-            kb_id=kb_id,
-            offset=0,
-            limit=1000,
+        user = context_user.get()
+        return await chat_dataset_cache.get_or_load(
+            user.id,
+            ChatStartType.SINGLE_KNOWLEDGE_BASE.value,
+            kb_id,
+            lambda: content_kb_mapping_repository.get_knowledge_base_dataset_ids(kb_id),
         )
-
-        contents = await content_repository.get_by_ids(content_ids)
-        processed_contents = filter_processed_articles(contents)
-        dataset_ids = []
-        for content in processed_contents:
-            if content.dataset_id and content.rag_status == RAGProcessingStatus.completed:
-                dataset_ids.append(content.dataset_id)
-        return dataset_ids, len(processed_contents)
     except Exception as e:
         logger.error(f"Error getting dataset IDs: {str(e)}")
-        return []
+        return [], 0
 
 def get_references_str(references: List[dict]) -> str:
     """
@@ -268,12 +275,13 @@ def get_references_str(references: List[dict]) -> str:
     return "\n".join(reference_str)
 
 
-async def enrich_references(chunk_reference):
+async def enrich_references(chunk_reference, user_id: Optional[int] = None):
     """
     获取并丰富引用内容的信息，只包含标题、媒体类型和页面URL
 
     Args:
         chunk_reference: 原始引用列表
+        user_id: 当前用户，共享文档的引用优先对应该用户自己的内容
 
     Returns:
         list: 包含内容信息的引用列表
@@ -293,13 +301,14 @@ async def enrich_references(chunk_reference):
         enriched_references = []
 
         if len(reference_pairs) > 0:
-            contents = await content_repository.get_by_dataset_pairs(reference_pairs)
+            contents = await content_repository.get_by_dataset_pairs(
+                reference_pairs, columns=REFERENCE_COLUMNS, user_id=user_id
+            )
 
-            # 创建 dataset_id 和 document_id 到 content 的映射
-            content_map = {
-                (content.dataset_id, content.dataset_doc_id): content
-                for content in contents
-            }
+            # 创建 dataset_id 和 document_id 到 content 的映射，每个对保留排在最前的内容
+            content_map = {}
+            for content in contents:
+                content_map.setdefault((content.dataset_id, content.dataset_doc_id), content)
 
             # 为每个引用添加内容信息
             for ref in chunk_reference:
@@ -380,6 +389,104 @@ def generate_chat_response(
     return json.dumps(response) + '\n'
 
 
+def _reference_key(reference: List[dict]) -> tuple:
+    return tuple((ref.get('id'), ref.get('dataset_id'), ref.get('document_id')) for ref in reference)
+
+
+class ReferenceEnricher:
+    """
+    推测性引用丰富：流中第一次出现 reference 时就在后台启动 enrich_references，
+    之后引用发生变化才取消并重新启动，answer 结束时结果通常已经就绪。
+    """
+
+    def __init__(self, user_id: Optional[int] = None):
+        self._user_id = user_id
+        self._key = None
+        self._task: Optional[asyncio.Task] = None
+
+    def feed(self, reference: Optional[List[dict]]):
+        if not reference:
+            return
+        key = _reference_key(reference)
+        if key == self._key:
+            return
+        self.cancel()
+        self._key = key
+        self._task = asyncio.create_task(enrich_references(reference, self._user_id))
+
+    async def result(self, reference: Optional[List[dict]]) -> Optional[List[dict]]:
+        self.feed(reference)
+        if not reference or self._task is None:
+            return None
+        return await self._task
+
+    def cancel(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+
+async def finalize_chat_response(
+    content: str,
+    reference: Optional[List[dict]],
+    question: str,
+    msg_id: str,
+    enricher: ReferenceEnricher,
+):
+    """
+    answer 流结束后并发完成引用丰富和 followup 生成。
+
+    先发送 FOLOWUP_PREPARING 标记 answer 已完整；引用和 followup_question 谁先完成谁先以
+    REFERENCE_READY / FOLLOWUP_READY 单独发送；最后的 COMPLETED 仍包含全部信息，兼容只读取最终事件的客户端。
+    """
+    yield generate_chat_response(
+        content=content,
+        reference=None,  # 此时还没有丰富的引用
+        status=CompletionStatus.FOLOWUP_PREPARING,
+        msg_id=msg_id,
+        followup_question=[]
+    )
+
+    reference_str = get_references_str(reference) if reference else None
+    reference_task = asyncio.create_task(enricher.result(reference))
+    followup_task = asyncio.create_task(generate_followup_questions(reference_str, question, content))
+    enriched_references = None
+    follow_up_question = []
+    try:
+        pending = {reference_task, followup_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if reference_task in done:
+                enriched_references = reference_task.result()
+                yield generate_chat_response(
+                    content=content,
+                    reference=enriched_references,
+                    status=CompletionStatus.REFERENCE_READY,
+                    msg_id=msg_id
+                )
+            if followup_task in done:
+                follow_up_question = followup_task.result()
+                yield generate_chat_response(
+                    content=content,
+                    status=CompletionStatus.FOLLOWUP_READY,
+                    msg_id=msg_id,
+                    followup_question=follow_up_question
+                )
+    finally:
+        # 客户端断开或出错时不留下后台任务
+        for task in (reference_task, followup_task):
+            if not task.done():
+                task.cancel()
+        enricher.cancel()
+
+    yield generate_chat_response(
+        content=content,
+        reference=enriched_references,
+        status=CompletionStatus.COMPLETED,
+        msg_id=msg_id,
+        followup_question=follow_up_question
+    )
+
+
 @router.get("/chat_available_status", 
     response_model=CommonResponse[KBProcessingStatusResponse]
 )
@@ -427,9 +534,28 @@ async def welcome_follow_up_question(
     chat_start_type: Optional[ChatStartType] = Body(None, embed=True),
     uid: Optional[str] = Body(None, embed=True)
 ):
-    """Get welcome message"""
-    
-    return success(data=WelcomeFollowUpQuestionResponse(followup_question=["你好，我是你的助手，有什么可以帮你的吗？", "hello world", "have a good day"]))
+    """Get welcome message
+
+    Questions are precomputed per content and knowledge base by the RAG worker and served
+    from Redis; on a miss the refresh is scheduled and the default questions are returned.
+    """
+    questions = None
+    user = context_user.get()
+    if chat_start_type == ChatStartType.ARTICLE and uid:
+        # 问题由内容摘要生成，只对有权访问该内容的用户返回或触发生成
+        content = await knowledge_base_repository.get_content_with_check_access(uid, user.id if user else None)
+        if content:
+            questions = await welcome_questions.get("content", uid)
+            if questions is None and await welcome_questions.claim_refresh("content", uid):
+                rag_worker.welcome_questions_refresh.delay(content_ids=[content.id])
+    elif chat_start_type == ChatStartType.SINGLE_KNOWLEDGE_BASE and uid:
+        kb = await knowledge_base_repository.get_basic_with_check_access(uid, user.id if user else None)
+        if kb:
+            questions = await welcome_questions.get("kb", uid)
+            if questions is None:
+                await rag_worker.schedule_kb_welcome_questions([kb])
+
+    return success(data=WelcomeFollowUpQuestionResponse(followup_question=questions or DEFAULT_WELCOME_QUESTIONS))
 
 
 async def handle_session_lookup(chat_start_type: ChatStartType, uid: Optional[str]) -> Tuple[Optional[SessionRecord], Optional[any]]:
@@ -468,40 +594,27 @@ async def process_agent_response(response, msg_id: str, reference_str: Optional[
     """Process streaming response from agent"""
     content = ""
     reference = None
-    
-    # Stream processing chunks
-    for chunk in response:
-        if chunk:
-            content = chunk.content
-            reference = chunk.reference if hasattr(chunk, 'reference') else None
-            yield generate_chat_response(
-                content=content,
-                reference=None,
-                status=CompletionStatus.PROCESSING,
-                msg_id=msg_id
-            )
-    
-    # Signal that followup questions are being prepared
-    yield generate_chat_response(
-        content=content,
-        reference=None,
-        status=CompletionStatus.FOLOWUP_PREPARING,
-        msg_id=msg_id
-    )
-    
-    # Enrich references and generate followup questions
-    enriched_references = await enrich_references(reference) if reference else None
-    reference_str = get_references_str(reference) if reference else None
-    follow_up_question = await generate_followup_questions(reference_str, question, content)
-    
-    # Final response with all data
-    yield generate_chat_response(
-        content=content,
-        reference=enriched_references,
-        status=CompletionStatus.COMPLETED,
-        msg_id=msg_id,
-        followup_question=follow_up_question
-    )
+    enricher = ReferenceEnricher(context_user.get().id)
+
+    try:
+        # Stream processing chunks
+        async for chunk in response:
+            if chunk:
+                content = chunk.content
+                reference = chunk.reference if hasattr(chunk, 'reference') else None
+                enricher.feed(reference)
+                yield generate_chat_response(
+                    content=content,
+                    reference=None,
+                    status=CompletionStatus.PROCESSING,
+                    msg_id=msg_id
+                )
+
+        # Enrich references and generate followup questions concurrently
+        async for event in finalize_chat_response(content, reference, question, msg_id, enricher):
+            yield event
+    finally:
+        enricher.cancel()
 
 @router.post("/stream_agent_chat")
 async def stream_agent_chat(
@@ -517,7 +630,8 @@ async def stream_agent_chat(
     async def response_generator():
         try:
             # Get existing session based on chat type
-            session_in_db, search_item = await handle_session_lookup(chat_start_type, uid)
+            async with unit_of_work():
+                session_in_db, search_item = await handle_session_lookup(chat_start_type, uid)
 
             
             # Handle KB not found error for SINGLE_KNOWLEDGE_BASE type
@@ -539,9 +653,10 @@ async def stream_agent_chat(
             
             try:
                 # Get datasets and context for chat
-                dataset_ids, assistant_name, content, knowledgeBase, total_size_when_ready = await get_datasets_for_chat(
-                    chat_start_type, uid
-                )
+                async with unit_of_work():
+                    dataset_ids, assistant_name, content, knowledgeBase, total_size_when_ready = await get_datasets_for_chat(
+                        chat_start_type, uid
+                    )
             except ValueError as e:
                 yield generate_chat_response(
                     status=CompletionStatus.ERROR,
@@ -598,9 +713,8 @@ async def stream_agent_chat(
                     agent_id=agent.id
                 )
 
-            # Run question in thread and process response
-            ask_fn = lambda: new_session.ask(question, stream=True)
-            response = await asyncio.to_thread(ask_fn)
+            # Consume the SSE stream directly on the event loop
+            response = new_session.ask(question, stream=True)
             
             # Process streaming response
             async for chunk in process_agent_response(response, msg_id, None, question):
@@ -640,9 +754,10 @@ async def stream_rag_chat(
         try:
             # Get datasets and assistant/session information
             try:
-                dataset_ids, assistant_name, content, knowledgeBase, total_size_when_ready = await get_datasets_for_chat(
-                    chat_start_type, uid
-                )
+                async with unit_of_work():
+                    dataset_ids, assistant_name, content, knowledgeBase, total_size_when_ready = await get_datasets_for_chat(
+                        chat_start_type, uid
+                    )
             except ValueError as e:
                 yield generate_chat_response(
                     status=CompletionStatus.ERROR,
@@ -682,11 +797,13 @@ async def stream_rag_chat(
             # Get response from RAG chat
             response = await doc_chat.chat(question, stream=True)
             
+            enricher = ReferenceEnricher(context_user.get().id)
             try:
                 last_chunk = None
                 logger.info(f"Response: start generate")
                 async for chunk in response:
                     try:
+                        enricher.feed(getattr(chunk, 'reference', None))
                         if last_chunk is not None:
                             yield generate_chat_response(
                                 content=last_chunk.content,
@@ -706,30 +823,15 @@ async def stream_rag_chat(
                 
                 if last_chunk is not None:
                     try:
-                        # 首先发送 FOLLOWUP_PREPARING 状态
-                        yield generate_chat_response(
-                            content=last_chunk.content,
-                            reference=None,  # 此时还没有丰富的引用
-                            status=CompletionStatus.FOLOWUP_PREPARING,
-                            msg_id=msg_id,
-                            followup_question=[]
-                        )
-
-                        # 然后进行引用丰富
-                        enriched_references = await enrich_references(last_chunk.reference) if hasattr(last_chunk, 'reference') else None
-                        reference_str = get_references_str(last_chunk.reference) if hasattr(last_chunk, 'reference') else None
-                        # 生成 followup_question
-
-                        follow_up_question = await generate_followup_questions(reference_str, question, last_chunk.content)
-
-                        # 最后发送 COMPLETED 状态，并包含完整信息
-                        yield generate_chat_response(
-                            content=last_chunk.content,
-                            reference=enriched_references,
-                            status=CompletionStatus.COMPLETED,
-                            msg_id=msg_id,
-                            followup_question= follow_up_question
-                        )
+                        # 引用丰富（通常已推测性启动）与 followup 生成并发，结果分别发送
+                        async for event in finalize_chat_response(
+                            last_chunk.content,
+                            getattr(last_chunk, 'reference', None),
+                            question,
+                            msg_id,
+                            enricher,
+                        ):
+                            yield event
                     except Exception as e:
                         logger.error(f"Error processing final chunk: {str(e)}")
                         yield generate_chat_response(
@@ -744,6 +846,8 @@ async def stream_rag_chat(
                     error_message="We're experiencing technical difficulties processing your question. Please try again later.",
                     msg_id=msg_id
                 )
+            finally:
+                enricher.cancel()
                 
         except Exception as e:
             logger.error(f"RAG chat error: {str(e)}")
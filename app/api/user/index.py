@@ -113,7 +113,10 @@ def enrich_user_profile(user_dict: dict) -> dict:
     response_model=CommonResponse[UserInfoResponse],
 )
 async def get_user():
-    user = context_user.get()
+    # 认证缓存只保存精简快照，资料字段从库中读取
+    user = await user_repository.get_account_by_id(context_user.get().id)
+    if not user:
+        return failed("User not found")
 
     # 并行获取统计信息
     stats_data = await content_repository.get_user_content_stats()
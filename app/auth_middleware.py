@@ -1,12 +1,13 @@
-from typing import List
+from typing import List, Optional
 
 from starlette import status
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 
 from app.context import context_user, context_device_id
-from app.database.users_dao import user_repository
+from app.database.users_dao import UserModel, user_repository
 from app.libs.auth.auth_utils import decode_jwt_token
+from app.libs.auth.principal_cache import principal_cache
 
 jwt_protected_paths: List[str] = [
     "/api/",
@@ -85,25 +86,32 @@ class FlexibleAuthMiddleware:
                     await response(scope, receive, send)
                     return
 
-                payload = decode_jwt_token(token)
-                if payload is None:
-                    response = JSONResponse(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        content={"detail": "Invalid token or token expired"},
-                    )
-                    self._add_cors_headers(response)
-                    await response(scope, receive, send)
-                    return
-
-                user = await user_repository.get_account_by_id(payload["sub"])
-                if not user:
-                    response = JSONResponse(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        content={"detail": "User not found"},
-                    )
-                    self._add_cors_headers(response)
-                    await response(scope, receive, send)
-                    return
+                digest = principal_cache.digest(token)
+                cached = principal_cache.get(digest)
+                if cached:
+                    # 命中缓存：不解码 JWT，也不查库
+                    payload, user_snapshot = cached
+                    user = UserModel.from_snapshot(user_snapshot)
+                else:
+                    payload = decode_jwt_token(token)
+                    if payload is None:
+                        response = JSONResponse(
+                            status_code=status.HTTP_401_UNAUTHORIZED,
+                            content={"detail": "Invalid token or token expired"},
+                        )
+                        self._add_cors_headers(response)
+                        await response(scope, receive, send)
+                        return
+
+                    user = await self._load_user(payload["sub"], digest, payload)
+                    if not user:
+                        response = JSONResponse(
+                            status_code=status.HTTP_401_UNAUTHORIZED,
+                            content={"detail": "User not found"},
+                        )
+                        self._add_cors_headers(response)
+                        await response(scope, receive, send)
+                        return
 
                 # 设置用户ID
                 context_user.set(user)
@@ -114,6 +122,21 @@ class FlexibleAuthMiddleware:
 
         await self.app(scope, receive, send)
 
+    @staticmethod
+    async def _load_user(user_id: int, digest: str, payload: dict) -> Optional[UserModel]:
+        """缓存未命中：先读 Redis 共享快照，再查库，并写回缓存"""
+        generation = principal_cache.generation(user_id)
+        user_snapshot = await principal_cache.get_user_snapshot(user_id)
+        if user_snapshot is None:
+            user = await user_repository.get_account_by_id(user_id)
+            if not user:
+                return None
+            user_snapshot = user.to_snapshot()
+            if principal_cache.generation(user_id) == generation:
+                await principal_cache.set_user_snapshot(user_snapshot)
+        principal_cache.set(digest, payload, user_snapshot, generation)
+        return UserModel.from_snapshot(user_snapshot)
+
     @staticmethod
     def _add_cors_headers(response):
         response.headers["Access-Control-Allow-Origin"] = "*"  # 替换成你的前端地址
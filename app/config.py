@@ -52,6 +52,7 @@ class ApplicationSettings(BaseSettings):
 
     # storage
     max_file_size: int = 1024 * 1024 * 5  # 5MB
+    content_upload_max_size: int = 1024 * 1024 * 512  # 512MB，内容上传（音频、文档）
     allowed_extensions: Optional[str] = None
     storage_type: StorageType = StorageType.LOCAL
     local_storage_path: str = "./data"
@@ -59,6 +60,10 @@ class ApplicationSettings(BaseSettings):
     s3_bucket_name: Optional[str] = None
     s3_prefix: Optional[str] = None
     s3_endpoint_url: Optional[str] = None
+    # S3 API 地址，留空使用 AWS 默认地址；本地可指向 moto / MinIO
+    s3_api_endpoint_url: Optional[str] = None
+    s3_max_pool_connections: int = 50
+    s3_multipart_part_size: int = 8 * 1024 * 1024
 
     # Modelscope
     ms_api_url: str = "http://10.255.8.188:8000"
@@ -69,6 +74,11 @@ class ApplicationSettings(BaseSettings):
     # database
     jdbc_url: str = "sqlite:///./data/db.sqlite3"
     redis_url: str = "redis://localhost:6379/0"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 600
+    db_pool_pre_ping: bool = True
 
     # user
     audio_api_url: str = "http://127.0.0.1:5000"
@@ -108,6 +118,21 @@ class ApplicationSettings(BaseSettings):
 
     celery_broker_url: str = "redis://localhost:6379/0"
     celery_result_backend: str = "redis://localhost:6379/0"
+    # 每个 worker 进程事件循环上同时运行的任务数
+    worker_async_concurrency: int = 16
+    # ingest_queue 中每种媒体类型在单个 worker 进程内的并发上限
+    ingest_concurrency_limits: dict = {"audio": 2, "video": 4, "file": 4, "article": 8, "twitter": 8}
+    # 媒体类型已满时任务重新投递的延迟秒数，不占用 worker 线程等待
+    ingest_requeue_countdown: int = 5
+    # 媒体类型已满时最多重新投递的次数，用尽后阻塞等待名额
+    ingest_requeue_max_retries: int = 60
+    # 每个进程内按 "provider/model" 配置的 LLM 每分钟请求数，未配置的模型不限流
+    llm_rate_limits: dict = {"google/gemini-2.0-flash": 600}
+    llm_rate_limit_burst: int = 10
+    # 一次 LLM 调用生成摘要、导图、推荐理由和标签，解析失败时逐项回退
+    content_ai_combined_mode: bool = False
+    # AI 结果合并写入的最长等待秒数，<=0 表示只在任务结束时写入一次
+    content_ai_write_max_latency: float = 5.0
 
     ainee_agent_id: int = 1
 
@@ -135,6 +160,29 @@ class ApplicationSettings(BaseSettings):
 
     ragflow_key: str = ""
     ragflow_base: str = ""
+    ragflow_pool_size: int = 20
+    ragflow_connect_timeout: float = 5
+    ragflow_read_timeout: float = 60
+    ragflow_max_retries: int = 3
+    # 批量 RAG 入库：每个任务的内容数和并发上传数
+    rag_batch_size: int = 20
+    rag_batch_concurrency: int = 8
+    # 对话数据集 ID 缓存，按 Redis 中的版本号失效，TTL 兜底
+    chat_dataset_cache_ttl: int = 300
+    chat_dataset_cache_max_entries: int = 10000
+    # RAGFlow 助手/agent/会话句柄缓存
+    rag_handle_cache_ttl: int = 300
+    rag_handle_cache_max_entries: int = 10000
+    # 欢迎问题缓存：保留时间和生成时参考的知识库内容数
+    welcome_questions_ttl: int = 30 * 24 * 3600
+    welcome_questions_context_items: int = 20
+    # 知识库欢迎问题刷新的去抖秒数，需小于 pending 键的 600 秒有效期
+    welcome_questions_kb_debounce: int = 60
+    # 认证身份缓存：进程内 TTL/容量，可选 Redis 共享用户快照
+    auth_principal_cache_ttl: int = 60
+    auth_principal_cache_max_entries: int = 50000
+    auth_principal_cache_redis_enabled: bool = False
+    auth_principal_cache_redis_ttl: int = 600
 
     tavily_api_key: str = ""
 
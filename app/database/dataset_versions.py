@@ -0,0 +1,84 @@
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from app import settings
+from app.database.models.knowledge_base import ContentKnowledgeBaseMapping
+from app.database.session import get_async_session
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetVersions:
+    """
+    Version counters of the dataset-id sets chats are started with.
+
+    Kept in Redis so that writes from the API and the Celery workers invalidate the
+    in-process caches of every API process. Counters are scoped so that a change only
+    invalidates the chats it affects:
+
+    - user: readiness of the user's own contents (inbox chats)
+    - kb: contents of one knowledge base (membership and readiness of its contents)
+    - member: the set of knowledge bases a user owns or subscribes to
+    """
+
+    USER_KEY = "chat_datasets:version:user:{}"
+    KB_KEY = "chat_datasets:version:kb:{}"
+    MEMBER_KEY = "chat_datasets:version:member:{}"
+
+    def __init__(self, redis_url: str):
+        self._redis = redis.from_url(redis_url)
+
+    async def get(
+        self, user_id: Optional[int] = None, member_id: Optional[int] = None, kb_ids: Iterable[int] = ()
+    ) -> Optional[Tuple[int, ...]]:
+        """Versions of the requested counters in (user, member, *kbs) order, None if Redis is unavailable"""
+        keys = []
+        if user_id is not None:
+            keys.append(self.USER_KEY.format(user_id))
+        if member_id is not None:
+            keys.append(self.MEMBER_KEY.format(member_id))
+        keys.extend(self.KB_KEY.format(kb_id) for kb_id in kb_ids)
+        if not keys:
+            return ()
+        try:
+            return tuple(int(value or 0) for value in await self._redis.mget(keys))
+        except Exception as e:
+            logger.warning(f"Failed to read chat dataset versions: {str(e)}")
+            return None
+
+    async def bump(self, user_ids: Iterable[int] = (), kb_ids: Iterable[int] = (), member_ids: Iterable[int] = ()):
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for user_id in set(user_ids):
+                    pipe.incr(self.USER_KEY.format(user_id))
+                for kb_id in set(kb_ids):
+                    pipe.incr(self.KB_KEY.format(kb_id))
+                for member_id in set(member_ids):
+                    pipe.incr(self.MEMBER_KEY.format(member_id))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to bump chat dataset versions: {str(e)}")
+
+    async def bump_contents(self, content_ids: Iterable[int], user_ids: Iterable[int] = ()):
+        """Bump the owners of changed contents and the knowledge bases the contents are mapped to"""
+        content_ids = list(set(content_ids))
+        kb_ids: List[int] = []
+        if content_ids:
+            try:
+                async with get_async_session() as session:
+                    result = await session.execute(
+                        select(ContentKnowledgeBaseMapping.knowledge_base_id).where(
+                            ContentKnowledgeBaseMapping.content_id.in_(content_ids),
+                            ContentKnowledgeBaseMapping.is_deleted == False,
+                        ).distinct()
+                    )
+                    kb_ids = list(result.scalars().all())
+            except Exception as e:
+                logger.warning(f"Failed to load knowledge bases of changed contents: {str(e)}")
+        await self.bump(user_ids=user_ids, kb_ids=kb_ids)
+
+
+dataset_versions = DatasetVersions(settings.redis_url)
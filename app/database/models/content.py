@@ -93,7 +93,7 @@ class Content(Base):
     video_embed_url = Column(String(2048), nullable=True)  # 视频嵌入地址
     raw_description = Column(String, nullable=True)  # 视频描述
     raw_description = Column(String, nullable=True)  # 从 spotify 或者 youtube 网页获取的原始描述信息
-    file_name_in_storage = Column(String(255), nullable=True)  # 文件在存储中的名称
+    file_name_in_storage = Column(String(255), nullable=True, index=True)  # 文件在存储中的名称
     file_type = Column(String(50), nullable=True)  # 文件类型
     audio_subtitles = Column(JSON, nullable=True)  # 音频字幕，存储为JSON格式
     batch_id = Column(String(50), nullable=True, comment="用于标识批量任务的唯一ID")  # 新增 batch_id 字段
@@ -101,4 +101,5 @@ class Content(Base):
     dataset_doc_id = Column(String(50), nullable=True, comment="用于标识在数据集中唯一 DOC ID")  # 新增 dataset_id 字段
     rag_status = Column(Enum(RAGProcessingStatus, name='rag_processing_status'), nullable=True, default=RAGProcessingStatus.waiting_init, comment="RAG处理状态")
     image_ocr = Column(String, nullable=True)  # 图片的OCR结果
+    ai_cache_key = Column(String(64), nullable=True, index=True, comment="AI 产物缓存键：内容哈希 + 模型 + 提示词版本")
 
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, BigInteger, String, TIMESTAMP
+from sqlalchemy.sql import func
+from app.database.session import Base
+
+
+class StorageBlob(Base):
+    """按 SHA-256 寻址的存储对象，ref_count 为引用它的内容数"""
+    __tablename__ = "storage_blobs"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), nullable=False, unique=True)
+    uri = Column(String(255), nullable=False, unique=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    source_key = Column(String(255), nullable=True, index=True, comment="外部来源标识，如 spotify:{episode_id}")
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -1,18 +1,59 @@
 from enum import Enum
 from operator import and_
 from sqlalchemy import or_, select, update, func
-from app.database.session import get_async_session
+from sqlalchemy.orm import defer
+from app.database.dataset_versions import dataset_versions
+from app.database.session import after_commit, get_async_session
 from app.database.models.content import Content, ContentMediaType, ProcessingStatus, RAGProcessingStatus
 from app.database.models.annotation import Annotation
 from app.database.utils import require_user
 from app.context import context_user
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 影响对话可用数据集集合的字段，更新后需要刷新 dataset_versions
+CHAT_DATASET_FIELDS = frozenset({"rag_status", "dataset_id", "dataset_doc_id", "processing_status", "is_deleted"})
+
+# 列表视图不返回的大字段（process_content_for_list 会丢弃或置空）
+LIST_VIEW_DEFERRED_COLUMNS = (
+    Content.content,
+    Content.text_content,
+    Content.media_subtitles,
+    Content.ai_structure,
+    Content.ai_mermaid,
+)
+
+
+def list_view_options() -> list:
+    """
+    列表视图的加载选项：大字段延迟加载，且访问时直接报错，
+    避免在会话关闭后触发懒加载或悄悄多出一次查询
+    """
+    return [defer(column, raiseload=True) for column in LIST_VIEW_DEFERRED_COLUMNS]
+
+
+def select_contents(columns: Optional[Sequence] = None, list_view: bool = False):
+    """
+    内容查询的投影层：
+    - columns 给定时只查询这些列，结果为轻量 Row（按列名取属性）
+    - list_view 时返回 Content 对象，但不加载 LIST_VIEW_DEFERRED_COLUMNS
+    - 否则加载完整的 Content 对象
+    """
+    if columns:
+        return select(*columns)
+    query = select(Content)
+    if list_view:
+        query = query.options(*list_view_options())
+    return query
+
+
+def fetch_contents(result, columns: Optional[Sequence] = None) -> list:
+    return list(result.all()) if columns else list(result.scalars().all())
+
 
 class ContentRepository:
     @staticmethod
@@ -91,34 +132,55 @@ class ContentRepository:
                 update(Content)
                 .where(Content.id == content_id)
                 .values(processing_status=status)
+                .returning(Content.id, Content.user_id)
             )
+            rows = result.all()
             await session.commit()
-            return result.rowcount > 0
+        await after_commit(
+            dataset_versions.bump_contents, [row.id for row in rows], [row.user_id for row in rows]
+        )
+        return len(rows) > 0
 
     @staticmethod
-    async def update(content_id: int, **kwargs) -> Content | None:
-        """更新内容记录并返回更新后的数据"""
+    async def update(content_id: int, returning: bool = True, **kwargs) -> Content | bool | None:
+        """
+        更新内容记录
+
+        returning=True 时通过 UPDATE ... RETURNING 在同一次往返中取回更新后的数据，
+        不再额外执行 SELECT；returning=False 用于只写状态、不关心结果的调用，
+        仅返回是否有记录被更新
+        """
+        bump_versions = not CHAT_DATASET_FIELDS.isdisjoint(kwargs)
+        stmt = update(Content).where(Content.id == content_id).values(**kwargs)
+
+        if not returning:
+            if not bump_versions:
+                async with get_async_session() as session:
+                    result = await session.execute(stmt)
+                    await session.commit()
+                    return result.rowcount > 0
+
+            async with get_async_session() as session:
+                result = await session.execute(stmt.returning(Content.user_id))
+                user_ids = result.scalars().all()
+                await session.commit()
+            await after_commit(dataset_versions.bump_contents, [content_id], user_ids)
+            return len(user_ids) > 0
+
         async with get_async_session() as session:
-            # 执行更新
-            result = await session.execute(
-                update(Content).where(Content.id == content_id).values(**kwargs)
-            )
+            result = await session.execute(stmt.returning(Content))
+            updated_content = result.scalar_one_or_none()
             await session.commit()
-
-            # 如果更新成功，查询并返回最新的数据
-            if result.rowcount > 0:
-                updated_content = await session.execute(
-                    select(Content).where(Content.id == content_id)
-                )
-                return updated_content.scalar()
-            return None
+        if bump_versions and updated_content:
+            await after_commit(dataset_versions.bump_contents, [content_id], [updated_content.user_id])
+        return updated_content
 
     @staticmethod
     @require_user(default_return=([], None))
     async def get_all_by_user_id(
-        cursor: Optional[str] = None, limit: int = 100, user_id: Optional[int] = None
+        cursor: Optional[str] = None, limit: int = 100, user_id: Optional[int] = None, list_view: bool = False
     ) -> Tuple[List[Content], Optional[str]]:
-        """获取当前用户的所有文章（基于 UID 找到创建时间，再用创建时间排序分页）"""
+        """获取当前用户的所有文章（基于 UID 找到创建时间，再用创建时间排序分页），list_view 时不加载大字段"""
         user_id = user_id if user_id is not None else context_user.get().id
         async with get_async_session() as session:
             # 如果有游标，先通过 UID 找到对应的创建时间
@@ -131,7 +193,7 @@ class ContentRepository:
 
             # 查询当前用户的所有文章，按创建时间降序排序
             query = (
-                select(Content)
+                select_contents(list_view=list_view)
                 .where(Content.user_id == user_id)
                 .where(Content.is_deleted.is_(False))
                 .order_by(Content.created_at.desc())
@@ -310,12 +372,89 @@ class ContentRepository:
             return incomplete_count == 0
 
     @staticmethod
-    async def get_by_ids(content_ids: List[int]) -> List[Content]:
+    async def count_by_batch_id(batch_id: str) -> int:
+        """统计某个批量任务下的内容数量"""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(func.count())
+                .select_from(Content)
+                .where(Content.batch_id == batch_id)
+            )
+            return result.scalar() or 0
+
+    @staticmethod
+    async def get_ai_artifacts_by_cache_key(cache_key: str, exclude_content_id: int) -> Optional[dict]:
+        """根据 AI 缓存键查找其他内容已生成的 AI 产物，只查询 ai_* 列"""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(
+                    Content.ai_summary,
+                    Content.ai_structure,
+                    Content.ai_recommend_reason,
+                    Content.ai_tags,
+                )
+                .where(Content.ai_cache_key == cache_key)
+                .where(Content.id != exclude_content_id)
+                .where(Content.ai_summary.isnot(None))
+                .limit(1)
+            )
+            row = result.first()
+            return dict(row._mapping) if row else None
+
+    @staticmethod
+    async def get_asr_result_by_file(
+        file_name_in_storage: str, lang: Optional[str], exclude_content_id: int
+    ) -> Optional[dict]:
+        """根据存储对象查找其他内容已完成的转写结果，相同文件和语言的 ASR 不必重做"""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(Content.media_subtitles)
+                .where(Content.file_name_in_storage == file_name_in_storage)
+                .where(Content.lang.is_(None) if lang is None else Content.lang == lang)
+                .where(Content.id != exclude_content_id)
+                .where(Content.media_subtitles.isnot(None))
+                .order_by(Content.id.desc())
+                .limit(1)
+            )
+            row = result.first()
+            return dict(row._mapping) if row else None
+
+    @staticmethod
+    async def get_parse_result_by_file(
+        file_name_in_storage: str, media_type: ContentMediaType, exclude_content_id: int
+    ) -> Optional[dict]:
+        """根据存储对象查找其他内容已完成的解析结果，只查询解析产出的列"""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(
+                    Content.text_content,
+                    Content.content,
+                    Content.content_hash,
+                    Content.title,
+                    Content.image_ocr,
+                )
+                .where(Content.file_name_in_storage == file_name_in_storage)
+                .where(Content.media_type == media_type)
+                .where(Content.id != exclude_content_id)
+                .where(Content.processing_status == ProcessingStatus.COMPLETED)
+                .where(Content.content_hash.isnot(None))
+                .order_by(Content.id.desc())
+                .limit(1)
+            )
+            row = result.first()
+            return dict(row._mapping) if row else None
+
+    @staticmethod
+    async def get_by_ids(
+        content_ids: List[int], list_view: bool = False, columns: Optional[Sequence] = None
+    ) -> List[Content]:
         """
         通过多个 ID 获取内容列表，按创建时间倒序排序
         
         Args:
             content_ids: 内容 ID 列表
+            list_view: 是否只加载列表视图需要的字段
+            columns: 只查询这些列，返回轻量 Row
             
         Returns:
             List[Content]: 内容对象列表，按创建时间倒序排序
@@ -325,19 +464,26 @@ class ContentRepository:
 
         async with get_async_session() as session:
             result = await session.execute(
-                select(Content).where(
+                select_contents(columns, list_view).where(
                     Content.id.in_(content_ids)
                 ).order_by(Content.created_at.desc())
             )
-            return list(result.scalars().all())
+            return fetch_contents(result, columns)
         
     @staticmethod
-    async def get_by_dataset_pairs(pairs: List[Tuple[str, str]]) -> List[Content]:
+    async def get_by_dataset_pairs(
+        pairs: List[Tuple[str, str]], columns: Optional[Sequence] = None, user_id: Optional[int] = None
+    ) -> List[Content]:
         """
-        通过多个 (dataset_id, dataset_doc_id) 对获取内容列表
+        通过多个 (dataset_id, dataset_doc_id) 对获取未删除的内容列表
+
+        相同 content_hash 的内容共享同一个数据集文档，一个对可能对应多个用户的内容，
+        给定 user_id 时该用户的内容排在前面，调用方取每个对的第一条即可
         
         Args:
             pairs: (dataset_id, dataset_doc_id) 元组列表
+            columns: 只查询这些列，返回轻量 Row
+            user_id: 优先返回该用户的内容
             
         Returns:
             List[Content]: 内容对象列表
@@ -356,27 +502,31 @@ class ContentRepository:
 
         async with get_async_session() as session:
             result = await session.execute(
-                select(Content).where(
-                    or_(*conditions)
-                )
+                select_contents(columns).where(
+                    or_(*conditions),
+                    Content.is_deleted == False
+                ).order_by((Content.user_id == user_id).desc(), Content.id)
             )
-            return list(result.scalars().all())
+            return fetch_contents(result, columns)
 
     @staticmethod
-    async def get_all_completed_articles_without_dataset(limit: int = 2000) -> List[Content]:
+    async def get_all_completed_articles_without_dataset(
+        limit: int = 2000, columns: Optional[Sequence] = None
+    ) -> List[Content]:
         """
         获取所有处理完成但未分配数据集的文章，pdf类型排在最后
         
         Args:
             user_id: 用户ID
             limit: 限制返回数量，默认 1000
+            columns: 只查询这些列，返回轻量 Row
             
         Returns:
             List[Content]: 文章列表
         """
         async with get_async_session() as session:
             query = (
-                select(Content)
+                select_contents(columns)
                 .where(Content.is_deleted.is_(False))
                 .where(Content.processing_status == ProcessingStatus.COMPLETED)
                 .where(Content.rag_status == RAGProcessingStatus.waiting_init)
@@ -388,7 +538,7 @@ class ContentRepository:
             )
             
             result = await session.execute(query)
-            return list(result.scalars().all())
+            return fetch_contents(result, columns)
 
     @staticmethod
     async def update_rag_status(content_id: int, status: RAGProcessingStatus) -> bool:
@@ -407,9 +557,14 @@ class ContentRepository:
                 update(Content)
                 .where(Content.id == content_id)
                 .values(rag_status=status)
+                .returning(Content.id, Content.user_id)
             )
+            rows = result.all()
             await session.commit()
-            return result.rowcount > 0
+        await after_commit(
+            dataset_versions.bump_contents, [row.id for row in rows], [row.user_id for row in rows]
+        )
+        return len(rows) > 0
 
 
     @staticmethod
@@ -491,10 +646,84 @@ class ContentRepository:
                     )
                 )
                 .values(rag_status=status)
+                .returning(Content.id, Content.user_id)
             )
+            rows = result.all()
             await session.commit()
-            return result.rowcount > 0
+        await after_commit(
+            dataset_versions.bump_contents, [row.id for row in rows], [row.user_id for row in rows]
+        )
+        return len(rows) > 0
     
+    @staticmethod
+    async def get_rag_document_by_content_hash(
+        content_hash: str, media_type: ContentMediaType, exclude_content_id: int
+    ) -> Optional[Tuple[str, str]]:
+        """
+        查找相同内容哈希且已上传到 RAGFlow 的内容，返回其 (dataset_id, dataset_doc_id)，
+        优先返回已处理完成的记录
+
+        Args:
+            content_hash: 内容哈希
+            media_type: 媒体类型
+            exclude_content_id: 需要排除的内容ID（当前内容）
+
+        Returns:
+            Optional[Tuple[str, str]]: 找不到可复用的文档时返回 None
+        """
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(Content.dataset_id, Content.dataset_doc_id)
+                .where(Content.content_hash == content_hash)
+                .where(Content.media_type == media_type)
+                .where(Content.id != exclude_content_id)
+                .where(Content.is_deleted == False)
+                .where(Content.dataset_id.is_not(None))
+                .where(Content.dataset_doc_id.is_not(None))
+                .where(Content.rag_status.in_([RAGProcessingStatus.completed, RAGProcessingStatus.processing]))
+                .order_by((Content.rag_status == RAGProcessingStatus.completed).desc(), Content.id)
+                .limit(1)
+            )
+            row = result.first()
+            return (row.dataset_id, row.dataset_doc_id) if row else None
+
+    @staticmethod
+    async def lock_dataset(dataset_id: str):
+        """
+        获取数据集的事务级咨询锁，需在 unit_of_work 中调用，事务结束时释放。
+        复用和释放数据集都先持有该锁，释放方统计引用到删除数据集之间不会有新内容引用它
+        """
+        async with get_async_session() as session:
+            await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(dataset_id))))
+
+    @staticmethod
+    async def count_dataset_references(dataset_id: str, exclude_content_id: Optional[int] = None) -> int:
+        """
+        统计仍引用某个 RAGFlow 数据集的未删除内容数量
+
+        Args:
+            dataset_id: 数据集ID
+            exclude_content_id: 不计入的内容ID
+
+        Returns:
+            int: 引用数量
+        """
+        async with get_async_session() as session:
+            query = (
+                select(func.count())
+                .select_from(Content)
+                .where(
+                    and_(
+                        Content.dataset_id == dataset_id,
+                        Content.is_deleted == False
+                    )
+                )
+            )
+            if exclude_content_id is not None:
+                query = query.where(Content.id != exclude_content_id)
+            result = await session.execute(query)
+            return result.scalar() or 0
+
     @staticmethod
     async def batch_update_rag_status(content_ids: List[int], status: RAGProcessingStatus) -> int:
         """
@@ -520,19 +749,27 @@ class ContentRepository:
                     )
                 )
                 .values(rag_status=status)
+                .returning(Content.id, Content.user_id)
             )
+            rows = result.all()
             await session.commit()
-            return result.rowcount
+        await after_commit(
+            dataset_versions.bump_contents, [row.id for row in rows], [row.user_id for row in rows]
+        )
+        return len(rows)
 
     @staticmethod
     @require_user(default_return=[])
-    async def get_all_rag_read_or_processing_content_without_pagination(user_id: Optional[int] = None) -> List[Content]:
+    async def get_all_rag_read_or_processing_content_without_pagination(
+        user_id: Optional[int] = None, columns: Optional[Sequence] = None
+    ) -> List[Content]:
         """
         获取当前用户的所有已处理完成的文章，不分页直接返回全部数据
         条件：processing_status为COMPLETED且rag_status为completed或processing
         
         Args:
             user_id: 用户ID，如果为None则使用当前用户
+            columns: 只查询这些列，返回轻量 Row；默认返回不含大字段的列表视图对象
             
         Returns:
             List[Content]: 内容列表
@@ -541,7 +778,7 @@ class ContentRepository:
         async with get_async_session() as session:
             # 查询当前用户的所有已处理完成的文章，按创建时间降序排序
             query = (
-                select(Content)
+                select_contents(columns, list_view=True)
                 .where(Content.user_id == user_id)
                 .where(Content.is_deleted.is_(False))
                 .where(Content.processing_status == ProcessingStatus.COMPLETED)
@@ -552,10 +789,36 @@ class ContentRepository:
 
             # 执行查询
             result = await session.execute(query)
-            contents = result.scalars().all()
+            contents = fetch_contents(result, columns)
 
             return contents
 
 
+    @staticmethod
+    async def get_rag_dataset_ids(user_id: int) -> Tuple[List[str], int]:
+        """
+        获取用户可用于对话的数据集 ID，只查询 dataset_id 和 rag_status 两列
+        条件同 get_all_rag_read_or_processing_content_without_pagination
+
+        Returns:
+            Tuple[List[str], int]: (rag 已完成内容的数据集 ID 列表, 已完成或处理中的内容数)
+        """
+        async with get_async_session() as session:
+            query = (
+                select(Content.dataset_id, Content.rag_status)
+                .where(Content.user_id == user_id)
+                .where(Content.is_deleted.is_(False))
+                .where(Content.processing_status == ProcessingStatus.COMPLETED)
+                .where(Content.rag_status.in_([RAGProcessingStatus.completed, RAGProcessingStatus.processing]))
+                .order_by(Content.created_at.desc())
+                .limit(10000)
+            )
+            rows = (await session.execute(query)).all()
+            dataset_ids = [
+                row.dataset_id for row in rows
+                if row.dataset_id and row.rag_status == RAGProcessingStatus.completed
+            ]
+            return dataset_ids, len(rows)
+
 
 content_repository = ContentRepository()
@@ -2,7 +2,8 @@ from typing import List, Optional, Tuple
 import nanoid
 from sqlalchemy import select, and_, or_, func, distinct, text, literal
 from sqlalchemy.sql import text
-from app.database.session import get_async_session
+from app.database.dataset_versions import dataset_versions
+from app.database.session import after_commit, get_async_session
 from app.database.models.knowledge_base import (
     KnowledgeBase,
     KnowledgeBaseAccess,
@@ -12,7 +13,8 @@ from app.database.models.knowledge_base import (
 )
 from app.context import context_user
 from app.database.utils import require_user
-from app.database.models.content import Content, ProcessingStatus
+from app.database.models.content import Content, ProcessingStatus, RAGProcessingStatus
+from app.database.repositories.content_repository import list_view_options
 from app.database.users_dao import UserModel as User
 import logging
 import os
@@ -39,43 +41,84 @@ class KnowledgeBaseRepository:
             # 基础条件：知识库存在且未删除
             conditions = [
                 KnowledgeBase.uid == kb_uid,
-                KnowledgeBase.is_deleted == False
+                KnowledgeBase.is_deleted == False,
+                KnowledgeBaseRepository._access_condition(user_id)
             ]
-            
-            if user_id:
-                # 权限验证条件：
-                # 1. 知识库是公开的，或
-                # 2. 用户是知识库的创建者，或
-                # 3. 知识库是受限的且用户有访问权限
-                access_conditions = or_(
-                    KnowledgeBase.visibility == KnowledgeBaseVisibility.public,
-                    KnowledgeBase.visibility == KnowledgeBaseVisibility.default,
-                    KnowledgeBase.user_id == user_id,
-                    and_(
-                        KnowledgeBase.visibility == KnowledgeBaseVisibility.restricted,
-                        KnowledgeBase.id.in_(
-                            select(KnowledgeBaseAccess.knowledge_base_id).where(
-                                and_(
-                                    KnowledgeBaseAccess.user_id == user_id,
-                                    KnowledgeBaseAccess.is_active == True
-                                )
-                            )
-                        )
-                    )
-                )
-                conditions.append(access_conditions)
-            else:
-                # 未提供用户ID时，只能访问公开知识库
-                conditions.append(or_(
-                    KnowledgeBase.visibility == KnowledgeBaseVisibility.public,
-                    KnowledgeBase.visibility == KnowledgeBaseVisibility.default,
-                ))
 
             # 执行查询，返回完整的知识库对象
             query = select(KnowledgeBase).where(and_(*conditions))
             result = await session.execute(query)
             return result.scalar_one_or_none()
 
+    @staticmethod
+    def _access_condition(user_id: Optional[int] = None):
+        """用户可访问的知识库条件"""
+        if not user_id:
+            # 未提供用户ID时，只能访问公开知识库
+            return or_(
+                KnowledgeBase.visibility == KnowledgeBaseVisibility.public,
+                KnowledgeBase.visibility == KnowledgeBaseVisibility.default,
+            )
+        # 权限验证条件：
+        # 1. 知识库是公开的，或
+        # 2. 用户是知识库的创建者，或
+        # 3. 知识库是受限的且用户有访问权限
+        return or_(
+            KnowledgeBase.visibility == KnowledgeBaseVisibility.public,
+            KnowledgeBase.visibility == KnowledgeBaseVisibility.default,
+            KnowledgeBase.user_id == user_id,
+            and_(
+                KnowledgeBase.visibility == KnowledgeBaseVisibility.restricted,
+                KnowledgeBase.id.in_(
+                    select(KnowledgeBaseAccess.knowledge_base_id).where(
+                        and_(
+                            KnowledgeBaseAccess.user_id == user_id,
+                            KnowledgeBaseAccess.is_active == True
+                        )
+                    )
+                )
+            )
+        )
+
+    @staticmethod
+    async def get_content_with_check_access(content_uid: str, user_id: Optional[int] = None) -> Optional[Content]:
+        """
+        检查用户是否有权限访问内容，并返回内容对象
+
+        内容本身没有可见性设置：用户自己的内容，或位于用户可访问的知识库中的内容才可访问
+
+        Args:
+            content_uid: 内容的 UID
+            user_id: 用户 ID，如果不提供则只能访问公开知识库中的内容
+
+        Returns:
+            Optional[Content]: 如果有权限访问则返回内容对象，否则返回 None
+        """
+        accessible_kb_ids = select(KnowledgeBase.id).where(
+            and_(
+                KnowledgeBase.is_deleted == False,
+                KnowledgeBaseRepository._access_condition(user_id)
+            )
+        )
+        in_accessible_kb = Content.id.in_(
+            select(ContentKnowledgeBaseMapping.content_id).where(
+                and_(
+                    ContentKnowledgeBaseMapping.is_deleted == False,
+                    ContentKnowledgeBaseMapping.knowledge_base_id.in_(accessible_kb_ids)
+                )
+            )
+        )
+        async with get_async_session() as session:
+            query = select(Content).where(
+                and_(
+                    Content.uid == content_uid,
+                    Content.is_deleted == False,
+                    or_(Content.user_id == user_id, in_accessible_kb) if user_id else in_accessible_kb
+                )
+            )
+            result = await session.execute(query)
+            return result.scalars().first()
+
     @staticmethod
     async def get_kb_detail_with_access_check(kb_uid: str, user_id: Optional[int] = None) -> Optional[dict]:
         """
@@ -223,7 +266,8 @@ class KnowledgeBaseRepository:
             session.add(kb)
             await session.commit()
             await session.refresh(kb)
-            return kb
+        await after_commit(dataset_versions.bump, (), (), [user_id])
+        return kb
         
         
     @staticmethod
@@ -557,7 +601,8 @@ class KnowledgeBaseRepository:
 
             kb.is_deleted = True
             await session.commit()
-            return True
+        await after_commit(dataset_versions.bump, (), [kb_id])
+        return True
 
     @staticmethod
     async def verify_ownership(kb_uid: str, user_id: int) -> Optional[KnowledgeBase]:
@@ -658,6 +703,41 @@ class KnowledgeBaseRepository:
             logger.error(f"Error in get_kb_contents_from_owned_and_subscribed: {str(e)}")
             return []
             
+    @staticmethod
+    async def get_dataset_ids_from_owned_and_subscribed(user_id: int) -> Tuple[List[str], int]:
+        """
+        获取用户拥有和订阅的知识库中内容的数据集 ID，只查询 dataset_id 和 rag_status 两列
+        内容条件同 get_kb_contents_from_owned_and_subscribed
+
+        Returns:
+            Tuple[List[str], int]: (rag 已完成内容的数据集 ID 列表, 内容数)
+        """
+        kb_ids = await KnowledgeBaseRepository._get_user_knowledge_base_ids(user_id)
+        if not kb_ids:
+            return [], 0
+
+        content_ids = await KnowledgeBaseRepository._get_content_ids_by_kb_ids(kb_ids)
+        if not content_ids:
+            return [], 0
+
+        async with get_async_session() as session:
+            query = select(Content.dataset_id, Content.rag_status).where(
+                and_(
+                    Content.id.in_(content_ids),
+                    Content.is_deleted == False,
+                    Content.dataset_id.is_not(None),
+                    Content.dataset_doc_id.is_not(None)
+                )
+            )
+            rows = (await session.execute(query)).all()
+            dataset_ids = [row.dataset_id for row in rows if row.rag_status == RAGProcessingStatus.completed]
+            return dataset_ids, len(rows)
+
+    @staticmethod
+    async def get_user_knowledge_base_ids(user_id: int) -> List[int]:
+        """获取用户拥有和订阅的知识库IDs，对话数据集缓存据此确定需要比较的知识库版本"""
+        return await KnowledgeBaseRepository._get_user_knowledge_base_ids(user_id)
+
     @staticmethod
     async def _get_user_knowledge_base_ids(user_id: int) -> List[int]:
         """获取用户拥有和订阅的知识库IDs"""
@@ -716,10 +796,10 @@ class KnowledgeBaseRepository:
     
     @staticmethod
     async def _get_contents_by_ids(content_ids: List[int]) -> List[Content]:
-        """获取内容详情"""
+        """获取内容（列表视图，不加载大字段）"""
         async with get_async_session() as session:
             try:
-                query = select(Content).where(
+                query = select(Content).options(*list_view_options()).where(
                     and_(
                         Content.id.in_(content_ids),
                         Content.is_deleted == False,
@@ -826,6 +906,55 @@ class KnowledgeBaseRepository:
             result = await session.execute(query)
             return result.scalars().all()
 
+    @staticmethod
+    async def get_knowledge_bases_by_ids(kb_ids: List[int]) -> List[KnowledgeBase]:
+        """
+        通过多个知识库ID批量获取未删除的知识库
+        """
+        if not kb_ids:
+            return []
+
+        async with get_async_session() as session:
+            query = select(KnowledgeBase).where(
+                and_(
+                    KnowledgeBase.id.in_(kb_ids),
+                    KnowledgeBase.is_deleted == False
+                )
+            )
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    @staticmethod
+    async def get_knowledge_bases_by_content_ids(content_ids: List[int]) -> List[KnowledgeBase]:
+        """
+        获取包含任一给定内容的未删除知识库
+
+        Args:
+            content_ids: 内容ID列表
+
+        Returns:
+            List[KnowledgeBase]: 知识库对象列表
+        """
+        if not content_ids:
+            return []
+
+        async with get_async_session() as session:
+            query = select(KnowledgeBase).where(
+                and_(
+                    KnowledgeBase.is_deleted == False,
+                    KnowledgeBase.id.in_(
+                        select(ContentKnowledgeBaseMapping.knowledge_base_id).where(
+                            and_(
+                                ContentKnowledgeBaseMapping.content_id.in_(content_ids),
+                                ContentKnowledgeBaseMapping.is_deleted == False
+                            )
+                        )
+                    )
+                )
+            )
+            result = await session.execute(query)
+            return result.scalars().all()
+
 class KnowledgeBaseAccessRepository:
     @staticmethod
     @require_user(default_return=None)
@@ -912,7 +1041,8 @@ class ContentKnowledgeBaseMappingRepository:
                     session.add(mapping)
 
             await session.commit()
-            return len(content_ids)
+        await after_commit(dataset_versions.bump, (), [kb_id])
+        return len(content_ids)
 
     @staticmethod
     async def add_content(
@@ -934,26 +1064,27 @@ class ContentKnowledgeBaseMappingRepository:
             
             # 如果已经存在映射
             if existing_mapping:
-                # 检查是否需要恢复删除的映射
-                if existing_mapping.is_deleted:
-                    existing_mapping.is_deleted = False
-                    existing_mapping.deleted_at = None
-                    existing_mapping.deleted_by = None
-                    existing_mapping.created_by = user_id
-                    await session.commit()
-                    await session.refresh(existing_mapping)
-                return existing_mapping
-
-            # 如果不存在，创建新映射
-            mapping = ContentKnowledgeBaseMapping(
-                content_id=content_id,
-                knowledge_base_id=kb_id,
-                created_by=user_id
-            )
-            session.add(mapping)
+                # 未删除的映射无需处理
+                if not existing_mapping.is_deleted:
+                    return existing_mapping
+                # 恢复删除的映射
+                existing_mapping.is_deleted = False
+                existing_mapping.deleted_at = None
+                existing_mapping.deleted_by = None
+                existing_mapping.created_by = user_id
+                mapping = existing_mapping
+            else:
+                # 如果不存在，创建新映射
+                mapping = ContentKnowledgeBaseMapping(
+                    content_id=content_id,
+                    knowledge_base_id=kb_id,
+                    created_by=user_id
+                )
+                session.add(mapping)
             await session.commit()
             await session.refresh(mapping)
-            return mapping
+        await after_commit(dataset_versions.bump, (), [kb_id])
+        return mapping
 
     @staticmethod
     async def remove_content(
@@ -979,7 +1110,8 @@ class ContentKnowledgeBaseMappingRepository:
             mapping.deleted_at = func.now()
             mapping.deleted_by = user_id
             await session.commit()
-            return True
+        await after_commit(dataset_versions.bump, (), [kb_id])
+        return True
 
     
     @staticmethod
@@ -1016,6 +1148,37 @@ class ContentKnowledgeBaseMappingRepository:
 
             return list(content_ids), total
 
+    @staticmethod
+    async def get_knowledge_base_dataset_ids(kb_id: int, limit: int = 1000) -> Tuple[List[str], int]:
+        """
+        获取知识库最近 limit 条内容中可用于对话的数据集 ID，只查询 dataset_id 和 rag_status 两列
+
+        Returns:
+            Tuple[List[str], int]: (rag 已完成内容的数据集 ID 列表, 已完成或处理中的内容数)
+        """
+        content_ids, _ = await ContentKnowledgeBaseMappingRepository.get_knowledge_base_contents(
+            kb_id=kb_id,
+            offset=0,
+            limit=limit,
+        )
+        if not content_ids:
+            return [], 0
+
+        async with get_async_session() as session:
+            query = select(Content.dataset_id, Content.rag_status).where(
+                and_(
+                    Content.id.in_(content_ids),
+                    Content.processing_status == ProcessingStatus.COMPLETED,
+                    Content.rag_status.in_([RAGProcessingStatus.completed, RAGProcessingStatus.processing])
+                )
+            ).order_by(Content.created_at.desc())
+            rows = (await session.execute(query)).all()
+            dataset_ids = [
+                row.dataset_id for row in rows
+                if row.dataset_id and row.rag_status == RAGProcessingStatus.completed
+            ]
+            return dataset_ids, len(rows)
+
     @staticmethod
     async def get_knowledge_base_all_contents(
         kb_id: int,
@@ -1116,7 +1279,8 @@ class ContentKnowledgeBaseMappingRepository:
                 mapping.deleted_by = user_id
 
             await session.commit()
-            return len(mappings)
+        await after_commit(dataset_versions.bump, (), [kb_id])
+        return len(mappings)
             
 
 class KnowledgeBaseSubscriptionRepository:
@@ -1150,7 +1314,8 @@ class KnowledgeBaseSubscriptionRepository:
             subscription.deleted_at = func.now()
             subscription.deleted_by = user_id
             await session.commit()
-            return True
+        await after_commit(dataset_versions.bump, (), (), [user_id])
+        return True
 
     @staticmethod
     async def get_user_subscriptions(user_id: int, offset: int = 0, limit: int = 20) -> Tuple[List[KnowledgeBase], int]:
@@ -1327,21 +1492,20 @@ class KnowledgeBaseSubscriptionRepository:
                     subscription.is_deleted = False
                     subscription.deleted_at = None
                     subscription.deleted_by = None
-                    await session.commit()
-                    return True  # 返回成功（恢复的订阅）
-                
-                # 如果不存在任何订阅记录，创建新的
-                new_subscription = KnowledgeBaseSubscription(
-                    knowledge_base_id=kb_id,
-                    user_id=user_id
-                )
-                session.add(new_subscription)
+                else:
+                    # 如果不存在任何订阅记录，创建新的
+                    new_subscription = KnowledgeBaseSubscription(
+                        knowledge_base_id=kb_id,
+                        user_id=user_id
+                    )
+                    session.add(new_subscription)
                 await session.commit()
-                return True
                 
             except Exception as e:
                 await session.rollback()
                 return False
+        await after_commit(dataset_versions.bump, (), (), [user_id])
+        return True
 
 
 knowledge_base_repository = KnowledgeBaseRepository
@@ -0,0 +1,80 @@
+import logging
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database.models.storage_blob import StorageBlob
+from app.database.session import get_async_session
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBlobRepository:
+    @staticmethod
+    async def get_by_sha256(sha256: str) -> Optional[StorageBlob]:
+        async with get_async_session() as session:
+            result = await session.execute(select(StorageBlob).where(StorageBlob.sha256 == sha256))
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    async def get_by_source_key(source_key: str) -> Optional[StorageBlob]:
+        """按外部来源查找已存储的对象，有多个时取最新的"""
+        async with get_async_session() as session:
+            result = await session.execute(
+                select(StorageBlob)
+                .where(StorageBlob.source_key == source_key)
+                .order_by(StorageBlob.id.desc())
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    async def acquire(sha256: str, uri: str, size: int, source_key: Optional[str] = None) -> str:
+        """
+        登记对象并增加一次引用，返回对象实际所在的 uri。
+        并发写入同一内容时以先登记的 uri 为准，后写入的对象不再被引用。
+        """
+        statement = insert(StorageBlob).values(
+            sha256=sha256, uri=uri, size=size, ref_count=1, source_key=source_key
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[StorageBlob.sha256],
+            set_={
+                "ref_count": StorageBlob.ref_count + 1,
+                "source_key": func.coalesce(StorageBlob.source_key, statement.excluded.source_key),
+                "updated_at": func.now(),
+            },
+        ).returning(StorageBlob.uri)
+
+        async with get_async_session() as session:
+            result = await session.execute(statement)
+            await session.commit()
+            return result.scalar_one()
+
+    @staticmethod
+    async def retain(uri: str) -> bool:
+        """为引用同一 uri 的新内容（如复制的内容）增加一次引用，uri 不是登记过的对象时返回 False"""
+        async with get_async_session() as session:
+            result = await session.execute(
+                update(StorageBlob)
+                .where(StorageBlob.uri == uri)
+                .values(ref_count=StorageBlob.ref_count + 1)
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    @staticmethod
+    async def release(uri: str) -> bool:
+        """减少一次引用；引用数为 0 的对象及其记录仍保留在存储中，目前没有清理任务删除它们"""
+        async with get_async_session() as session:
+            result = await session.execute(
+                update(StorageBlob)
+                .where(StorageBlob.uri == uri, StorageBlob.ref_count > 0)
+                .values(ref_count=StorageBlob.ref_count - 1)
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+
+storage_blob_repository = StorageBlobRepository()
@@ -1,13 +1,98 @@
+import threading
+import time
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional, Tuple
 
 from pymysql import DatabaseError
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app import settings
 
-engine = create_async_engine(settings.jdbc_url)
+
+class PoolWaitStats:
+    """Accumulated connection checkout wait statistics of a pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_ms": round(self.total_wait_seconds * 1000, 3),
+                "avg_wait_ms": round(self.total_wait_seconds * 1000 / attempts, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait to check out a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except SQLAlchemyError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+
+@lru_cache()
+def get_engine() -> AsyncEngine:
+    """Process-wide async engine shared by all repositories and the chat history store"""
+    return create_async_engine(
+        settings.jdbc_url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+
+
+def get_pool_status() -> dict:
+    """Snapshot of the shared engine's pool usage"""
+    pool = get_engine().pool
+    status = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.db_max_overflow,
+    }
+    if isinstance(pool, InstrumentedQueuePool):
+        status["wait"] = pool.wait_stats.to_dict()
+    return status
+
+
+engine = get_engine()
 
 AsyncSessionLocal = sessionmaker(
     engine,
@@ -19,10 +104,88 @@ AsyncSessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+# Session bound by unit_of_work(), picked up by get_async_session()
+context_session: ContextVar[Optional[AsyncSession]] = ContextVar("context_session", default=None)
+# Callbacks deferred by after_commit() until the bound unit of work commits
+context_after_commit: ContextVar[Optional[List[Tuple[Callable[..., Awaitable], tuple]]]] = ContextVar(
+    "context_after_commit", default=None
+)
+
+
+async def after_commit(callback: Callable[..., Awaitable], *args):
+    """
+    Await callback(*args) once the changes written so far are committed: right away
+    outside a unit of work, after its single commit inside one (dropped on rollback).
+    """
+    callbacks = context_after_commit.get()
+    if callbacks is not None:
+        callbacks.append((callback, args))
+        return
+    await callback(*args)
+
+
+class _UnitOfWorkSession:
+    """
+    Repository-facing handle of the session bound by unit_of_work().
+    commit() only flushes and close() is a no-op, so the unit of work
+    issues the single commit and releases the connection itself.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    async def commit(self):
+        await self._session.flush()
+
+    async def close(self):
+        pass
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncSession:
+    """
+    Bind one session to the current context so that every repository call
+    inside shares it, then commit once on exit. Nested calls reuse the
+    outer unit of work. The bound session must not be used concurrently,
+    so do not gather repository calls inside it.
+    """
+    if context_session.get() is not None:
+        yield context_session.get()
+        return
+
+    session = AsyncSessionLocal()
+    callbacks = []
+    token = context_session.set(session)
+    callbacks_token = context_after_commit.set(callbacks)
+    try:
+        yield session
+        await session.commit()
+    except SQLAlchemyError as e:
+        await session.rollback()
+        raise DatabaseError(f"Database transaction error: {str(e)}") from e
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        context_after_commit.reset(callbacks_token)
+        context_session.reset(token)
+        await session.close()
+
+    for callback, args in callbacks:
+        await callback(*args)
+
 
 @asynccontextmanager
 async def get_async_session() -> AsyncSession:
     """Provide a transactional scope around a series of operations"""
+    bound_session = context_session.get()
+    if bound_session is not None:
+        yield _UnitOfWorkSession(bound_session)
+        return
+
     session = AsyncSessionLocal()
     try:
         yield session
@@ -16,7 +16,13 @@ from sqlalchemy import (
 )
 from sqlalchemy.future import select
 
+from app.database.session import after_commit
 from app.libs.auth.auth_utils import generate_uid
+from app.libs.auth.principal_cache import principal_cache
+
+# 认证缓存中保存的用户字段：请求处理只读取这些字段，邮箱、手机号、第三方账号 ID
+# 和推送令牌等不进入进程缓存和 Redis
+SNAPSHOT_COLUMNS = ("id", "uid", "deleted", "is_chat_enabled", "self_set_country", "self_set_region")
 
 
 class UserModel(Base):
@@ -52,6 +58,15 @@ class UserModel(Base):
         Index("ix_users_self_set_region", "self_set_region"),
     )
 
+    def to_snapshot(self) -> dict:
+        """只含 SNAPSHOT_COLUMNS 的精简快照，供认证缓存保存"""
+        return {key: getattr(self, key) for key in SNAPSHOT_COLUMNS}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict) -> "UserModel":
+        """由快照重建一个不关联会话的用户对象，快照以外的字段为 None，需要时按 id 查库"""
+        return cls(**{key: snapshot.get(key) for key in SNAPSHOT_COLUMNS})
+
 
 class UserRepository:
     """Repository for handling user-related database operations"""
@@ -152,8 +167,10 @@ class UserRepository:
                     if hasattr(account, key):
                         setattr(account, key, value)
                 await session.flush()  # Ensure changes are applied to the session
-                return account
-            return None
+
+        if account:
+            await after_commit(principal_cache.invalidate, user_id)
+        return account
 
     @staticmethod
     async def delete_account(account_id: int) -> bool:
@@ -169,8 +186,10 @@ class UserRepository:
             if account:
                 account.deleted = True
                 await session.flush()
-                return True
-            return False
+
+        if account:
+            await after_commit(principal_cache.invalidate, account_id)
+        return account is not None
 
     @staticmethod
     async def restore_account(account_id: int) -> bool:
@@ -186,8 +205,10 @@ class UserRepository:
             if account:
                 account.deleted = False
                 await session.flush()
-                return True
-            return False
+
+        if account:
+            await after_commit(principal_cache.invalidate, account_id)
+        return account is not None
 
     @staticmethod
     async def get_users_by_ids(user_ids: List[int]) -> List[UserModel]:
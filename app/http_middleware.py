@@ -1,10 +1,10 @@
 import logging
-import logging
-import re
 
-from fastapi import status, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+from fastapi import status
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger(__name__)
 
@@ -13,33 +13,51 @@ FORBIDDEN_RESPONSE = JSONResponse(
     content={"detail": "Forbidden"},
 )
 
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+}
+
+
+class CORSMiddleware:
+    """
+    纯 ASGI 实现：只在 http.response.start 上改写响应头，
+    响应体（包括流式对话的每个块）原样透传，不经过额外的任务和内存流
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class CORSMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            response = Response()
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-            response.headers["Access-Control-Allow-Headers"] = "*"
-            return response
+        if scope["method"] == "OPTIONS":
+            response = Response(headers=CORS_HEADERS)
+            await response(scope, receive, send)
+            return
 
-        response = await call_next(request)
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "*"
-        return response
+        async def send_with_cors(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for key, value in CORS_HEADERS.items():
+                    headers[key] = value
+            await send(message)
 
+        await self.app(scope, receive, send_with_cors)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+
+class RequestLoggingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         # 记录请求信息
-        if request.url.path != "/api/health":
+        if scope["type"] == "http" and scope["path"] != "/api/health":
+            request = Request(scope)
             logger.info(f"Incoming request: {request.method} {request.url}")
 
         # 调用后续的处理逻辑
-        response = await call_next(request)
-
-        # 可选：记录响应信息
-        # logger.info(f"Response status: {response.status_code}")
-
-        return response
+        await self.app(scope, receive, send)
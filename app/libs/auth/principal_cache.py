@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+import redis.asyncio as redis
+
+from app import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PrincipalCache:
+    """
+    已认证身份缓存：按 token 摘要缓存解码后的 JWT payload 和用户快照，命中时认证不查库。
+
+    - 进程内 LRU/TTL 层：记录过期时间取 TTL 和 token 自身 exp 中较早者
+    - 可选 Redis 层：按用户 ID 共享用户快照，其他进程进程内层未命中时不必查库
+    - 账号更新、删除后调用 invalidate，清掉本进程该用户的全部 token 记录和 Redis 快照；
+      其他进程的进程内记录最多在 TTL 内过期
+    """
+
+    USER_KEY = "auth:principal:v2:user:{}"
+
+    def __init__(self, ttl_seconds: int, max_entries: int, redis_url: Optional[str] = None, redis_ttl_seconds: int = 600):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self._redis = redis.from_url(redis_url) if redis_url else None
+        self._entries: OrderedDict = OrderedDict()
+        self._digests_by_user: Dict[int, Set[str]] = {}
+        # 每次 invalidate 递增，防止失效前开始的查库结果在失效后写回
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, digest: str) -> Optional[Tuple[dict, dict]]:
+        """(payload, user snapshot)，未命中或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    self._remove(digest)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def set(self, digest: str, payload: dict, user_snapshot: dict, generation: int):
+        expires_at = time.time() + self.ttl_seconds
+        if payload.get("exp"):
+            expires_at = min(expires_at, float(payload["exp"]))
+        user_id = user_snapshot["id"]
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._entries[digest] = (expires_at, payload, user_snapshot, user_id)
+            self._entries.move_to_end(digest)
+            self._digests_by_user.setdefault(user_id, set()).add(digest)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, digest: str):
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self._digests_by_user.get(entry[3])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._digests_by_user[entry[3]]
+
+    async def get_user_snapshot(self, user_id: int) -> Optional[dict]:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self.USER_KEY.format(user_id))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Failed to read principal snapshot: {str(e)}")
+            return None
+
+    async def set_user_snapshot(self, user_snapshot: dict):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.set(
+                self.USER_KEY.format(user_snapshot["id"]), json.dumps(user_snapshot), ex=self.redis_ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Failed to write principal snapshot: {str(e)}")
+
+    async def invalidate(self, user_id: int):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for digest in list(self._digests_by_user.get(user_id, ())):
+                self._remove(digest)
+        if self._redis is not None:
+            try:
+                await self._redis.delete(self.USER_KEY.format(user_id))
+            except Exception as e:
+                logger.warning(f"Failed to invalidate principal snapshot: {str(e)}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+principal_cache = PrincipalCache(
+    settings.auth_principal_cache_ttl,
+    settings.auth_principal_cache_max_entries,
+    redis_url=settings.redis_url if settings.auth_principal_cache_redis_enabled else None,
+    redis_ttl_seconds=settings.auth_principal_cache_redis_ttl,
+)
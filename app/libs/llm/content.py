@@ -7,10 +7,15 @@ from app.common import detect_lang, extract_json, image_url_resize_and_to_base64
 from app.database.repositories import content_repository
 from app.libs.llm.index import llm
 from langchain_core.messages import HumanMessage
-from app.libs.llm.llm_clients import llm_image, llm_gpt_4o
+from app.libs.llm.llm_clients import GEMINI_MODEL, llm_image, llm_gpt_4o
+from app.libs.llm.rate_limit import llm_scheduler
+from app import settings
 from pydantic import Field
 logger = logging.getLogger(__name__)
 
+# 修改摘要、导图、推荐理由或标签的提示词时递增，使旧的 AI 产物缓存失效
+CONTENT_PROMPT_VERSION = "1"
+
 summary_prompt = ChatPromptTemplate.from_messages(
     [
         (
@@ -91,6 +96,45 @@ recommand_reason_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
+content_artifacts_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+            You are NotesGPT. Read the content once and produce four artifacts for it in a single response.
+            # Important note: Make sure every artifact is in {output_language}.
+
+            ## summary
+            A clear and concise summary with markdown:
+            ### **One-Sentence Hook**
+            Write one engaging sentence to capture attention
+            ### **Key Points**
+            - List 3-6 main ideas
+            - Each point on a new line
+            - Clearly express core concepts
+            ### **Tags**
+            - Use 4 tags maximum per article, with hashtag prefix
+
+            ## markdownmap
+            Advanced bullet-point notes in MARKDOWN format only.
+            - Summarize the content into one sentence as Heading level 1, keep it as short as possible.
+            - At least 3 Heading level 2s, each starting with an appropriate EMOJI.
+            - Bold essential vocabulary terms and key concepts with asterisks, keep all essential information and nuance.
+            - Strictly base the notes on the provided information, without adding any external information.
+
+            ## recommend_reason
+            A one-sentence recommendation. Keep it concise and accurate. No extra comments.
+
+            ## tag_list
+            - Use 4 tags maximum, prefer standard terms over abbreviations
+            - Avoid synonyms and redundant terms, tags must directly relate to core themes
+            - Combine related subtopics into broader categories
+        """,
+        ),
+        ("user", "Here is the content to process: \n{content_text}"),
+    ]
+)
+
 class MermaidModel(BaseModel):
     """Model representing the structured output of AI-generated Mermaid diagram."""
 
@@ -102,7 +146,17 @@ class TagsModel(BaseModel):
     tag_list: list[str]
 
 
+class ContentArtifactsModel(BaseModel):
+    """Model representing all AI artifacts of a content generated in one call."""
+
+    summary: str = Field(description="Markdown summary of the content")
+    markdownmap: str = Field(description="Markdown bullet-point notes of the content")
+    recommend_reason: str = Field(description="One-sentence recommendation")
+    tag_list: list[str] = Field(description="At most 4 tags")
+
+
 ai_tags_structured_llm = llm.with_structured_output(TagsModel)
+ai_artifacts_structured_llm = llm.with_structured_output(ContentArtifactsModel)
 
 
 @retry_async(Exception, tries=2, delay=3, backoff=2)
@@ -110,7 +164,8 @@ async def get_content_summary(content: str) -> str:
     logger.info(f"content is: {content[:10000]}, lang is {detect_lang(content)}")
     prompt = await summary_prompt.ainvoke({"content_text": content, "output_language": detect_lang(content)})
 
-    result = await llm.ainvoke(prompt)
+    async with llm_scheduler.admit("google", GEMINI_MODEL):
+        result = await llm.ainvoke(prompt)
 
     if not result.content:
         raise Exception("Failed to generate summary")
@@ -124,7 +179,8 @@ async def get_markdownmap(content: str) -> str:
     logger.info(f"content is: {content[:20]}, lang is {detect_lang(content)}")
     prompt = await markdownmap_prompt.ainvoke({"content_text": content, "output_language": detect_lang(content)})
 
-    result = await llm.ainvoke(prompt)
+    async with llm_scheduler.admit("google", GEMINI_MODEL):
+        result = await llm.ainvoke(prompt)
 
     if not result.content:
         raise Exception("Failed to generate markdown map")
@@ -136,7 +192,8 @@ async def get_markdownmap(content: str) -> str:
 async def get_recommend_reason(content: str) -> str:
     logger.info(f"content is: {content[:20]}, lang is {detect_lang(content)}")
     prompt = await recommand_reason_prompt.ainvoke({"content_text": content,  "output_language": detect_lang(content)})
-    result = await llm.ainvoke(prompt)
+    async with llm_scheduler.admit("google", GEMINI_MODEL):
+        result = await llm.ainvoke(prompt)
 
     if not result.content:
         raise Exception("Failed to generate recommendation reason")
@@ -148,13 +205,29 @@ async def get_recommend_reason(content: str) -> str:
 async def get_tags(content: str) -> str:
     logger.info(f"content is: {content[:20]}, lang is {detect_lang(content)}")
     prompt = await tags_prompt.ainvoke({"content_text": content, "output_language": detect_lang(content)})
-    result = await ai_tags_structured_llm.ainvoke(prompt)
+    async with llm_scheduler.admit("google", GEMINI_MODEL):
+        result = await ai_tags_structured_llm.ainvoke(prompt)
 
     if not result.tag_list:
         raise Exception("Failed to generate tags")
     
     return result.tag_list
 
+async def get_content_artifacts(content: str) -> ContentArtifactsModel:
+    """
+    一次调用生成摘要、思维导图、推荐理由和标签，文档只需发送并计费一次。
+    不做重试，解析失败时由调用方回退到逐项生成。
+    """
+    logger.info(f"content is: {content[:20]}, lang is {detect_lang(content)}")
+    prompt = await content_artifacts_prompt.ainvoke({"content_text": content, "output_language": detect_lang(content)})
+    async with llm_scheduler.admit("google", GEMINI_MODEL):
+        result = await ai_artifacts_structured_llm.ainvoke(prompt)
+
+    if result is None:
+        raise Exception("Failed to parse content artifacts")
+
+    return result
+
 class ImageCaptionModel(BaseModel):
     """Model representing the structured output of image captions."""
     
@@ -195,7 +268,8 @@ async def get_image_caption(image_url: str) -> ImageCaptionModel:
     )
 
     # Invoke the model with the message
-    response = await image_caption_data_structured_llm.ainvoke([message])
+    async with llm_scheduler.admit("azure", settings.gpt_model):
+        response = await image_caption_data_structured_llm.ainvoke([message])
     
     return response
    
@@ -7,12 +7,14 @@ from app import settings
 # set_verbose(True)
 # set_debug(True)
 
+GEMINI_MODEL = "gemini-2.0-flash"
+
 llm_bedrock = ChatBedrockConverse(
     model_id=settings.base_llm_model_id,
     temperature=0.1,
 )
 llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
+    model=GEMINI_MODEL,
     temperature=0.1,
     top_p=0.2,
     timeout=60,
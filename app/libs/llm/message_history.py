@@ -10,13 +10,12 @@ from typing import List, Any
 from typing import (
     Sequence,
 )
-from sqlalchemy.ext.asyncio import create_async_engine
 
-from app import settings
-from app.database.session import get_async_session
+from app.database.session import get_async_session, get_engine
 from app.libs.llm.index import _create_agent_with_tools
 
-async_sql_engine = create_async_engine(settings.jdbc_url, pool_recycle=600)
+# Share the process-wide pool instead of opening a second one
+async_sql_engine = get_engine()
 
 
 class CustomSQLChatMessageHistory(SQLChatMessageHistory):
@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Optional, Tuple
+
+from app import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMPriority(IntEnum):
+    """LLM 调用的优先级通道，数值越小越先被放行"""
+
+    interactive = 0
+    batch = 1
+
+
+# 当前任务的优先级，由 worker 在处理内容前设置
+llm_priority: ContextVar[LLMPriority] = ContextVar("llm_priority", default=LLMPriority.interactive)
+
+
+class TokenBucket:
+    """
+    按 provider/model 限流的令牌桶。
+    令牌不足时调用方进入按优先级排序的等待队列，令牌补充后优先放行高优先级的请求。
+    只在单个事件循环内使用。
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.rate_limited = 0
+        self.total_wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _dispatch(self):
+        self._wakeup = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+
+        if self._waiters:
+            delay = (1 - self._tokens) / self.rate
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority: LLMPriority):
+        start = time.monotonic()
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+            if self._wakeup is None:
+                self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                # 已经分到令牌但被取消，归还令牌
+                if future.done() and not future.cancelled():
+                    self._tokens += 1
+                    if self._wakeup is None:
+                        self._dispatch()
+                raise
+        self.admitted += 1
+        self.total_wait_seconds += time.monotonic() - start
+
+    def drain(self):
+        """服务端返回 429 时清空令牌，后续请求按补充速率重新放行"""
+        self._refill()
+        self._tokens = 0
+        self.rate_limited += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "rate_per_minute": round(self.rate * 60, 3),
+            "burst": self.capacity,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.admitted, 3) if self.admitted else 0.0,
+        }
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    message = str(error)
+    return "429" in message or "ResourceExhausted" in type(error).__name__ or "rate limit" in message.lower()
+
+
+class LLMScheduler:
+    """
+    在发起 LLM 请求前按 provider/model 的配额放行。
+    未配置限额的模型直接放行。
+    """
+
+    def __init__(self, limits: Dict[str, float], burst: int):
+        self.limits = limits
+        self.burst = burst
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+    def _get_bucket(self, provider: str, model: str) -> Optional[TokenBucket]:
+        key = (provider, model)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate = self.limits.get(f"{provider}/{model}")
+            if not rate:
+                return None
+            bucket = TokenBucket(rate, self.burst)
+            self._buckets[key] = bucket
+        return bucket
+
+    @asynccontextmanager
+    async def admit(self, provider: str, model: str, priority: Optional[LLMPriority] = None):
+        bucket = self._get_bucket(provider, model)
+        if bucket is None:
+            yield
+            return
+
+        await bucket.acquire(priority if priority is not None else llm_priority.get())
+        try:
+            yield
+        except Exception as e:
+            if _is_rate_limited(e):
+                logger.warning(f"LLM rate limited, provider: {provider}, model: {model}")
+                bucket.drain()
+            raise
+
+    def stats(self) -> dict:
+        return {f"{provider}/{model}": bucket.to_dict() for (provider, model), bucket in self._buckets.items()}
+
+
+llm_scheduler = LLMScheduler(settings.llm_rate_limits, settings.llm_rate_limit_burst)
@@ -11,25 +11,24 @@ from sqlalchemy import Tuple
 from app.database.models.chat import SessionRecord
 from app.database.models.content import Content
 from app.libs.rag.agent_template import get_template_with_datasets
-from app.libs.rag.rag_object import rag_object
-from app.libs.rag.ragflow_sdk.modules.agent import Agent
-from app.libs.rag.ragflow_sdk.modules.session import Session
+from app.libs.rag.handle_cache import rag_handle_cache
+from app.libs.rag.rag_object import async_rag_object
+from app.libs.rag.ragflow_sdk.async_ragflow import AsyncAgent, AsyncSession
 
 logger = logging.getLogger(__name__)
 
 @dataclass
 class AgentChatResult:
     """Result container for agent chat creation"""
-    session: Optional[Session] = None
-    agent: Optional[Agent] = None
+    session: Optional[AsyncSession] = None
+    agent: Optional[AsyncAgent] = None
 
 
-async def get_agent(agent_id: str) -> Optional[Agent]:
+async def get_agent(agent_id: str) -> Optional[AsyncAgent]:
     """Get an agent by its ID"""
     try:
-        list_agents = lambda: rag_object.list_agents(id=agent_id)
-        agents = await asyncio.to_thread(list_agents)
-        
+        agents = await async_rag_object.list_agents(id=agent_id)
+
         if agents:
             return agents[0]
     except Exception as e:
@@ -37,49 +36,70 @@ async def get_agent(agent_id: str) -> Optional[Agent]:
     return None
 
 
+def _set_dsl_dataset_ids(dsl: dict, dataset_ids: List[str]):
+    """把 dataset_ids 写入 DSL 中所有检索组件"""
+    dsl['components']['Retrieval:BeigeBananasSing']['obj']['params']['kb_ids'] = dataset_ids
+    dsl['components']['Retrieval:BumpyGroupsRelate']['obj']['params']['kb_ids'] = dataset_ids
+
+    # 遍历 graph nodes，找到 label 为 "Retrival" 的节点并赋值
+    if 'graph' in dsl and 'nodes' in dsl['graph']:
+        for node in dsl['graph']['nodes']:
+            if (
+                node.get('data')
+                and 'form' in node['data']
+                and node['data'].get('label') == "Retrieval"
+            ):
+                node['data']['form']['kb_ids'] = dataset_ids
+
+
 async def create_agent_chat(dataset_ids: List[str], 
                             session_record: Optional[SessionRecord], 
                             use_web_search_modified:Optional[bool] = False,
                             use_web_search: Optional[bool] = False, 
                             agent_title: Optional[str] = None) -> AgentChatResult:
-    """Create and initialize a new agent chat instance"""
-    
+    """Create and initialize a new agent chat instance
+
+    Agent and session handles are cached together with the fingerprint of the dataset ids
+    last written into the agent DSL; the DSL update is skipped while the datasets are unchanged.
+    """
+    fingerprint = rag_handle_cache.fingerprint(sorted(dataset_ids))
+
     if session_record:
-        agent = await get_agent(session_record.agent_id)
-        
-        session = None
-        # 更新agent的dsl配置
-        dsl = agent.dsl.to_json()
-        dsl['components']['Retrieval:BeigeBananasSing']['obj']['params']['kb_ids'] = dataset_ids
-        dsl['components']['Retrieval:BumpyGroupsRelate']['obj']['params']['kb_ids'] = dataset_ids
-
-        # 遍历 graph nodes，找到 label 为 "Retrival" 的节点并赋值
-        if 'graph' in dsl and 'nodes' in dsl['graph']:
-            for node in dsl['graph']['nodes']:
-                if (
-                    node.get('data')
-                    and 'form' in node['data']
-                    and node['data'].get('label') == "Retrieval"
-                ):
-                    node['data']['form']['kb_ids'] = dataset_ids
-        
-        rag_object.update_agent(agent.id, title=agent_title, dsl=dsl)
-        
-        agent = await get_agent(session_record.agent_id)
-        
-        if not agent:
-            raise ValueError("Agent not found after update")
-            
-        sessions = agent.list_sessions(id=session_record.session_id)
-        if len(sessions) > 0:
-            session = sessions[0]
-            if use_web_search_modified:
-                agent.delete_sessions([session_record.session_id])
-                session = agent.create_session(web_search="1" if use_web_search else "0")
-            
-        else:
-            session = agent.create_session(web_search="1" if use_web_search else "0")
-        
+        cache_key = ("agent", session_record.agent_id)
+        cached = rag_handle_cache.get(cache_key)
+        try:
+            if cached:
+                agent, dsl = cached["agent"], cached["dsl"]
+            else:
+                agent = await get_agent(session_record.agent_id)
+                if not agent:
+                    raise ValueError("Agent not found")
+                dsl = agent.dsl.to_json()
+
+            if not cached or cached["fingerprint"] != fingerprint:
+                # 更新agent的dsl配置
+                _set_dsl_dataset_ids(dsl, dataset_ids)
+                await async_rag_object.update_agent(agent.id, title=agent_title, dsl=dsl)
+                rag_handle_cache.set(cache_key, agent=agent, dsl=dsl, fingerprint=fingerprint,
+                                     sessions=cached["sessions"] if cached else {})
+
+            sessions = rag_handle_cache.get(cache_key)["sessions"]
+            session = sessions.get(session_record.session_id)
+            if session is None:
+                found = await agent.list_sessions(id=session_record.session_id)
+                session = found[0] if found else None
+
+            if session and use_web_search_modified:
+                await agent.delete_sessions([session.id])
+                session = None
+            if session is None:
+                session = await agent.create_session(web_search="1" if use_web_search else "0")
+            sessions[session_record.session_id] = session
+        except Exception:
+            # 缓存的句柄可能已失效（agent 或会话在 RAGFlow 侧被删除），下次请求重新加载
+            rag_handle_cache.invalidate(cache_key)
+            raise
+
         return AgentChatResult(agent=agent, session=session)
     else:
         # 使用提供的agent_title，如果没有则生成一个随机ID作为title
@@ -87,8 +107,8 @@ async def create_agent_chat(dataset_ids: List[str],
         
         # 使用修改后的模板创建agent
         modified_template = get_template_with_datasets(dataset_ids)
-        rag_object.create_agent(title=agent_name, dsl=modified_template)
-        list_agents = rag_object.list_agents(title=agent_name)
+        await async_rag_object.create_agent(title=agent_name, dsl=modified_template)
+        list_agents = await async_rag_object.list_agents(title=agent_name)
 
         agent = None
         if len(list_agents) > 0:
@@ -97,8 +117,10 @@ async def create_agent_chat(dataset_ids: List[str],
         if not agent:
             raise ValueError("No agent found")
         
-        session = agent.create_session(web_search="1" if use_web_search else "0")
+        session = await agent.create_session(web_search="1" if use_web_search else "0")
+
+        # 新会话记录以 session.id 保存，后续请求直接命中缓存
+        rag_handle_cache.set(("agent", agent.id), agent=agent, dsl=agent.dsl.to_json(), fingerprint=fingerprint,
+                             sessions={session.id: session})
         
         return AgentChatResult(agent=agent, session=session)
-        
-
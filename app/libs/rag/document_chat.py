@@ -5,9 +5,10 @@ import time
 from typing import Iterator, List, Union, AsyncIterator
 
 import nanoid
-from app.libs.rag.ragflow_sdk.ragflow  import Chat
+from app.libs.rag.ragflow_sdk.async_ragflow import AsyncChat, AsyncSession
 from app.config import settings
-from app.libs.rag.rag_object import rag_object
+from app.libs.rag.handle_cache import rag_handle_cache
+from app.libs.rag.rag_object import async_rag_object
 
 
 logger = logging.getLogger(__name__)
@@ -25,30 +26,58 @@ class DocumentChat:
         self.session = None
 
     async def initialize(self):
-        """Initialize the chat assistant asynchronously"""
-        self.assistant = await self._create_chat_assistant()
-        await asyncio.to_thread(
-            self.assistant.update,
-            update_message={
-                "name": self.assistant_name,
-                "dataset_ids": self.dataset_ids,
-                "llm": {
-                    "frequency_penalty": 0.7,
-                    "presence_penalty": 0.4,
-                    "temperature": 0.1,
-                    "top_p": 0.3
-                },
-                "prompt": {
-                    "tavily_api_key": settings.tavily_api_key,
-                }
+        """Initialize the chat assistant asynchronously
+
+        The assistant handle and the fingerprint of the configuration last pushed to it
+        are cached, so the update is skipped while dataset ids and settings are unchanged.
+        """
+        update_message = {
+            "name": self.assistant_name,
+            "dataset_ids": self.dataset_ids,
+            "llm": {
+                "frequency_penalty": 0.7,
+                "presence_penalty": 0.4,
+                "temperature": 0.1,
+                "top_p": 0.3
+            },
+            "prompt": {
+                "tavily_api_key": settings.tavily_api_key,
             }
-        )
+        }
+        fingerprint = rag_handle_cache.fingerprint({**update_message, "dataset_ids": sorted(self.dataset_ids)})
+
+        cached = rag_handle_cache.get(self._cache_key)
+        if cached:
+            self.assistant = cached["assistant"]
+            self.session = cached.get("session")
+            if cached["fingerprint"] == fingerprint:
+                return self
+        else:
+            self.assistant = await self._create_chat_assistant()
+
+        try:
+            await self.assistant.update(update_message=update_message)
+        except Exception:
+            if not cached:
+                raise
+            # 缓存的助手可能已在 RAGFlow 被删除，重新查找后再试一次
+            logger.warning(f"Cached chat assistant {self.assistant_name} is stale, reloading")
+            rag_handle_cache.invalidate(self._cache_key)
+            self.assistant = await self._create_chat_assistant()
+            self.session = None
+            await self.assistant.update(update_message=update_message)
+
+        rag_handle_cache.set(self._cache_key, assistant=self.assistant, fingerprint=fingerprint, session=self.session)
         return self
 
-    async def _create_chat_assistant(self):
+    @property
+    def _cache_key(self) -> tuple:
+        return ("assistant", self.assistant_name)
+
+    async def _create_chat_assistant(self) -> AsyncChat:
         """Create a chat assistant for the datasets"""
         try:
-            chats = await asyncio.to_thread(rag_object.list_chats, name=self.assistant_name)
+            chats = await async_rag_object.list_chats(name=self.assistant_name)
             if chats:
                 return chats[0]
         except Exception as e:
@@ -56,8 +85,7 @@ class DocumentChat:
             # Continue to create new assistant if getting existing one fails
 
         try:
-            return await asyncio.to_thread(
-                rag_object.create_chat,
+            return await async_rag_object.create_chat(
                 name=self.assistant_name,
                 dataset_ids=self.dataset_ids,
             )
@@ -65,18 +93,19 @@ class DocumentChat:
             logger.error(f"Error creating chat assistant: {str(e)}")
             raise
 
-    async def _get_or_create_session(self):
+    async def _get_or_create_session(self) -> AsyncSession:
         """Get or create a session for chat"""
+        if self.session:
+            return self.session
         try:
-            # self.assistant.post
-            sessions = await asyncio.to_thread(self.assistant.list_sessions)
+            sessions = await self.assistant.list_sessions()
             if sessions:
                 self.session = sessions[0]
             else:
-                self.session = await asyncio.to_thread(
-                    self.assistant.create_session,
+                self.session = await self.assistant.create_session(
                     name=f"session - {time.strftime('%Y-%m-%d %H:%M:%S')}"
                 )
+            rag_handle_cache.update(self._cache_key, session=self.session)
             return self.session
         except Exception as e:
             logger.error(f"Error getting or creating session: {str(e)}")
@@ -96,34 +125,21 @@ class DocumentChat:
         try:
             session = await self._get_or_create_session()
             if stream:
-                # 对于流式响应，我们需要在异步生成器中处理每个块
+                # 直接消费 SSE 流，每个块不再经过线程池
                 async def async_generator():
                     try:
-                        # 在线程池中获取同步迭代器
-                        sync_iterator = await asyncio.to_thread(session.ask, question, stream=True)
-                        # 遍历同步迭代器中的每个块
-                        while True:
-                            try:
-                                # 在线程池中获取下一个块
-                                chunk = await asyncio.to_thread(next, sync_iterator, None)
-                                if chunk is None:
-                                    break
-                                yield chunk
-                            except StopIteration:
-                                break
-                            except Exception as e:
-                                logger.error(f"Error getting next chunk: {str(e)}")
-                                yield f"Error: {str(e)}"
-                                break
+                        async for chunk in session.ask(question, stream=True):
+                            yield chunk
                     except Exception as e:
                         logger.error(f"Stream error: {str(e)}")
+                        rag_handle_cache.invalidate(self._cache_key)
                         yield f"Error: {str(e)}"
                 return async_generator()
             else:
-                # 非流式响应直接使用 to_thread
-                return await asyncio.to_thread(session.ask, question, stream=False)
+                return await session.ask(question, stream=False)
         except Exception as e:
             logger.error(f"Chat error: {str(e)}")
+            rag_handle_cache.invalidate(self._cache_key)
             return f"Error: {str(e)}"
 
 
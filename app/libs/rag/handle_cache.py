@@ -0,0 +1,55 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RAGHandleCache:
+    """
+    进程内 TTL 缓存：RAGFlow 助手、agent 和会话句柄，以及最后一次推送给它们的配置指纹。
+    指纹未变化时跳过 list/update 调用；使用缓存句柄的调用失败时由调用方 invalidate。
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def fingerprint(value: Any) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, values = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return values
+
+    def set(self, key: Hashable, **values):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, values)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def update(self, key: Hashable, **values):
+        """Merge values into a live entry, no-op if it expired or was invalidated"""
+        entry = self.get(key)
+        if entry is not None:
+            entry.update(values)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+
+rag_handle_cache = RAGHandleCache(settings.rag_handle_cache_ttl, settings.rag_handle_cache_max_entries)
@@ -58,3 +58,40 @@ async def generate_followup_questions(context: str, question: str, last_response
     })
     res = await structure_llm.ainvoke(formated_prompt)
     return res.questions
+
+
+async def generate_welcome_questions(context: str) -> List[str]:
+    """
+    Generate starter questions for a chat about a content or a knowledge base.
+
+    Args:
+        context (str): Titles and summaries of the contents the chat can draw on
+
+    Returns:
+        List[str]: Starter questions
+    """
+    prompt_template = """
+    Generate 3 starter questions a reader might ask when opening a chat about the materials below.
+
+    Materials:
+    {context} \n\n
+
+    Guidelines:
+    1. Use the same language as the materials
+    2. Each question must be answerable from the materials
+    3. Cover different aspects: the main idea, an important detail, a practical takeaway
+
+    Constraints:
+    - Questions should feel natural, not technical or formal
+    - Most important, make sure each question is concise and clear
+    """
+
+    prompt = PromptTemplate(
+        template=prompt_template,
+        input_variables=["context"],
+    )
+
+    structure_llm = llm.with_structured_output(FollowUpQuestions)
+    formated_prompt = prompt.invoke({"context": context})
+    res = await structure_llm.ainvoke(formated_prompt)
+    return res.questions
@@ -1,7 +1,25 @@
 import logging
 from app.config import settings
 from app.libs.rag.ragflow_sdk.ragflow import RAGFlow
+from app.libs.rag.ragflow_sdk.async_ragflow import AsyncRAGFlow
 logger = logging.getLogger(__name__)
 logger.info("Initializing RAGFlow SDK with API key and base URL")
 # Initialize the RAGFlow object with API key and base URL
-rag_object = RAGFlow(api_key=settings.ragflow_key, base_url=settings.ragflow_base)
\ No newline at end of file
+rag_object = RAGFlow(
+    api_key=settings.ragflow_key,
+    base_url=settings.ragflow_base,
+    pool_size=settings.ragflow_pool_size,
+    connect_timeout=settings.ragflow_connect_timeout,
+    read_timeout=settings.ragflow_read_timeout,
+    max_retries=settings.ragflow_max_retries,
+)
+
+# Asyncio client for the API process, avoids a thread pool hop per call and per streamed chunk
+async_rag_object = AsyncRAGFlow(
+    api_key=settings.ragflow_key,
+    base_url=settings.ragflow_base,
+    pool_size=settings.ragflow_pool_size,
+    connect_timeout=settings.ragflow_connect_timeout,
+    read_timeout=settings.ragflow_read_timeout,
+    max_retries=settings.ragflow_max_retries,
+)
@@ -1,27 +1,33 @@
 import os
 import json
 import logging
-import tempfile
-import aiohttp
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import asyncio
-import time
 from app.config import settings
 from app.libs.rag.ragflow_sdk.ragflow  import DataSet, RAGFlow
-from app.database.models.content import Content, ContentMediaType
+from app.libs.rag.ragflow_sdk.async_ragflow import AsyncDataSet, AsyncRAGFlow
+from app.database.models.content import Content, ContentMediaType, RAGProcessingStatus
+from app.database.repositories.content_repository import content_repository
+from app.database.session import unit_of_work
 from app.api.file.file import storage
 import re
 
-from app.libs.rag.rag_object import rag_object
+from app.libs.rag.rag_object import async_rag_object, rag_object
+from app.libs.rag.readiness_tracker import rag_readiness_tracker
 
 logger = logging.getLogger(__name__)
 
+# 存储文件流式上传到 RAGFlow 时每次读取的大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 class RAGUtils:
     rag_object: RAGFlow
+    async_rag_object: AsyncRAGFlow
 
-    def __init__(self, rag_object: RAGFlow):
+    def __init__(self, rag_object: RAGFlow, async_rag_object: AsyncRAGFlow):
         self.rag_object = rag_object
+        self.async_rag_object = async_rag_object
 
     def _clean_filename(self, filename: str) -> str:
         """Clean filename by removing special characters and ensuring proper encoding
@@ -104,7 +110,7 @@ class RAGUtils:
     async def _get_content_and_file_info(self, article: Content) -> Tuple[str, str, bool]:
         """
         Get content and file information based on media type.
-        Returns: (content, file_extension)
+        Returns: (content or storage uri, file_extension, is_text_file)
         """
         if article.media_type == ContentMediaType.article:
             return article.content, ".txt", True
@@ -126,10 +132,192 @@ class RAGUtils:
             else:
                 return article.content, ".txt", True
         else:
-            # For other types, get the file from storage
-            file_url = storage.get_url(article.file_name_in_storage)
+            # For other types, the file is streamed from storage
             file_extension = os.path.splitext(article.file_name_in_storage)[1]
-            return file_url, file_extension, False
+            return article.file_name_in_storage, file_extension, False
+
+    async def claim_reusable_document(self, article: Content) -> Optional[Tuple[str, str]]:
+        """Share the uploaded dataset/document pair of another content with the same hash
+
+        The pair is written to the article (rag_status processing) under the dataset
+        lock, after re-checking that it is still referenced, so a concurrent
+        release_dataset never deletes a dataset that is being reused.
+
+        Args:
+            article: Content object containing the article information
+
+        Returns:
+            Optional[Tuple[str, str]]: (dataset_id, document_id) now shared by the
+            article, None if the content has no hash or nothing can be reused
+        """
+        if not article.content_hash:
+            return None
+        document = await content_repository.get_rag_document_by_content_hash(
+            article.content_hash, article.media_type, article.id
+        )
+        if not document:
+            return None
+
+        dataset_id, doc_id = document
+        async with unit_of_work():
+            await content_repository.lock_dataset(dataset_id)
+            # 等锁期间数据集可能已被释放
+            if await content_repository.count_dataset_references(dataset_id, article.id) == 0:
+                return None
+            await content_repository.update(
+                article.id,
+                dataset_id=dataset_id,
+                dataset_doc_id=doc_id,
+                rag_status=RAGProcessingStatus.processing,
+                returning=False,
+            )
+        return document
+
+    async def release_dataset(self, dataset_id: str, content_id: Optional[int] = None) -> bool:
+        """Delete a dataset once no other live content references it
+
+        Datasets may be shared by contents with the same hash (and by copied
+        contents), so the live rows pointing at a dataset act as its reference count.
+        The count and the delete run under the dataset lock taken by
+        claim_reusable_document.
+
+        Args:
+            dataset_id: Dataset ID
+            content_id: Content releasing its reference, not counted
+
+        Returns:
+            bool: True if the dataset was deleted
+        """
+        async with unit_of_work():
+            await content_repository.lock_dataset(dataset_id)
+            references = await content_repository.count_dataset_references(dataset_id, content_id)
+            if references > 0:
+                logger.info(f"Keep dataset {dataset_id}, still referenced by {references} contents")
+                return False
+
+            await asyncio.to_thread(self.rag_object.delete_datasets, ids=[dataset_id])
+        logger.info(f"Deleted dataset {dataset_id}, no content references it")
+        return True
+
+    async def _get_or_create_dataset(self, article: Content) -> Optional[DataSet]:
+        """Get the dataset of an article, creating it if it does not exist"""
+        # Create a dataset name using article ID
+        dataset_name = f"post_{article.media_type.value}_{article.uid}"
+
+        # Try to get existing dataset or create new one
+        try:
+            datasets = await asyncio.to_thread(
+                self.rag_object.list_datasets, name=dataset_name
+            )
+            if datasets:
+                return datasets[0]
+
+        except Exception as e:
+            # dataset not found, create new one
+            try:
+                return await asyncio.to_thread(
+                    self.rag_object.create_dataset,
+                    name=dataset_name,
+                    avatar="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAwMCAO+ip1sAAAAASUVORK5CYII=",
+                    # parser_config=DataSet.ParserConfig(
+                    #     rag=self.rag_object,
+                    #     res_dict={
+                            
+
+                    #         "html4excel": False,
+                    #         "layout_recognize": "Naive",
+                    #         "raptor": {},
+                    #         "task_page_size": 12,
+                    #         "chunk_token_num": 128,
+                    #         "delimiter": "\n.!?;。；！？,:：，",
+                    #         "pages": [[1, 1024]],
+                    #     },
+                    # ),
+                    embedding_model="text-embedding-3-small@Azure-OpenAI",
+                )
+            except Exception as e:
+                logger.error(
+                    f"Dataset not exist, and error creating dataset: {str(e)}"
+                )
+        return None
+
+    async def _prepare_document(self, article: Content) -> Optional[dict]:
+        """Build the upload entry of an article, None if it has no content
+
+        Text is encoded in memory. Stored files are only referenced by their storage
+        uri and streamed into the upload request by _upload_documents.
+        """
+        content, file_extension, is_text_file = await self._get_content_and_file_info(article)
+
+        if not str(content).strip():  # Ensure content is a string and strip it
+            logger.warning(
+                f"Skipping article {article.id} due to empty content after processing"
+            )
+            return None
+
+        # Clean and truncate title for display name
+        safe_title = self._clean_filename(article.title)
+        truncated_title = self._truncate_title(safe_title)
+        display_name = f"{truncated_title}{file_extension}"
+
+        if is_text_file:
+            blob = content if isinstance(content, bytes) else content.encode("utf-8")
+            return {"display_name": display_name, "blob": blob}
+        return {"display_name": display_name, "uri": content}
+
+    async def _upload_documents(self, dataset: DataSet, documents: List[dict]) -> list:
+        """Upload documents to a dataset, returned in the order of the input
+
+        In-memory documents share one upload_documents call. Stored files are streamed
+        from storage into their own multipart request, so memory stays bounded by the
+        chunk size whatever the file size.
+        """
+        uploaded = [None] * len(documents)
+
+        blob_indexes = [index for index, document in enumerate(documents) if "blob" in document]
+        if blob_indexes:
+            blob_documents = await asyncio.to_thread(
+                dataset.upload_documents, [documents[index] for index in blob_indexes]
+            )
+            for index, document in zip(blob_indexes, blob_documents):
+                uploaded[index] = document
+
+        stream_dataset = AsyncDataSet(self.async_rag_object, {"id": dataset.id})
+        for index, document in enumerate(documents):
+            if "uri" in document:
+                size = await storage.size(document["uri"])
+                stream_documents = await stream_dataset.upload_document_stream(
+                    document["display_name"],
+                    storage.stream(document["uri"], UPLOAD_CHUNK_SIZE),
+                    size,
+                )
+                uploaded[index] = stream_documents[0]
+
+        return uploaded
+
+    async def _configure_document_parser(self, dataset: DataSet, article: Content, doc_id: str):
+        if article.media_type != ContentMediaType.pdf:
+            return
+
+        documents_in_dataset = await asyncio.to_thread(dataset.list_documents, id=doc_id)
+        if documents_in_dataset:
+            await asyncio.to_thread(
+                documents_in_dataset[0].update,
+                {
+                    "parser_config": {
+                        "layout_recognize": "Plain Text",
+                        "auto_keywords": 0,
+                        "auto_questions": 0,
+                        "raptor": {
+                            "use_raptor": False,
+                        },
+                        "task_page_size": 12,
+                        "chunk_token_num": 128,
+                        "delimiter": "\n.!?;。；！？,:：，",
+                        "pages": [[1, 1024]],
+                    }
+                },
+            )
 
     async def process_and_upload_file(
         self, article: Content
@@ -146,142 +334,33 @@ class RAGUtils:
                 started_successfully: True if parsing started successfully
         """
         dataset = None
-        temp_file_path = None
         try:
             
             logging.info(f"Processing article {article.uid} with title: {article.title}")
             logging.info(f"Processing with settings.ragflow_base {settings.ragflow_base}")
-            # Create a dataset name using article ID
-
-            dataset_name = f"post_{article.media_type.value}_{article.uid}"
-
-            # Try to get existing dataset or create new one
-            try:
-                datasets = await asyncio.to_thread(
-                    self.rag_object.list_datasets, name=dataset_name
-                )
-                if datasets:
-                    dataset = datasets[0]
 
-            except Exception as e:
-                # dataset not found, create new one
-                try:
-                    dataset = await asyncio.to_thread(
-                        self.rag_object.create_dataset,
-                        name=dataset_name,
-                        avatar="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAwMCAO+ip1sAAAAASUVORK5CYII=",
-                        # parser_config=DataSet.ParserConfig(
-                        #     rag=self.rag_object,
-                        #     res_dict={
-                                
-
-                        #         "html4excel": False,
-                        #         "layout_recognize": "Naive",
-                        #         "raptor": {},
-                        #         "task_page_size": 12,
-                        #         "chunk_token_num": 128,
-                        #         "delimiter": "\n.!?;。；！？,:：，",
-                        #         "pages": [[1, 1024]],
-                        #     },
-                        # ),
-                        embedding_model="text-embedding-3-small@Azure-OpenAI",
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"Dataset not exist, and error creating dataset: {str(e)}"
-                    )
-                    return None, None, False
-
-            content, file_extension, is_text_file = await self._get_content_and_file_info(article)
-
-            if not str(content).strip():  # Ensure content is a string and strip it
-                logger.warning(
-                    f"Skipping article {article.id} due to empty content after processing"
-                )
-                if dataset:
-                    await asyncio.to_thread(
-                        self.rag_object.delete_datasets, ids=[dataset.id]
-                    )
+            dataset = await self._get_or_create_dataset(article)
+            if not dataset:
                 return None, None, False
 
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(
-                mode="w+" if is_text_file else "w+b",
-                suffix=file_extension,
-                delete=False,
-            ) as temp_file:
-                
-                temp_file_path = temp_file.name
-                if is_text_file:
-                    # Ensure content is a string before writing to text file
-                    if isinstance(content, bytes):
-                        content = content.decode('utf-8', errors='replace')
-                    temp_file.write(content)
-                else:
-                    # Download the file
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(content) as response:
-                            content_bytes = await response.read()
-                            # For binary mode, we need to use binary write
-                            if hasattr(temp_file, 'buffer'):
-                                temp_file.buffer.write(content_bytes)
-                            else:
-                                temp_file.write(content_bytes)
-
-            # Clean and truncate title for display name
-            safe_title = self._clean_filename(article.title)
-            truncated_title = self._truncate_title(safe_title)
+            document = await self._prepare_document(article)
+            if not document:
+                await self.release_dataset(dataset.id, article.id)
+                return None, None, False
 
             # Upload the document to the dataset
-            with open(temp_file_path, "rb") as f:
-                file_content = f.read()
-
-            documents = await asyncio.to_thread(
-                dataset.upload_documents,
-                [
-                    {
-                        "display_name": f"{truncated_title}{file_extension}",
-                        "blob": file_content,
-                    }
-                ],
-            )
-
-            if article.media_type == ContentMediaType.pdf:
-                documents_in_dataset = dataset.list_documents(id=documents[0].id)
-                if documents_in_dataset:
-                    documents_in_dataset[0].update(
-                        {
-                            "parser_config": {
-                                "layout_recognize": "Plain Text",
-                                "auto_keywords": 0,
-                                "auto_questions": 0,
-                                "raptor": {
-                                    "use_raptor": False,
-                                },
-                                "task_page_size": 12,
-                                "chunk_token_num": 128,
-                                "delimiter": "\n.!?;。；！？,:：，",
-                                "pages": [[1, 1024]],
-                            }
-                        },
-                    )
-
-            # Clean up the temporary file
-            if temp_file_path:
-                os.unlink(temp_file_path)
+            documents = await self._upload_documents(dataset, [document])
 
             if documents:
                 doc_id = documents[0].id
+                await self._configure_document_parser(dataset, article, doc_id)
                 # Start parsing the document
-                dataset.async_parse_documents([doc_id])
+                await asyncio.to_thread(dataset.async_parse_documents, [doc_id])
                 # Return IDs and success status, but don't wait for completion
                 return dataset.id, doc_id, True
 
             # If we get here without documents, clean up the dataset
-            if dataset:
-                await asyncio.to_thread(
-                    self.rag_object.delete_datasets, ids=[dataset.id]
-                )
+            await self.release_dataset(dataset.id, article.id)
             return None, None, False
 
         except Exception as e:
@@ -289,19 +368,102 @@ class RAGUtils:
                 f"Error processing and uploading file for article {article.id}: {str(e)}"
             )
             # Clean up resources in case of error
-            if temp_file_path:
+            if dataset:
                 try:
-                    os.unlink(temp_file_path)
+                    await self.release_dataset(dataset.id, article.id)
                 except Exception:
                     pass
-            if dataset:
+            return None, None, False
+
+    async def process_and_upload_batch(
+        self, articles: List[Content]
+    ) -> Dict[int, Tuple[str, str]]:
+        """Process and upload many articles concurrently
+
+        Chat retrieval is scoped by dataset and every content owns its dataset, so
+        documents are grouped per dataset: each group is sent in one upload_documents
+        call and parsed with one async_parse_documents call. Articles in the batch
+        with the same content hash are uploaded once and share the document.
+
+        Args:
+            articles: Content objects to upload
+
+        Returns:
+            Dict[int, Tuple[str, str]]: content_id -> (dataset_id, document_id) for
+            every article whose parsing started, failed articles are left out
+        """
+        semaphore = asyncio.Semaphore(settings.rag_batch_concurrency)
+
+        # 批次内相同哈希的内容只上传一次
+        leaders: Dict[Tuple, Content] = {}
+        followers: Dict[int, List[int]] = {}
+        for article in articles:
+            key = (article.content_hash, article.media_type) if article.content_hash else (article.id,)
+            leader = leaders.setdefault(key, article)
+            followers.setdefault(leader.id, [])
+            if leader is not article:
+                followers[leader.id].append(article.id)
+
+        async def _prepare(article: Content) -> Optional[Tuple[DataSet, dict]]:
+            async with semaphore:
+                dataset = await self._get_or_create_dataset(article)
+                if not dataset:
+                    return None
+                try:
+                    document = await self._prepare_document(article)
+                    if document:
+                        return dataset, document
+                    await self.release_dataset(dataset.id, article.id)
+                except Exception as e:
+                    logger.error(f"Error preparing document for article {article.id}: {str(e)}")
+                    try:
+                        await self.release_dataset(dataset.id, article.id)
+                    except Exception:
+                        pass
+                return None
+
+        batch = list(leaders.values())
+        prepared = await asyncio.gather(*(_prepare(article) for article in batch))
+
+        groups: Dict[str, Tuple[DataSet, List[Content], List[dict]]] = {}
+        for article, item in zip(batch, prepared):
+            if item:
+                dataset, document = item
+                group = groups.setdefault(dataset.id, (dataset, [], []))
+                group[1].append(article)
+                group[2].append(document)
+
+        async def _upload(dataset: DataSet, group_articles: List[Content], documents: List[dict]) -> Dict[int, Tuple[str, str]]:
+            async with semaphore:
                 try:
+                    uploaded = await self._upload_documents(dataset, documents)
+                    for article, document in zip(group_articles, uploaded):
+                        await self._configure_document_parser(dataset, article, document.id)
                     await asyncio.to_thread(
-                        self.rag_object.delete_datasets, ids=[dataset.id]
+                        dataset.async_parse_documents, [document.id for document in uploaded]
                     )
-                except Exception:
-                    pass
-            return None, None, False
+                    return {
+                        article.id: (dataset.id, document.id)
+                        for article, document in zip(group_articles, uploaded)
+                    }
+                except Exception as e:
+                    logger.error(f"Error uploading documents to dataset {dataset.id}: {str(e)}")
+                    for article in group_articles:
+                        try:
+                            await self.release_dataset(dataset.id, article.id)
+                        except Exception:
+                            pass
+                    return {}
+
+        results: Dict[int, Tuple[str, str]] = {}
+        for uploaded in await asyncio.gather(*(_upload(*group) for group in groups.values())):
+            for content_id, document in uploaded.items():
+                results[content_id] = document
+                for follower_id in followers[content_id]:
+                    results[follower_id] = document
+
+        logger.info(f"Uploaded RAG batch, started: {len(results)}, total: {len(articles)}")
+        return results
 
     async def get_document_status(
         self, dataset_id: str, doc_id: str
@@ -352,46 +514,29 @@ class RAGUtils:
         dataset_id: str,
         doc_id: str,
         timeout_seconds: int = 1200,  # 20分钟超时
-        check_interval_seconds: int = 2,  # 每2秒检查一次
+        content_id: Optional[int] = None,
     ) -> Tuple[bool, Optional[str]]:
         """Wait for document processing to complete with timeout
 
+        Status checks are coalesced by the shared readiness tracker, which backs off
+        per document while parsing makes no progress.
+
         Args:
             dataset_id: Dataset ID
             doc_id: Document ID
             timeout_seconds: Maximum time to wait in seconds
-            check_interval_seconds: Time between status checks in seconds
+            content_id: Content whose rag_status is set to completed/failed when done
 
         Returns:
             Tuple[bool, Optional[str]]: (success, error_message)
             success: True if document processing completed successfully
             error_message: Error message if processing failed, None otherwise
         """
-        start_time = time.time()
-
-        while True:
-            # Check if we've exceeded the timeout
-            if time.time() - start_time > timeout_seconds:
-                return (
-                    False,
-                    f"Document processing timed out after {timeout_seconds} seconds",
-                )
-
-            # Get current status
-            status, error_msg = await self.get_document_status(dataset_id, doc_id)
-            logger.info(f"Document processing status: {status}, error_msg: {error_msg}")
-            if status == "DONE":
-                return True, None
-            elif status == "FAIL":
-                return False, error_msg
-            elif status in ["UNSTART", "RUNNING"]:
-                # Wait before checking again
-                await asyncio.sleep(check_interval_seconds)
-            else:  # CANCEL or unknown status
-                return (
-                    False,
-                    f"Document processing ended with unexpected status: {status}",
-                )
+        succeed, error_msg = await rag_readiness_tracker.wait(
+            dataset_id, doc_id, content_id=content_id, timeout_seconds=timeout_seconds
+        )
+        logger.info(f"Document processing finished, succeed: {succeed}, error_msg: {error_msg}")
+        return succeed, error_msg
 
     async def check_document_ready(
         self, dataset_id: str, doc_id: str
@@ -428,7 +573,6 @@ class RAGUtils:
         doc_id: str,
         callback=None,
         timeout_seconds: int = 600,  # 10分钟超时
-        check_interval_seconds: int = 5,  # 每5秒检查一次
     ) -> asyncio.Task:
         """Process a document in the background with optional callback when done
 
@@ -437,7 +581,6 @@ class RAGUtils:
             doc_id: Document ID
             callback: Optional callback function that accepts (dataset_id, doc_id, success, error_msg)
             timeout_seconds: Maximum time to wait in seconds
-            check_interval_seconds: Time between status checks in seconds
 
         Returns:
             asyncio.Task: Background task that can be awaited or cancelled
@@ -448,7 +591,6 @@ class RAGUtils:
                 dataset_id,
                 doc_id,
                 timeout_seconds=timeout_seconds,
-                check_interval_seconds=check_interval_seconds,
             )
 
             if callable(callback):
@@ -464,4 +606,4 @@ class RAGUtils:
         return task
 
 
-rag_utils = RAGUtils(rag_object)
+rag_utils = RAGUtils(rag_object, async_rag_object)
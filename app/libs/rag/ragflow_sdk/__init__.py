@@ -20,6 +20,7 @@ beartype_this_package()
 import importlib.metadata
 
 from .ragflow import RAGFlow
+from .async_ragflow import AsyncRAGFlow
 from .modules.dataset import DataSet
 from .modules.chat import Chat
 from .modules.session import Session
@@ -31,6 +32,7 @@ __version__ = importlib.metadata.version("ragflow_sdk")
 
 __all__ = [
     "RAGFlow",
+    "AsyncRAGFlow",
     "DataSet",
     "Chat",
     "Session",
@@ -0,0 +1,398 @@
+#
+#  Asyncio variant of the RAGFlow client, built on httpx.AsyncClient.
+#
+#  Mirrors RAGFlow, DataSet, Document, Chat, Agent and Session so the API process
+#  can call RAGFlow without hopping through the default thread pool. Model classes
+#  reuse the attribute defaults of their sync counterparts; only the methods that
+#  talk to the server are redefined as coroutines.
+#
+
+import json
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from .modules.agent import Agent
+from .modules.chat import Chat
+from .modules.dataset import DataSet
+from .modules.document import Document
+from .modules.session import Message, Session
+
+
+class AsyncBase:
+    """Async replacement of Base.post/get/rm/put, mixed in before the sync model class"""
+
+    async def post(self, path, json=None, files=None):
+        return await self.rag.post(path, json, files=files)
+
+    async def post_content(self, path, content, headers=None):
+        return await self.rag.post_content(path, content, headers)
+
+    async def get(self, path, params=None):
+        return await self.rag.get(path, params)
+
+    async def rm(self, path, json):
+        return await self.rag.delete(path, json)
+
+    async def put(self, path, json):
+        return await self.rag.put(path, json)
+
+
+def _raise_for_code(res: dict):
+    if res.get("code") != 0:
+        raise Exception(res.get("message"))
+
+
+class AsyncDocument(AsyncBase, Document):
+    async def update(self, update_message: dict):
+        if "meta_fields" in update_message:
+            if not isinstance(update_message["meta_fields"], dict):
+                raise Exception("meta_fields must be a dictionary")
+        res = await self.put(f"/datasets/{self.dataset_id}/documents/{self.id}", update_message)
+        _raise_for_code(res.json())
+
+
+class AsyncDataSet(AsyncBase, DataSet):
+    async def update(self, update_message: dict):
+        res = await self.put(f"/datasets/{self.id}", update_message)
+        _raise_for_code(res.json())
+
+    async def upload_documents(self, document_list: list[dict]):
+        files = [("file", (ele["display_name"], ele["blob"])) for ele in document_list]
+        res = await self.post(f"/datasets/{self.id}/documents", json=None, files=files)
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncDocument(self.rag, doc) for doc in res["data"]]
+
+    async def upload_document_stream(self, display_name: str, chunks: AsyncIterator[bytes], size: int | None = None):
+        """
+        Upload one document whose content is produced chunk by chunk.
+
+        The multipart body is generated around the chunks, so only one chunk is held in
+        memory. With a known size the request carries a Content-Length, otherwise it is
+        sent with chunked transfer encoding.
+        """
+        boundary = uuid.uuid4().hex
+        # HTML5 form encoding of the filename, as browsers and httpx do
+        filename = display_name.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+        async def body():
+            yield head
+            async for chunk in chunks:
+                yield chunk
+            yield tail
+
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        if size is not None:
+            headers["Content-Length"] = str(len(head) + size + len(tail))
+        res = await self.post_content(f"/datasets/{self.id}/documents", body(), headers)
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncDocument(self.rag, doc) for doc in res["data"]]
+
+    async def list_documents(self, id: str | None = None, keywords: str | None = None, page: int = 1,
+                             page_size: int = 30, orderby: str = "create_time", desc: bool = True):
+        res = await self.get(f"/datasets/{self.id}/documents",
+                             {"id": id, "keywords": keywords, "page": page, "page_size": page_size,
+                              "orderby": orderby, "desc": desc})
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncDocument(self.rag, document) for document in res["data"].get("docs")]
+
+    async def delete_documents(self, ids: list[str] | None = None):
+        res = await self.rm(f"/datasets/{self.id}/documents", {"ids": ids})
+        _raise_for_code(res.json())
+
+    async def async_parse_documents(self, document_ids):
+        res = await self.post(f"/datasets/{self.id}/chunks", {"document_ids": document_ids})
+        _raise_for_code(res.json())
+
+    async def async_cancel_parse_documents(self, document_ids):
+        res = await self.rm(f"/datasets/{self.id}/chunks", {"document_ids": document_ids})
+        _raise_for_code(res.json())
+
+
+class AsyncSession(AsyncBase, Session):
+    def ask(self, question="", stream=True, **kwargs):
+        """
+        stream=True returns an async iterator of Message parsed from the SSE stream,
+        stream=False returns a coroutine resolving to a single Message.
+        """
+        if stream:
+            return self._ask_stream(question, **kwargs)
+        return self._ask_once(question, **kwargs)
+
+    def _completion_request(self, question: str, stream: bool, **kwargs):
+        if self._Session__session_type == "agent":
+            return f"/agents/{self.agent_id}/completions", {"question": question, "stream": stream, "session_id": self.id}
+        payload = {"question": question, "stream": stream, "session_id": self.id}
+        payload.update(kwargs)
+        return f"/chats/{self.chat_id}/completions", payload
+
+    def _to_message(self, data: dict) -> Message:
+        temp_dict = {
+            "content": data["answer"],
+            "role": "assistant"
+        }
+        reference = data.get("reference", {})
+        if reference and "chunks" in reference:
+            temp_dict["reference"] = reference["chunks"]
+        return Message(self.rag, temp_dict)
+
+    async def _ask_stream(self, question: str, **kwargs):
+        path, payload = self._completion_request(question, True, **kwargs)
+        async with self.rag.stream("POST", path, json=payload) as res:
+            async for line in res.aiter_lines():
+                if line.startswith("{"):
+                    raise Exception(json.loads(line)["message"])
+                if not line.startswith("data:"):
+                    continue
+                json_data = json.loads(line[5:])
+                if json_data["data"] is True or json_data["data"].get("running_status"):
+                    continue
+                yield self._to_message(json_data["data"])
+
+    async def _ask_once(self, question: str, **kwargs):
+        path, payload = self._completion_request(question, False, **kwargs)
+        res = await self.post(path, payload)
+        try:
+            json_data = res.json()
+        except ValueError:
+            raise Exception(f"Invalid response {res}")
+        return self._to_message(json_data["data"])
+
+    async def update(self, update_message):
+        res = await self.put(f"/chats/{self.chat_id}/sessions/{self.id}", update_message)
+        _raise_for_code(res.json())
+
+
+class AsyncChat(AsyncBase, Chat):
+    async def update(self, update_message: dict):
+        res = await self.put(f"/chats/{self.id}", update_message)
+        _raise_for_code(res.json())
+
+    async def create_session(self, name: str = "New session") -> AsyncSession:
+        res = await self.post(f"/chats/{self.id}/sessions", {"name": name})
+        res = res.json()
+        _raise_for_code(res)
+        return AsyncSession(self.rag, res["data"])
+
+    async def list_sessions(self, page: int = 1, page_size: int = 30, orderby: str = "create_time", desc: bool = True,
+                            id: str = None, name: str = None) -> list[AsyncSession]:
+        res = await self.get(f"/chats/{self.id}/sessions",
+                             {"page": page, "page_size": page_size, "orderby": orderby, "desc": desc, "id": id, "name": name})
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncSession(self.rag, data) for data in res["data"]]
+
+    async def delete_sessions(self, ids: list[str] | None = None):
+        res = await self.rm(f"/chats/{self.id}/sessions", {"ids": ids})
+        _raise_for_code(res.json())
+
+
+class AsyncAgent(AsyncBase, Agent):
+    async def create_session(self, **kwargs) -> AsyncSession:
+        res = await self.post(f"/agents/{self.id}/sessions", json=kwargs)
+        res = res.json()
+        _raise_for_code(res)
+        return AsyncSession(self.rag, res.get("data"))
+
+    async def list_sessions(self, page: int = 1, page_size: int = 30, orderby: str = "create_time", desc: bool = True,
+                            id: str = None) -> list[AsyncSession]:
+        res = await self.get(f"/agents/{self.id}/sessions",
+                             {"page": page, "page_size": page_size, "orderby": orderby, "desc": desc, "id": id})
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncSession(self.rag, data) for data in res.get("data")]
+
+    async def delete_sessions(self, ids: list[str] | None = None):
+        res = await self.rm(f"/agents/{self.id}/sessions", {"ids": ids})
+        _raise_for_code(res.json())
+
+
+class AsyncRAGFlow:
+    def __init__(
+        self,
+        api_key,
+        base_url,
+        version="v1",
+        pool_size: int = 10,
+        connect_timeout: float = 5,
+        read_timeout: float = 60,
+        max_retries: int = 3,
+    ):
+        """
+        api_url: http://<host_address>/api/v1
+
+        One httpx.AsyncClient keeps a keep-alive pool for every request made by the
+        client and the objects it returns. Connection failures are retried by the
+        transport; streaming completions have no read timeout.
+        """
+        self.user_key = api_key
+        self.api_url = f"{base_url}/api/{version}"
+        self.authorization_header = {"Authorization": "{} {}".format("Bearer", self.user_key)}
+        self.client = httpx.AsyncClient(
+            headers=self.authorization_header,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=max_retries),
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def post(self, path, json=None, files=None):
+        return await self.client.post(self.api_url + path, json=json, files=files)
+
+    async def post_content(self, path, content, headers=None):
+        return await self.client.post(self.api_url + path, content=content, headers=headers)
+
+    async def get(self, path, params=None):
+        # Match requests' query encoding: drop None values, send booleans as "True"/"False"
+        if params:
+            params = {k: str(v) if isinstance(v, bool) else v for k, v in params.items() if v is not None}
+        return await self.client.get(self.api_url + path, params=params)
+
+    async def delete(self, path, json):
+        return await self.client.request("DELETE", self.api_url + path, json=json)
+
+    async def put(self, path, json):
+        return await self.client.put(self.api_url + path, json=json)
+
+    @asynccontextmanager
+    async def stream(self, method, path, json=None):
+        timeout = httpx.Timeout(self.client.timeout.read, connect=self.client.timeout.connect, read=None)
+        async with self.client.stream(method, self.api_url + path, json=json, timeout=timeout) as res:
+            yield res
+
+    async def create_dataset(
+        self,
+        name: str,
+        avatar: Optional[str] = None,
+        description: Optional[str] = None,
+        embedding_model: Optional[str] = "BAAI/bge-large-zh-v1.5@BAAI",
+        permission: str = "me",
+        chunk_method: str = "naive",
+        pagerank: int = 0,
+        parser_config: DataSet.ParserConfig = None,
+    ) -> AsyncDataSet:
+        payload = {
+            "name": name,
+            "avatar": avatar,
+            "description": description,
+            "embedding_model": embedding_model,
+            "permission": permission,
+            "chunk_method": chunk_method,
+            "pagerank": pagerank,
+        }
+        if parser_config is not None:
+            payload["parser_config"] = parser_config.to_json()
+
+        res = (await self.post("/datasets", payload)).json()
+        _raise_for_code(res)
+        return AsyncDataSet(self, res["data"])
+
+    async def delete_datasets(self, ids: list[str] | None = None):
+        res = await self.delete("/datasets", {"ids": ids})
+        _raise_for_code(res.json())
+
+    async def list_datasets(self, page: int = 1, page_size: int = 30, orderby: str = "create_time", desc: bool = True,
+                            id: str | None = None, name: str | None = None) -> list[AsyncDataSet]:
+        res = await self.get(
+            "/datasets",
+            {"page": page, "page_size": page_size, "orderby": orderby, "desc": desc, "id": id, "name": name},
+        )
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncDataSet(self, data) for data in res["data"]]
+
+    async def create_chat(self, name: str, avatar: str = "", dataset_ids=None, llm: Chat.LLM | None = None,
+                          prompt: Chat.Prompt | None = None) -> AsyncChat:
+        # Same defaults as RAGFlow.create_chat
+        if llm is None:
+            llm = Chat.LLM(
+                self,
+                {
+                    "model_name": None,
+                    "temperature": 0.1,
+                    "top_p": 0.3,
+                    "presence_penalty": 0.4,
+                    "frequency_penalty": 0.7,
+                    "max_tokens": 512,
+                },
+            )
+        if prompt is None:
+            prompt = Chat.Prompt(
+                self,
+                {
+                    "similarity_threshold": 0.2,
+                    "keywords_similarity_weight": 0.7,
+                    "top_n": 8,
+                    "top_k": 1024,
+                    "variables": [{"key": "knowledge", "optional": True}],
+                    "rerank_model": "",
+                    "empty_response": None,
+                    "show_quote": True,
+                },
+            )
+
+        temp_dict = {"name": name, "avatar": avatar, "dataset_ids": list(dataset_ids or []),
+                     "llm": llm.to_json(), "prompt": prompt.to_json()}
+        res = (await self.post("/chats", temp_dict)).json()
+        _raise_for_code(res)
+        return AsyncChat(self, res["data"])
+
+    async def delete_chats(self, ids: list[str] | None = None):
+        res = await self.delete("/chats", {"ids": ids})
+        _raise_for_code(res.json())
+
+    async def list_chats(self, page: int = 1, page_size: int = 30, orderby: str = "create_time", desc: bool = True,
+                         id: str | None = None, name: str | None = None) -> list[AsyncChat]:
+        res = await self.get(
+            "/chats",
+            {"page": page, "page_size": page_size, "orderby": orderby, "desc": desc, "id": id, "name": name},
+        )
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncChat(self, data) for data in res["data"]]
+
+    async def list_agents(self, page: int = 1, page_size: int = 30, orderby: str = "update_time", desc: bool = True,
+                          id: str | None = None, title: str | None = None) -> list[AsyncAgent]:
+        res = await self.get(
+            "/agents",
+            {"page": page, "page_size": page_size, "orderby": orderby, "desc": desc, "id": id, "title": title},
+        )
+        res = res.json()
+        _raise_for_code(res)
+        return [AsyncAgent(self, data) for data in res["data"]]
+
+    async def create_agent(self, title: str, dsl: dict, description: str | None = None) -> None:
+        req = {"title": title, "dsl": dsl}
+        if description is not None:
+            req["description"] = description
+        res = await self.post("/agents", req)
+        _raise_for_code(res.json())
+
+    async def update_agent(self, agent_id: str, title: str | None = None, description: str | None = None,
+                           dsl: dict | None = None) -> None:
+        req = {}
+        if title is not None:
+            req["title"] = title
+        if description is not None:
+            req["description"] = description
+        if dsl is not None:
+            req["dsl"] = dsl
+        res = await self.put(f"/agents/{agent_id}", req)
+        _raise_for_code(res.json())
+
+    async def delete_agent(self, agent_id: str) -> None:
+        res = await self.delete(f"/agents/{agent_id}", {})
+        _raise_for_code(res.json())
@@ -16,6 +16,8 @@
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .modules.agent import Agent
 from .modules.chat import Chat
@@ -24,28 +26,62 @@ from .modules.dataset import DataSet
 
 
 class RAGFlow:
-    def __init__(self, api_key, base_url, version="v1"):
+    def __init__(
+        self,
+        api_key,
+        base_url,
+        version="v1",
+        pool_size: int = 10,
+        connect_timeout: float = 5,
+        read_timeout: float = 60,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+    ):
         """
         api_url: http://<host_address>/api/v1
+
+        All requests, including those issued by DataSet/Document/Chat/Session/Agent
+        through Base, share one keep-alive connection pool. Idempotent methods are
+        retried on connection errors and 502/503/504; POST is never retried.
         """
         self.user_key = api_key
         self.api_url = f"{base_url}/api/{version}"
         self.authorization_header = {"Authorization": "{} {}".format("Bearer", self.user_key)}
+        self.timeout = (connect_timeout, read_timeout)
+        # Streaming answers can pause longer than read_timeout while retrieving
+        self.stream_timeout = (connect_timeout, None)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.authorization_header)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
 
     def post(self, path, json=None, stream=False, files=None):
-        res = requests.post(url=self.api_url + path, json=json, headers=self.authorization_header, stream=stream, files=files)
+        res = self.session.post(url=self.api_url + path, json=json, stream=stream, files=files,
+                                timeout=self.stream_timeout if stream else self.timeout)
         return res
 
     def get(self, path, params=None, json=None):
-        res = requests.get(url=self.api_url + path, params=params, headers=self.authorization_header, json=json)
+        res = self.session.get(url=self.api_url + path, params=params, json=json, timeout=self.timeout)
         return res
 
     def delete(self, path, json):
-        res = requests.delete(url=self.api_url + path, json=json, headers=self.authorization_header)
+        res = self.session.delete(url=self.api_url + path, json=json, timeout=self.timeout)
         return res
 
     def put(self, path, json):
-        res = requests.put(url=self.api_url + path, json=json, headers=self.authorization_header)
+        res = self.session.put(url=self.api_url + path, json=json, timeout=self.timeout)
         return res
 
     def create_dataset(
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.database.models.content import RAGProcessingStatus
+from app.database.repositories.content_repository import content_repository
+from app.libs.rag.rag_object import rag_object
+from app.libs.rag.ragflow_sdk.ragflow import DataSet, RAGFlow
+
+logger = logging.getLogger(__name__)
+
+
+class _DocumentWatch:
+    """Waiters of one document plus its polling schedule"""
+
+    def __init__(self, timeout_seconds: int, min_interval: float):
+        now = time.monotonic()
+        self.futures: List[asyncio.Future] = []
+        self.content_ids: Set[int] = set()
+        self.deadline = now + timeout_seconds
+        self.interval = min_interval
+        self.next_check = now
+        self.progress: Optional[float] = None
+
+
+class RAGReadinessTracker:
+    """
+    Central tracker of RAGFlow document parsing, shared by every waiter in the process.
+
+    Waiters subscribe to a (dataset_id, doc_id) pair and get a future. One background
+    loop issues a single list_documents call per dataset per tick for all due documents
+    and backs off per document while its progress does not move. Once parsing ends the
+    final rag_status of subscribed contents is written in bulk, and the futures resolve
+    only after that write succeeded, so a waiter never returns (and a Celery task never
+    acks) while the status exists only in memory. Failed writes are retried every tick.
+    """
+
+    def __init__(
+        self,
+        rag_object: RAGFlow,
+        tick_seconds: float = 1.0,
+        min_interval: float = 2.0,
+        max_interval: float = 30.0,
+        backoff: float = 1.5,
+        max_concurrent_queries: int = 8,
+    ):
+        self.rag_object = rag_object
+        self.tick_seconds = tick_seconds
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_concurrent_queries = max_concurrent_queries
+        self._watches: Dict[str, Dict[str, _DocumentWatch]] = {}
+        # 待写入的最终 rag_status，写库失败时留到下一轮重试
+        self._pending_completed: Set[int] = set()
+        self._pending_failed: Set[int] = set()
+        # 已结束但状态尚未写入的文档，写入成功后才通知等待方
+        self._finished: List[Tuple[_DocumentWatch, Tuple[bool, Optional[str]]]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def subscribe(
+        self,
+        dataset_id: str,
+        doc_id: str,
+        content_id: Optional[int] = None,
+        timeout_seconds: int = 1200,
+    ) -> asyncio.Future:
+        """Return a future resolving to (success, error_message) once the document is parsed
+
+        Args:
+            dataset_id: Dataset ID
+            doc_id: Document ID
+            content_id: Content whose rag_status is updated when the document finishes
+            timeout_seconds: Maximum time to wait in seconds
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        documents = self._watches.setdefault(dataset_id, {})
+        watch = documents.get(doc_id)
+        if watch is None:
+            watch = _DocumentWatch(timeout_seconds, self.min_interval)
+            documents[doc_id] = watch
+        else:
+            watch.deadline = max(watch.deadline, time.monotonic() + timeout_seconds)
+        watch.futures.append(future)
+        if content_id is not None:
+            watch.content_ids.add(content_id)
+
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return future
+
+    async def wait(
+        self,
+        dataset_id: str,
+        doc_id: str,
+        content_id: Optional[int] = None,
+        timeout_seconds: int = 1200,
+    ) -> Tuple[bool, Optional[str]]:
+        return await self.subscribe(dataset_id, doc_id, content_id, timeout_seconds)
+
+    async def _run(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+
+        while self._watches or self._finished:
+            try:
+                now = time.monotonic()
+                due_datasets = [
+                    dataset_id
+                    for dataset_id, documents in self._watches.items()
+                    if any(watch.next_check <= now or watch.deadline <= now for watch in documents.values())
+                ]
+                if due_datasets:
+                    results = await asyncio.gather(*(self._check_dataset(dataset_id) for dataset_id in due_datasets))
+                    for finished in results:
+                        for watch, result in finished:
+                            # 以最新结果为准
+                            pending, other = (
+                                (self._pending_completed, self._pending_failed) if result[0]
+                                else (self._pending_failed, self._pending_completed)
+                            )
+                            pending.update(watch.content_ids)
+                            other.difference_update(watch.content_ids)
+                        self._finished.extend(finished)
+                await self._update_rag_status()
+                self._resolve_finished()
+            except Exception as e:
+                logger.error(f"Error tracking RAG document readiness: {str(e)}")
+            await asyncio.sleep(self.tick_seconds)
+
+    def _list_documents(self, dataset_id: str, doc_ids: List[str]) -> list:
+        # 直接按 ID 构造数据集对象，省掉一次 list_datasets 调用
+        dataset = DataSet(self.rag_object, {"id": dataset_id})
+        if len(doc_ids) == 1:
+            return dataset.list_documents(id=doc_ids[0])
+        return dataset.list_documents(page_size=max(1024, len(doc_ids)))
+
+    @staticmethod
+    def _evaluate(document) -> Optional[Tuple[bool, Optional[str]]]:
+        """Final (success, error_message) of a document, None while it is still parsing"""
+        if document is None:
+            return False, "Document not found"
+        if document.run == "DONE":
+            logger.info(f"Document processing, chunk size is {document.chunk_count}")
+            if document.chunk_count < 1:
+                return False, "Document processing failed, no chunks found"
+            return True, None
+        if document.run == "FAIL":
+            return False, document.progress_msg or "Document processing failed"
+        if document.run in ["UNSTART", "RUNNING"]:
+            return None
+        return False, f"Document processing ended with unexpected status: {document.run}"
+
+    async def _check_dataset(self, dataset_id: str) -> List[Tuple[_DocumentWatch, Tuple[bool, Optional[str]]]]:
+        documents = self._watches.get(dataset_id, {})
+        # 只评估查询发出前已订阅的文档，查询期间新订阅的文档留到下一轮，避免被误判为不存在
+        doc_ids = list(documents)
+        try:
+            async with self._semaphore:
+                listed = await asyncio.to_thread(self._list_documents, dataset_id, doc_ids)
+            listed_by_id = {document.id: document for document in listed}
+        except Exception as e:
+            # 查询失败视为暂时性错误，按退避间隔重试，直到超时
+            logger.warning(f"Failed to query documents of dataset {dataset_id}: {str(e)}")
+            listed_by_id = None
+
+        finished = []
+        now = time.monotonic()
+        for doc_id in doc_ids:
+            watch = documents.get(doc_id)
+            if watch is None:
+                continue
+            document = listed_by_id.get(doc_id) if listed_by_id is not None else None
+            result = self._evaluate(document) if listed_by_id is not None else None
+
+            if result is None and now >= watch.deadline:
+                result = False, "Document processing timed out"
+
+            if result is None:
+                progress = document.progress if document is not None else None
+                if progress != watch.progress:
+                    watch.progress = progress
+                    watch.interval = self.min_interval
+                else:
+                    watch.interval = min(watch.interval * self.backoff, self.max_interval)
+                watch.next_check = now + watch.interval
+                continue
+
+            del documents[doc_id]
+            finished.append((watch, result))
+
+        if not documents:
+            self._watches.pop(dataset_id, None)
+        return finished
+
+    def _resolve_finished(self):
+        """通知状态已写入的文档的等待方"""
+        unwritten = self._pending_completed | self._pending_failed
+        waiting = []
+        for watch, result in self._finished:
+            if not watch.content_ids.isdisjoint(unwritten):
+                waiting.append((watch, result))
+                continue
+            for future in watch.futures:
+                if not future.done():
+                    future.set_result(result)
+        self._finished = waiting
+
+    async def _update_rag_status(self):
+        for status, pending in (
+            (RAGProcessingStatus.completed, self._pending_completed),
+            (RAGProcessingStatus.failed, self._pending_failed),
+        ):
+            if not pending:
+                continue
+            content_ids = list(pending)
+            try:
+                await content_repository.batch_update_rag_status(content_ids, status)
+                pending.difference_update(content_ids)
+            except Exception as e:
+                logger.error(f"Failed to update rag status to {status.value} for {content_ids}, will retry: {str(e)}")
+
+
+rag_readiness_tracker = RAGReadinessTracker(rag_object)
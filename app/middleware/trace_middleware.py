@@ -1,10 +1,8 @@
 import uuid
-from starlette.middleware.base import BaseHTTPMiddleware
 from contextvars import ContextVar
 import logging
-from starlette.types import ASGIApp, Receive, Scope, Send
-from starlette.responses import Response
-from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import re
 
 # 创建上下文变量
@@ -13,51 +11,45 @@ ua_info_ctx: ContextVar[dict] = ContextVar("ua_info", default={})
 
 logger = logging.getLogger(__name__)
 
-class RequestContextMiddleware(BaseHTTPMiddleware):
+class RequestContextMiddleware:
     """
     合并的中间件，处理请求跟踪ID和UA信息，
     为每个请求添加唯一ID并解析UA信息，
     所有信息存储在上下文变量中，并在响应完成后清理。
+
+    纯 ASGI 实现：下游应用和响应发送都在同一个任务里执行，
+    上下文变量对整个请求可见，响应完整发送后再统一重置。
     """
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # 1. 处理 trace ID
         trace_id = str(uuid.uuid4())
         trace_token = trace_id_ctx.set(trace_id)
-        
+
         # 2. 处理 UA 信息
-        ua = request.headers.get("user-agent", "")
+        ua = Headers(scope=scope).get("user-agent", "")
         ua_info = self._parse_ua(ua)
         ua_token = ua_info_ctx.set(ua_info)
-        
+
+        async def send_with_trace_id(message: Message):
+            if message["type"] == "http.response.start":
+                # 添加 trace ID 到响应头
+                MutableHeaders(scope=message)["X-Trace-ID"] = trace_id
+            await send(message)
+
         try:
-            # 处理请求
-            response = await call_next(request)
-            
-            # 添加 trace ID 到响应头
-            response.headers["X-Trace-ID"] = trace_id
-            
-            # 使用自定义send函数来延迟上下文清理
-            original_send = response.__call__
-            
-            async def send_wrapper(scope, receive, send):
-                try:
-                    # 传递原始响应
-                    await original_send(scope, receive, send)
-                finally:
-                    # 清理所有上下文，确保在响应完全发送后执行
-                    trace_id_ctx.reset(trace_token)
-                    ua_info_ctx.reset(ua_token)
-            
-            # 替换原始的__call__方法
-            response.__call__ = send_wrapper
-            
-            return response
-        except Exception as e:
-            # 确保发生异常时也会重置上下文
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            # 清理所有上下文，确保在响应完全发送后执行
             trace_id_ctx.reset(trace_token)
             ua_info_ctx.reset(ua_token)
-            raise e
-    
+
     def _parse_ua(self, ua: str) -> dict:
         """解析UA字符串为字典"""
         ua_info = {
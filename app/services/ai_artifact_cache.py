@@ -0,0 +1,57 @@
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+from app.database.models.content import Content
+from app.database.repositories.content_repository import content_repository
+from app.libs.llm.content import CONTENT_PROMPT_VERSION
+from app.libs.llm.llm_clients import GEMINI_MODEL
+
+logger = logging.getLogger(__name__)
+
+# 可从缓存复用的 AI 产物字段
+AI_ARTIFACT_FIELDS = ("ai_summary", "ai_structure", "ai_recommend_reason", "ai_tags")
+
+
+class AIArtifactCache:
+    """
+    按内容哈希、模型和提示词版本复用已生成的 AI 产物。
+    同一篇文章或文件被多个用户保存时，只有第一份会调用 LLM。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def build_key(content: Content, process_content: str) -> str:
+        # 音视频等没有 content_hash 的内容按实际送入 LLM 的文本计算
+        content_hash = content.content_hash or hashlib.sha256(process_content.encode("utf-8")).hexdigest()
+        raw_key = f"{content_hash}:{GEMINI_MODEL}:{CONTENT_PROMPT_VERSION}"
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    async def get(self, cache_key: str, content_id: int) -> Optional[dict]:
+        artifacts = await content_repository.get_ai_artifacts_by_cache_key(cache_key, content_id)
+        with self._lock:
+            if artifacts:
+                self.hits += 1
+            else:
+                self.misses += 1
+        logger.info(
+            f"AI artifact cache {'hit' if artifacts else 'miss'} for content {content_id}, stats: {self.stats()}"
+        )
+        return artifacts
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+ai_artifact_cache = AIArtifactCache()
@@ -0,0 +1,44 @@
+import logging
+import os
+from typing import AsyncGenerator, Optional
+
+from app.api.file.file import DEFAULT_UPLOAD_PATH, storage
+from app.database.repositories.storage_blob_repository import storage_blob_repository
+
+logger = logging.getLogger(__name__)
+
+BLOB_PATH = os.path.join(DEFAULT_UPLOAD_PATH, "blobs")
+
+
+def blob_uri(sha256: str, extension: str) -> str:
+    """内容寻址的存储路径，相同字节总是落在同一个 key 上"""
+    return os.path.join(BLOB_PATH, f"{sha256}{extension.lower()}")
+
+
+async def store_blob(
+    sha256: str,
+    size: int,
+    extension: str,
+    chunks: AsyncGenerator[bytes, None],
+    source_key: Optional[str] = None,
+    current_uri: Optional[str] = None,
+) -> str:
+    """
+    保存一份内容并登记一次引用，返回调用方应记录的 uri。
+    已有相同 SHA-256 的对象时不消费 chunks，跳过存储写入直接复用。
+
+    current_uri 为内容当前引用的对象：结果与之相同时内容已持有引用，不再重复登记；
+    不同时由调用方在内容更新成功后 release 旧对象，失败时 release 返回的对象。
+    """
+    blob = await storage_blob_repository.get_by_sha256(sha256)
+    if blob:
+        logger.info(f"Reusing stored blob {blob.uri} for sha256 {sha256}")
+        await chunks.aclose()
+        if blob.uri == current_uri:
+            return blob.uri
+        uri = blob.uri
+    else:
+        uri = blob_uri(sha256, extension)
+        saved = await storage.save_stream(uri, chunks)
+        logger.info(f"Blob saved to {uri}, size: {saved}")
+    return await storage_blob_repository.acquire(sha256, uri, size, source_key)
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from app import settings
+from app.database.dataset_versions import dataset_versions
+from app.database.models.chat import ChatStartType
+
+logger = logging.getLogger(__name__)
+
+
+class ChatDatasetCache:
+    """
+    进程内缓存：对话开始时使用的数据集 ID 列表，按 (user_id, chat_start_type, kb_id) 缓存。
+    每条缓存记录生成时的 dataset_versions 版本，版本变化即失效；TTL 兜底 Redis 不可用时漏掉的失效。
+
+    只比较影响该对话的计数器：收件箱看用户计数器，单个知识库看该知识库计数器，
+    我的知识库看用户的知识库集合计数器加上缓存时集合内各知识库的计数器。
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        user_id: int,
+        chat_start_type: str,
+        kb_id: Optional[int],
+        loader: Callable[[], Awaitable[Tuple[List[str], int]]],
+        kb_ids_loader: Optional[Callable[[], Awaitable[List[int]]]] = None,
+    ) -> Tuple[List[str], int]:
+        """kb_ids_loader 返回对话覆盖的知识库 ID，我的知识库对话必须提供"""
+        key = (user_id, chat_start_type, kb_id)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] <= time.monotonic():
+                entry = None
+        if entry:
+            version = await self._version(user_id, chat_start_type, kb_id, entry[4])
+            if version is not None and entry[0] == version:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                return list(entry[2]), entry[3]
+        with self._lock:
+            self.misses += 1
+
+        # 先读版本再加载数据，加载期间发生的变更会让这条缓存在下次读取时失效
+        kb_ids: Tuple[int, ...] = ()
+        if chat_start_type == ChatStartType.MY_KNOWLEDGE_BASES.value:
+            member_version = await dataset_versions.get(member_id=user_id)
+            kb_ids = tuple(sorted(await kb_ids_loader()))
+            kb_versions = await dataset_versions.get(kb_ids=kb_ids)
+            version = None if member_version is None or kb_versions is None else member_version + kb_versions
+        else:
+            version = await self._version(user_id, chat_start_type, kb_id, kb_ids)
+
+        dataset_ids, total = await loader()
+
+        # Redis 不可用时无法判断失效，不写缓存
+        if version is not None:
+            with self._lock:
+                self._entries[key] = (
+                    version, time.monotonic() + self.ttl_seconds, tuple(dataset_ids), total, kb_ids
+                )
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return dataset_ids, total
+
+    @staticmethod
+    async def _version(
+        user_id: int, chat_start_type: str, kb_id: Optional[int], kb_ids: Tuple[int, ...]
+    ) -> Optional[Tuple[int, ...]]:
+        if chat_start_type == ChatStartType.SINGLE_KNOWLEDGE_BASE.value:
+            return await dataset_versions.get(kb_ids=[kb_id])
+        if chat_start_type == ChatStartType.MY_KNOWLEDGE_BASES.value:
+            return await dataset_versions.get(member_id=user_id, kb_ids=kb_ids)
+        return await dataset_versions.get(user_id=user_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+chat_dataset_cache = ChatDatasetCache(settings.chat_dataset_cache_ttl, settings.chat_dataset_cache_max_entries)
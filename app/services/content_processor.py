@@ -1,4 +1,5 @@
 import hashlib
+import json
 import logging
 from datetime import datetime
 import base64
@@ -9,11 +10,13 @@ from typing import Any, Optional
 import fal_client
 from app.config import StorageType
 from app.database.repositories.content_repository import content_repository
+from app.database.repositories.storage_blob_repository import storage_blob_repository
 from app.libs.doc_parser.index import DocParser
 from app.libs.llm.content import get_image_caption
 from app.services.youtube_service import YouTubeService, YouTubeVideoInfo
 from app.workers import content as content_worker
 from app.workers import rag as rag_worker
+from app.workers import ingest as ingest_worker
 from app.database.models.content import ProcessingStatus, ContentMediaType
 from app.api.file.file import storage
 import tempfile
@@ -124,6 +127,15 @@ class ContentProcessor:
             if not content:
                 return
             
+            # 相同存储对象（内容寻址）和语言已转写过时直接复用字幕，不再调用 ASR
+            reused = await content_repository.get_asr_result_by_file(
+                content.file_name_in_storage, content.lang, content_id
+            )
+            if reused:
+                logger.info(f"Reusing ASR result of {content.file_name_in_storage} for content {content_id}")
+                await ContentProcessor._complete_audio(content_id, reused["media_subtitles"])
+                return
+
             # 获取文件URL
             file_url = storage.get_url(content.file_name_in_storage)
 
@@ -156,19 +168,27 @@ class ContentProcessor:
                 language=content.lang
             )
 
-            await content_repository.update(
-                content_id,
-                media_subtitles=audio_subtitles,
-                processing_status=ProcessingStatus.COMPLETED,
-            )
-
-            content_worker.content_ai_process.delay(content_id)
-            rag_worker.rag_process.delay(content_id)
-
+            await ContentProcessor._complete_audio(content_id, audio_subtitles)
             
         except Exception as e:
             await ContentProcessor._handle_processing_failure_with_notification(content_id, e)
 
+    @staticmethod
+    async def _complete_audio(content_id: int, audio_subtitles: list):
+        """保存字幕并触发后续 AI 和 RAG 处理；内容哈希按字幕计算，相同音频可复用 RAG 文档"""
+        await content_repository.update(
+            content_id,
+            media_subtitles=audio_subtitles,
+            content_hash=ContentProcessor.generate_content_hash(
+                json.dumps(audio_subtitles, ensure_ascii=False, sort_keys=True)
+            ),
+            processing_status=ProcessingStatus.COMPLETED,
+            returning=False,
+        )
+
+        content_worker.content_ai_process.delay(content_id)
+        rag_worker.rag_process.delay(content_id)
+
     @staticmethod
     async def process_file(content_id: int):
         """异步处理文件任务"""
@@ -183,6 +203,30 @@ class ContentProcessor:
             if not content:
                 return
             
+            # 相同存储对象（内容寻址）已解析过时直接复用解析结果，哈希相同也会复用 AI 产物和 RAG 文档
+            reused = await content_repository.get_parse_result_by_file(
+                content.file_name_in_storage, content.media_type, content_id
+            )
+            if reused:
+                logger.info(f"Reusing parse result of {content.file_name_in_storage} for content {content_id}")
+                fields = {
+                    "text_content": reused["text_content"],
+                    "content": reused["content"],
+                    "content_hash": reused["content_hash"],
+                }
+                if content.media_type == ContentMediaType.image:
+                    fields.update(
+                        title=reused["title"],
+                        image_ocr=reused["image_ocr"],
+                        cover=storage.get_url(content.file_name_in_storage),
+                    )
+                await content_repository.update(
+                    content_id, processing_status=ProcessingStatus.COMPLETED, returning=False, **fields
+                )
+                content_worker.content_ai_process.delay(content_id)
+                rag_worker.rag_process.delay(content_id)
+                return
+
             # 获取文件URL
             file_url = storage.get_url(content.file_name_in_storage)
 
@@ -231,6 +275,7 @@ class ContentProcessor:
                         content=html_content,  # 添加 HTML 内容
                         content_hash=ContentProcessor.generate_content_hash(parse_result.text_content),
                         processing_status=ProcessingStatus.COMPLETED,
+                        returning=False,
                     )
                     
                     content_worker.content_ai_process.delay(content_id)
@@ -260,6 +305,7 @@ class ContentProcessor:
                     title=image_caption.title,
                     image_ocr = image_caption.ocr_result,
                     cover=file_url,
+                    returning=False,
                 )
                 
                 content_worker.content_ai_process.delay(content_id)
@@ -303,6 +349,7 @@ class ContentProcessor:
                 media_seconds_duration=video_info.duration,
                 video_embed_url=video_info.videoEmbedUrl,
                 raw_description=video_info.description,
+                returning=False,
             )
 
             content_worker.content_ai_process.delay(content_id)
@@ -337,6 +384,7 @@ class ContentProcessor:
                 cover=parsed_data.get("cover", content.cover),
                 images=parsed_data.get("images", content.images),
                 text_content=parsed_data.get("textContent", content.text_content),  # 完全移除换行符
+                returning=False,
             )
 
             content_worker.content_ai_process.delay(content_id)
@@ -381,31 +429,42 @@ class ContentProcessor:
                 await ContentProcessor._handle_processing_failure_with_notification(content_id, Exception(f"Failed to get Spotify episode ID from URL: {content.source}"))
                 return
 
-            episode_info = await spotify_service.get_episode_info(episode_id)
+            current_uri = content.file_name_in_storage
+            episode_info = await spotify_service.get_episode_info(episode_id, current_uri)
 
             if not episode_info:
                 logger.error(f"Failed to get Spotify episode info for ID: {episode_id}")
                 await ContentProcessor._handle_processing_failure_with_notification(content_id, Exception(f"Failed to get Spotify episode info for ID: {episode_id}"))
                 return
             
-            await content_repository.update(
-                content_id,
-                title=episode_info["title"],
-                site_name="Spotify",
-                author=episode_info["podcast_name"],
-                published_time=episode_info["published_time"],
-                processing_status=ProcessingStatus.PENDING,
-                cover=episode_info["cover"],
-                media_type=ContentMediaType.spotify_audio,
-                media_seconds_duration=episode_info["duration"],
-                # content=episode_info["html_description"] or episode_info["description"] or "",
-                # text_content=episode_info["description"] or "",
-                file_name_in_storage=episode_info["storage_path"],
-                file_type=episode_info["file_type"],
-                raw_description=episode_info["html_description"]
-            )
+            try:
+                await content_repository.update(
+                    content_id,
+                    title=episode_info["title"],
+                    site_name="Spotify",
+                    author=episode_info["podcast_name"],
+                    published_time=episode_info["published_time"],
+                    processing_status=ProcessingStatus.PENDING,
+                    cover=episode_info["cover"],
+                    media_type=ContentMediaType.spotify_audio,
+                    media_seconds_duration=episode_info["duration"],
+                    # content=episode_info["html_description"] or episode_info["description"] or "",
+                    # text_content=episode_info["description"] or "",
+                    file_name_in_storage=episode_info["storage_path"],
+                    file_type=episode_info["file_type"],
+                    raw_description=episode_info["html_description"],
+                    returning=False,
+                )
+            except Exception:
+                # 内容没有指向新对象，释放 get_episode_info 登记的引用
+                if episode_info["storage_path"] != current_uri:
+                    await storage_blob_repository.release(episode_info["storage_path"])
+                raise
+            # 重试或重新投递换了对象时释放旧对象的引用
+            if current_uri and current_uri != episode_info["storage_path"]:
+                await storage_blob_repository.release(current_uri)
 
-            asyncio.create_task(ContentProcessor.audio_asr(content.id))
+            ingest_worker.ingest_process.delay(content.id, "audio_asr")
 
             content_worker.content_ai_process.delay(content_id)
             rag_worker.rag_process.delay(content_id)
@@ -433,6 +492,7 @@ class ContentProcessor:
                 images=twitter_data.get("images"),
                 text_content=twitter_data.get("text_content"),
                 processing_status=ProcessingStatus.COMPLETED,
+                returning=False,
             )
             content_worker.content_ai_process.delay(content_id)
             rag_worker.rag_process.delay(content_id)
@@ -16,6 +16,9 @@ import mimetypes
 import subprocess
 from httpx import TimeoutException, HTTPStatusError, RequestError
 from app.common import retry_async
+from app.database.repositories.storage_blob_repository import storage_blob_repository
+from app.services.blob_storage import store_blob
+import hashlib
 
 logger = logging.getLogger(__name__)
 
@@ -227,8 +230,48 @@ class SpotifyService:
             logger.error(f"Error extracting audio from video: {str(e)}")
             return None
 
+    @staticmethod
+    def _source_key(episode_id: str) -> str:
+        return f"spotify:{episode_id}"
+
+    @staticmethod
+    def _file_sha256(path: str):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(SpotifyService.CHUNK_SIZE):
+                digest.update(chunk)
+        return digest
+
+    async def _iter_file(self, path: str):
+        async with aiofiles.open(path, mode='rb') as f:
+            while chunk := await f.read(self.CHUNK_SIZE):
+                yield chunk
+
+    async def store_episode_audio(
+        self, episode_id: str, current_uri: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Store the audio of an episode, reusing the stored object when this episode was fetched before.
+        A storage reference is taken unless the result equals current_uri (the object the content
+        already references, e.g. on retry or redelivery).
+        Returns (storage_path, file_type)
+        """
+        blob = await storage_blob_repository.get_by_source_key(self._source_key(episode_id))
+        if blob:
+            logger.info(f"Reusing stored audio {blob.uri} for episode {episode_id}")
+            if blob.uri == current_uri:
+                return blob.uri, 'audio_micro'
+            return await storage_blob_repository.acquire(blob.sha256, blob.uri, blob.size), 'audio_micro'
+
+        audio_url = await self.get_episode_audio_url(episode_id)
+        if not audio_url:
+            return None, None
+        return await self.download_and_store_audio(audio_url, episode_id, current_uri)
+
     @retry_async(Exception, tries=2, delay=3, backoff=2)
-    async def download_and_store_audio(self, audio_url: str, episode_id: str) -> Tuple[Optional[str], Optional[str]]:
+    async def download_and_store_audio(
+        self, audio_url: str, episode_id: str, current_uri: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
         """
         Download audio file and store it in storage.
         Returns (storage_path, file_type)
@@ -236,6 +279,7 @@ class SpotifyService:
         temp_file_path = None
         extracted_audio_path = None
         total_size = 0
+        digest = hashlib.sha256()
         
         try:
             timeout = httpx.Timeout(self.DOWNLOAD_TIMEOUT)
@@ -284,6 +328,7 @@ class SpotifyService:
                                     total_size += len(chunk)
                                     if total_size > self.MAX_FILE_SIZE:
                                         raise ValueError(f"File size exceeds maximum allowed size ({self.MAX_FILE_SIZE} bytes)")
+                                    digest.update(chunk)
                                     await f.write(chunk)
                 
                 # Check if we need to extract audio from a non-audio file
@@ -303,18 +348,18 @@ class SpotifyService:
                         logger.info(f"Successfully extracted audio to {extracted_audio_path}")
                         temp_file_path = extracted_audio_path
                         file_extension = '.wav'  # We're converting to aac
+                        # 存储的是提取出的音频，按它的字节重新计算哈希
+                        digest = await asyncio.to_thread(self._file_sha256, temp_file_path)
+                        total_size = os.path.getsize(temp_file_path)
                     else:
                         logger.warning("Failed to extract audio, will try to use original file")
                 
-                # Generate storage path
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                file_name = f"spotify_{episode_id}_{timestamp}{file_extension}"
-                storage_path = os.path.join(DEFAULT_UPLOAD_PATH, f"{file_name}")
-                
-                # Read file and store to S3 asynchronously
-                async with aiofiles.open(temp_file_path, mode='rb') as f:
-                    file_content = await f.read()
-                    await storage.save(storage_path, file_content)
+                # Store under the content-addressed key, skipping the write if the bytes already exist
+                storage_path = await store_blob(
+                    digest.hexdigest(), total_size, file_extension,
+                    self._iter_file(temp_file_path), source_key=self._source_key(episode_id),
+                    current_uri=current_uri,
+                )
                 
                 return storage_path, 'audio_micro'
                 
@@ -337,9 +382,10 @@ class SpotifyService:
                         logger.warning(f"Failed to delete temporary file {path}: {str(e)}")
 
     @retry_async(Exception, tries=2, delay=3, backoff=2)
-    async def get_episode_info(self, episode_id: str) -> Optional[Dict]:
+    async def get_episode_info(self, episode_id: str, current_uri: Optional[str] = None) -> Optional[Dict]:
         """
         Get Spotify episode metadata from RapidAPI.
+        The returned storage_path holds a storage reference unless it equals current_uri.
         """
         url = f"https://spotify23.p.rapidapi.com/episode/?id={episode_id}"
         headers = {
@@ -357,16 +403,6 @@ class SpotifyService:
                 
             episode = data["data"]["episodeUnionV2"]
             
-            # Get audio URL
-            audio_url = await self.get_episode_audio_url(episode_id)
-            if not audio_url:
-                return None
-            
-            # Download and store the audio file
-            storage_path, file_type = await self.download_and_store_audio(audio_url, episode_id)
-            if not storage_path:
-                return None
-            
             # Extract relevant metadata
             published_time = None
             if episode.get("releaseDate") and episode["releaseDate"].get("isoString"):
@@ -384,11 +420,15 @@ class SpotifyService:
                 "duration": episode["duration"]["totalMilliseconds"] / 1000 if episode.get("duration") else None,
                 "cover": next((source["url"] for source in episode["coverArt"]["sources"] if source["width"] == 640), None) if episode.get("coverArt") else None,
                 "published_time": published_time,
-                "storage_path": storage_path,
-                "file_type": file_type,
                 "podcast_name": episode["podcastV2"]["data"]["name"] if episode.get("podcastV2") and episode["podcastV2"].get("data") else None
             }
             
+            # Download and store the audio file last, so a metadata error cannot leave a dangling reference
+            storage_path, file_type = await self.store_episode_audio(episode_id, current_uri)
+            if not storage_path:
+                return None
+            metadata.update(storage_path=storage_path, file_type=file_type)
+            
             return metadata
 
 spotify_service = SpotifyService()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+from typing import List, Optional
+
+import redis.asyncio as redis
+
+from app import settings
+from app.database.models.content import Content, RAGProcessingStatus
+from app.database.models.knowledge_base import KnowledgeBase
+from app.database.repositories.content_repository import content_repository
+from app.database.repositories.knowledge_base_repository import content_kb_mapping_repository
+from app.libs.rag.rag_llm.index import generate_welcome_questions
+
+logger = logging.getLogger(__name__)
+
+# 还没有预计算结果时返回的默认问题
+DEFAULT_WELCOME_QUESTIONS = ["你好，我是你的助手，有什么可以帮你的吗？", "hello world", "have a good day"]
+
+# 生成欢迎问题时读取的内容列
+CONTEXT_COLUMNS = (
+    Content.id,
+    Content.uid,
+    Content.title,
+    Content.ai_summary,
+    Content.raw_description,
+    Content.dataset_doc_id,
+    Content.rag_status,
+)
+
+
+class WelcomeQuestions:
+    """
+    按内容和知识库预计算的欢迎问题，保存在 Redis 中供所有 API 进程读取。
+
+    欢迎问题只取决于对话可用的内容集合，和用户无关。每条记录保存生成时的内容集合版本：
+    内容为其 RAG 文档 ID，知识库为已就绪数据集 ID 集合的哈希。内容 RAG 完成或知识库内容
+    变化时由 worker 刷新，版本未变时跳过 LLM 调用。知识库的刷新经 pending 键去抖，
+    批量导入只触发一次生成。
+    """
+
+    KEY = "welcome_questions:{}:{}"
+    PENDING_KEY = "welcome_questions:pending:{}:{}"
+
+    def __init__(self, redis_url: str, ttl_seconds: int, context_items: int):
+        self._redis = redis.from_url(redis_url)
+        self.ttl_seconds = ttl_seconds
+        self.context_items = context_items
+
+    async def get(self, kind: str, uid: str) -> Optional[List[str]]:
+        try:
+            raw = await self._redis.get(self.KEY.format(kind, uid))
+        except Exception as e:
+            logger.warning(f"Failed to read welcome questions: {str(e)}")
+            return None
+        return json.loads(raw)["questions"] if raw else None
+
+    async def claim_refresh(self, kind: str, uid: str) -> bool:
+        """同一目标在刷新进行中只派发一次任务"""
+        try:
+            return bool(await self._redis.set(self.PENDING_KEY.format(kind, uid), 1, nx=True, ex=600))
+        except Exception as e:
+            logger.warning(f"Failed to claim welcome questions refresh: {str(e)}")
+            return False
+
+    async def release_refresh(self, kind: str, uid: str):
+        try:
+            await self._redis.delete(self.PENDING_KEY.format(kind, uid))
+        except Exception as e:
+            logger.warning(f"Failed to release welcome questions refresh: {str(e)}")
+
+    async def refresh_content(self, content: Content):
+        try:
+            if content.rag_status != RAGProcessingStatus.completed or not content.dataset_doc_id:
+                return
+            await self._refresh("content", content.uid, content.dataset_doc_id, [content])
+        finally:
+            await self.release_refresh("content", content.uid)
+
+    async def refresh_knowledge_base(self, kb: KnowledgeBase):
+        """由去抖任务调用，调用方负责在读取版本前释放 pending 键"""
+        dataset_ids, _ = await content_kb_mapping_repository.get_knowledge_base_dataset_ids(kb.id)
+        if not dataset_ids:
+            # 知识库已没有可对话的内容，旧问题不再适用
+            await self._redis.delete(self.KEY.format("kb", kb.uid))
+            return
+        version = hashlib.sha256(",".join(sorted(set(dataset_ids))).encode("utf-8")).hexdigest()
+
+        content_ids, _ = await content_kb_mapping_repository.get_knowledge_base_contents(
+            kb_id=kb.id, offset=0, limit=self.context_items * 2
+        )
+        contents = [
+            content
+            for content in await content_repository.get_by_ids(content_ids, columns=CONTEXT_COLUMNS)
+            if content.rag_status == RAGProcessingStatus.completed
+        ][:self.context_items]
+        header = f"Knowledge base: {kb.name}\n{kb.description or ''}".strip()
+        await self._refresh("kb", kb.uid, version, contents, header)
+
+    async def _refresh(self, kind: str, uid: str, version: str, contents: list, header: str = ""):
+        key = self.KEY.format(kind, uid)
+        raw = await self._redis.get(key)
+        if raw and json.loads(raw)["version"] == version:
+            return
+
+        context = "\n\n".join(
+            [header] + [
+                f"Title: {content.title or ''}\n{content.ai_summary or content.raw_description or ''}".strip()
+                for content in contents
+            ]
+        ).strip()
+        if not context:
+            return
+
+        questions = await generate_welcome_questions(context)
+        await self._redis.set(key, json.dumps({"version": version, "questions": questions}), ex=self.ttl_seconds)
+        logger.info(f"Welcome questions refreshed for {kind} {uid}, version: {version}")
+
+
+welcome_questions = WelcomeQuestions(
+    settings.redis_url, settings.welcome_questions_ttl, settings.welcome_questions_context_items
+)
@@ -169,6 +169,7 @@ class YouTubeAudioFileService:
             await content_repository.update(
                 content_id=content.id,
                 processing_status=ProcessingStatus.PENDING,
+                returning=False,
             )
             
             is_youtube, video_id = YouTubeService.parse_youtube_url(content.source)
@@ -178,6 +179,7 @@ class YouTubeAudioFileService:
                 await content_repository.update(
                     content_id=content.id,
                     processing_status=ProcessingStatus.COMPLETED,
+                    returning=False,
                 )
                 return {"status": "error", "msg": "Invalid YouTube URL"}
             
@@ -192,6 +194,7 @@ class YouTubeAudioFileService:
                     await content_repository.update(
                         content_id=content.id,
                         processing_status=ProcessingStatus.COMPLETED,
+                        returning=False,
                     )
                     return {"status": "error", "msg": "No audio URL found"}
                 
@@ -231,6 +234,7 @@ class YouTubeAudioFileService:
                                 content_id=content.id,
                                 media_subtitles=processed_result,
                                 processing_status=ProcessingStatus.COMPLETED,
+                                returning=False,
                             )
 
                             content_worker.content_ai_process.delay(content_id)
@@ -241,18 +245,21 @@ class YouTubeAudioFileService:
                     await content_repository.update(
                         content_id=content.id,
                         processing_status=ProcessingStatus.COMPLETED,
+                        returning=False,
                     )
             else:
                 logger.error(f"Failed to get audio file: {res.get('msg', 'Unknown error')}")
                 await content_repository.update(
                     content_id=content.id,
                     processing_status=ProcessingStatus.COMPLETED,
+                    returning=False,
                 )
         except Exception as e:
             logger.error(f"Error processing audio file: {str(e)}")
             await content_repository.update(
                 content_id=content.id,
                 processing_status=ProcessingStatus.COMPLETED,
+                returning=False,
             )
     
     def _extract_filename_from_url(self, url: str) -> Optional[str]:
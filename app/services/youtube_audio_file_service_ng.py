@@ -241,6 +241,7 @@ class YouTubeAudioFileServiceNG:
             await content_repository.update(
                 content_id=content.id,
                 processing_status=ProcessingStatus.PENDING,
+                returning=False,
             )
             
             is_youtube, video_id = YouTubeService.parse_youtube_url(content.source)
@@ -250,6 +251,7 @@ class YouTubeAudioFileServiceNG:
                 await content_repository.update(
                     content_id=content.id,
                     processing_status=ProcessingStatus.COMPLETED,
+                    returning=False,
                 )
                 return {"status": "error", "msg": "Invalid YouTube URL"}
             
@@ -265,6 +267,7 @@ class YouTubeAudioFileServiceNG:
                     await content_repository.update(
                         content_id=content.id,
                         processing_status=ProcessingStatus.COMPLETED,
+                        returning=False,
                     )
                     return {"status": "error", "msg": "No download URL found"}
                 
@@ -301,6 +304,7 @@ class YouTubeAudioFileServiceNG:
                                 content_id=content.id,
                                 media_subtitles=processed_result,
                                 processing_status=ProcessingStatus.COMPLETED,
+                                returning=False,
                             )
 
                             content_worker.content_ai_process.delay(content_id)
@@ -311,12 +315,14 @@ class YouTubeAudioFileServiceNG:
                     await content_repository.update(
                         content_id=content.id,
                         processing_status=ProcessingStatus.COMPLETED,
+                        returning=False,
                     )
             else:
                 logger.error(f"Failed to get audio file: {res.get('msg', 'Unknown error')}")
                 await content_repository.update(
                     content_id=content.id,
                     processing_status=ProcessingStatus.COMPLETED,
+                    returning=False,
                 )
                 
         except Exception as e:
@@ -324,4 +330,5 @@ class YouTubeAudioFileServiceNG:
             await content_repository.update(
                 content_id=content.id,
                 processing_status=ProcessingStatus.COMPLETED,
+                returning=False,
             )
@@ -3,19 +3,24 @@ import logging
 import os
 import subprocess
 import time
+from typing import Optional
 from celery import Celery
 from app import settings
 from app.common import format_subtitles, is_audio_type
-from app.database.models.content import ContentMediaType
+from app.database.models.content import Content, ContentMediaType
 from app.database.repositories.content_repository import content_repository
+from app.libs.llm.rate_limit import LLMPriority, llm_priority
 from app.libs.llm.content import (
+    get_content_artifacts,
     get_content_summary,
     get_markdownmap,
     get_recommend_reason,
     get_tags,
 )
+from app.services.ai_artifact_cache import AI_ARTIFACT_FIELDS, ai_artifact_cache
 from app.services.fcm_service import FCMService
 from app.services.notification_service import NotificationService
+from app.workers.runtime import worker_runtime
 
 
 logger = logging.getLogger(__name__)
@@ -36,58 +41,154 @@ celery_app.conf.broker_connection_retry_on_startup = True
 def content_ai_process(self, content_id: int):
     # logger.info(f"Task {self.request.id} is generating...")
 
-    # 使用 asyncio 运行异步代码
-    loop = asyncio.get_event_loop()
-    if loop.is_running():
-        # 如果事件循环已运行，创建新任务
-        loop.create_task(_handle_task(content_id))
-    else:
-        # 否则运行完整事件循环
-        loop.run_until_complete(_handle_task(content_id))
+    # 在 worker 进程常驻的事件循环上运行异步代码
+    worker_runtime.run(_handle_task, content_id)
+
+
+class ContentWriteBuffer:
+    """
+    合并同一内容各 AI 处理阶段的结果，用一条 UPDATE 落库。
+    第一个结果写入后最多等待 max_latency 秒就会刷新；close() 会把剩余结果全部写入，
+    因此某个阶段失败时，其他阶段已完成的结果仍会被保存。
+    """
+
+    def __init__(self, content_id: int, max_latency: float):
+        self.content_id = content_id
+        self.max_latency = max_latency
+        self._pending: dict = {}
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # 已经写入缓冲区的字段，包括已刷新的
+        self.fields: set = set()
+
+    def add(self, **values):
+        self._pending.update(values)
+        self.fields.update(values)
+        if self._flush_task is None and self.max_latency > 0:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.max_latency)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush AI results for content {self.content_id}: {str(e)}")
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            values, self._pending = self._pending, {}
+            try:
+                await content_repository.update(self.content_id, returning=False, **values)
+            except Exception:
+                # 写入失败时放回缓冲区，交给下一次 flush 重试
+                for key, value in values.items():
+                    self._pending.setdefault(key, value)
+                raise
+
+    async def close(self):
+        # 仍在等待中的定时刷新直接取消，由这里统一写入
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+def get_summary_process_content(content: Content) -> Optional[str]:
+    """AI 处理使用的文本：音视频取格式化后的字幕，其余取正文"""
+    # Format video subtitles if present
+    if content.media_type == ContentMediaType.video and content.media_subtitles:
+        return format_subtitles(content.media_subtitles)
+    elif is_audio_type(content.media_type) and content.media_subtitles:
+        return format_subtitles(content.media_subtitles)
+    return content.text_content
 
 
 async def _handle_task(content_id: int):
     logger.info(f"Processing content AI, content id is: {content_id}")
+    write_buffer = ContentWriteBuffer(content_id, settings.content_ai_write_max_latency)
     try:
         content = await content_repository.get_by_id(content_id)
         if not content:
             logger.error(f"Content not found, id: {content_id}")
             return
 
-        # Format video subtitles if present
-        if content.media_type == ContentMediaType.video and content.media_subtitles:
-            if not content.media_subtitles:
-                summary_process_content = None
-            else:
-                summary_process_content = format_subtitles(content.media_subtitles)
-        elif is_audio_type(content.media_type) and content.media_subtitles:
-            if not content.media_subtitles:
-                summary_process_content = None
-            else:
-                summary_process_content = format_subtitles(content.media_subtitles)
-        else:
-            summary_process_content = content.text_content
-
+        summary_process_content = get_summary_process_content(content)
         if not summary_process_content:
             return
 
-        await _process_summary(content_id, summary_process_content)
+        # 批量导入的内容走低优先级通道，单条上传优先获得 LLM 配额
+        is_batch = bool(content.batch_id) and await content_repository.count_by_batch_id(content.batch_id) > 1
+        llm_priority.set(LLMPriority.batch if is_batch else LLMPriority.interactive)
+
+        cache_key = ai_artifact_cache.build_key(content, summary_process_content)
+        cached_artifacts = await ai_artifact_cache.get(cache_key, content_id)
+        if cached_artifacts:
+            # 相同内容已生成过 AI 产物，直接复用，跳过 LLM
+            write_buffer.add(ai_cache_key=cache_key, **cached_artifacts)
+            return
+
+        generated = set()
+        if settings.content_ai_combined_mode:
+            generated = await _process_combined(content_id, summary_process_content, write_buffer)
+
+        # 合并模式未生成的产物逐项回退生成
+        if "ai_summary" not in generated:
+            await _process_summary(content_id, summary_process_content, write_buffer)
 
         tasks = [
-            _process_structure(content_id, summary_process_content),
-            _process_recommend_reason(content_id, summary_process_content),
-            _process_tags(content_id, summary_process_content),
+            process(content_id, summary_process_content, write_buffer)
+            for field, process in (
+                ("ai_structure", _process_structure),
+                ("ai_recommend_reason", _process_recommend_reason),
+                ("ai_tags", _process_tags),
+            )
+            if field not in generated
         ]
         await asyncio.gather(*tasks)
+
+        # 全部产物生成成功后才登记缓存键，供相同内容复用
+        if write_buffer.fields.issuperset(AI_ARTIFACT_FIELDS):
+            write_buffer.add(ai_cache_key=cache_key)
     except Exception as e:
         logger.error(f"Unexpected error processing content {content_id}: {str(e)}")
         raise
     finally:
+        try:
+            await write_buffer.close()
+        except Exception as e:
+            logger.error(f"Failed to save AI results for content {content_id}: {str(e)}")
         await NotificationService().notify_content_status(content_id)
         logger.info(f"Finished processing content AI, content id is: {content_id}")
 
 
-async def _process_summary(content_id: int, content: str):
+async def _process_combined(content_id: int, content: str, write_buffer: ContentWriteBuffer) -> set:
+    """一次调用生成全部产物，返回成功生成的字段；失败时返回空集合，由调用方逐项回退"""
+    try:
+        logger.info(f"Processing combined AI artifacts for content {content_id}")
+        start_time = time.time()
+        artifacts = await get_content_artifacts(content)
+        logger.info(
+            f"Combined processing completed in {time.time() - start_time:.2f} seconds for content {content_id}"
+        )
+    except Exception as e:
+        logger.warning(f"Combined AI processing failed for content {content_id}, falling back: {str(e)}")
+        return set()
+
+    values = {
+        "ai_summary": artifacts.summary,
+        "ai_structure": artifacts.markdownmap,
+        "ai_recommend_reason": artifacts.recommend_reason,
+        "ai_tags": artifacts.tag_list,
+    }
+    values = {field: value for field, value in values.items() if value}
+    write_buffer.add(**values)
+    return set(values)
+
+
+async def _process_summary(content_id: int, content: str, write_buffer: ContentWriteBuffer):
     try:
         logger.info(f"Processing summary for content {content_id}")
         start_time = time.time()
@@ -96,48 +197,36 @@ async def _process_summary(content_id: int, content: str):
         logger.info(
             f"Summary processing completed in {elapsed_time:.2f} seconds for content {content_id}"
         )
-        await content_repository.update(
-            content_id=content_id,
-            ai_summary=summary_res,
-        )
+        write_buffer.add(ai_summary=summary_res)
     except Exception as e:
         logger.error(f"Failed to process summary for content {content_id}: {str(e)}")
 
 
-async def _process_structure(content_id: int, content: str):
+async def _process_structure(content_id: int, content: str, write_buffer: ContentWriteBuffer):
     try:
         logger.info(f"Processing mermaid for content {content_id}")
         structure_res = await get_markdownmap(content)
 
-        await content_repository.update(
-            content_id=content_id,
-            ai_structure=structure_res,
-        )
+        write_buffer.add(ai_structure=structure_res)
     except Exception as e:
         logger.error(f"Failed to process mermaid for content {content_id}: {str(e)}")
 
 
-async def _process_recommend_reason(content_id: int, content: str):
+async def _process_recommend_reason(content_id: int, content: str, write_buffer: ContentWriteBuffer):
     try:
         logger.info(f"Processing recommendation reason for content {content_id}")
         recommend_reason_res = await get_recommend_reason(content)
-        await content_repository.update(
-            content_id=content_id,
-            ai_recommend_reason=recommend_reason_res,
-        )
+        write_buffer.add(ai_recommend_reason=recommend_reason_res)
     except Exception as e:
         logger.error(
             f"Failed to process recommendation reason for content {content_id}: {str(e)}"
         )
 
 
-async def _process_tags(content_id: int, content: str):
+async def _process_tags(content_id: int, content: str, write_buffer: ContentWriteBuffer):
     try:
         logger.info(f"Processing tags for content {content_id}")
         tags = await get_tags(content)
-        await content_repository.update(
-            content_id=content_id,
-            ai_tags=tags,
-        )
+        write_buffer.add(ai_tags=tags)
     except Exception as e:
         logger.error(f"Failed to process tags for content {content_id}: {str(e)}")
@@ -0,0 +1,75 @@
+import logging
+import threading
+from typing import Dict
+
+from celery import Celery
+from app import settings
+from app.workers.runtime import worker_runtime
+
+logger = logging.getLogger(__name__)
+celery_app = Celery(
+    "ingest-tasks", broker=settings.celery_broker_url, backend=settings.celery_result_backend
+)
+
+# 添加配置
+celery_app.conf.broker_connection_retry_on_startup = True
+
+# ContentProcessor 方法名 -> 并发限制分组（媒体类型）
+INGEST_PROCESSORS = {
+    "audio_asr": "audio",
+    "process_spotify_content": "audio",
+    "process_youtube_content": "video",
+    "process_file": "file",
+    "process_article_content": "article",
+    "process_twitter_content": "twitter",
+}
+
+# 每个媒体类型在同一 worker 进程内的信号量，由 Celery 线程在进入事件循环前获取
+_media_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_media_semaphores_lock = threading.Lock()
+
+
+@celery_app.task(
+    bind=True,
+    max_retries=3,
+    default_retry_delay=10,
+    queue='ingest_queue',
+    acks_late=True,
+)
+def ingest_process(self, content_id: int, processor: str):
+    # 任务执行完成后才确认，worker 重启时未完成的任务会重新投递
+    media_group = INGEST_PROCESSORS.get(processor)
+    if media_group is None:
+        logger.error(f"Unknown ingest processor: {processor}, content id: {content_id}")
+        return
+
+    # 先占媒体类型的名额再占事件循环的全局名额；名额已满时稍后重新投递，
+    # 不让某一类任务的积压占满 worker 线程和全局名额。重新投递次数用尽后阻塞等待名额，保证任务最终执行
+    semaphore = _get_media_semaphore(media_group)
+    if not semaphore.acquire(blocking=self.request.retries >= settings.ingest_requeue_max_retries):
+        raise self.retry(
+            countdown=settings.ingest_requeue_countdown,
+            max_retries=settings.ingest_requeue_max_retries,
+        )
+    try:
+        worker_runtime.run(_handle_task, content_id, processor)
+    finally:
+        semaphore.release()
+
+
+def _get_media_semaphore(media_group: str) -> threading.BoundedSemaphore:
+    with _media_semaphores_lock:
+        semaphore = _media_semaphores.get(media_group)
+        if semaphore is None:
+            limit = settings.ingest_concurrency_limits.get(media_group, settings.worker_async_concurrency)
+            semaphore = threading.BoundedSemaphore(limit)
+            _media_semaphores[media_group] = semaphore
+        return semaphore
+
+
+async def _handle_task(content_id: int, processor: str):
+    # 延迟导入，避免与 content_processor 中的任务投递形成循环依赖
+    from app.services.content_processor import ContentProcessor
+
+    logger.info(f"Ingesting content, content id: {content_id}, processor: {processor}")
+    await getattr(ContentProcessor, processor)(content_id)
@@ -1,11 +1,15 @@
 import asyncio
 import logging
+from typing import List, Optional
 
 from celery import Celery
 from app import settings
-from app.database.models.content import RAGProcessingStatus
+from app.database.models.content import Content, RAGProcessingStatus
 from app.database.repositories.content_repository import content_repository
+from app.database.repositories.knowledge_base_repository import knowledge_base_repository
 from app.libs.rag.rag_utils import rag_utils
+from app.services.welcome_questions import CONTEXT_COLUMNS, welcome_questions
+from app.workers.runtime import worker_runtime
 
 logger = logging.getLogger(__name__)
 celery_app = Celery(
@@ -24,14 +28,140 @@ celery_app.conf.broker_connection_retry_on_startup = True
 def rag_process(self, content_id: int):
     # logger.info(f"Task {self.request.id} is generating...")
 
-    # 使用 asyncio 运行异步代码
-    loop = asyncio.get_event_loop()
-    if loop.is_running():
-        # 如果事件循环已运行，创建新任务
-        loop.create_task(_handle_task(content_id))
-    else:
-        # 否则运行完整事件循环
-        loop.run_until_complete(_handle_task(content_id))
+    # 在 worker 进程常驻的事件循环上运行异步代码
+    worker_runtime.run(_handle_task, content_id)
+
+@celery_app.task(
+    bind=True,
+    max_retries=3,
+    default_retry_delay=10,
+    queue='rag_queue'
+)
+def rag_release(self, content_id: int, dataset_id: str):
+    # 内容删除后释放其对数据集的引用
+    worker_runtime.run(rag_utils.release_dataset, dataset_id, content_id)
+
+@celery_app.task(
+    bind=True,
+    max_retries=3,
+    default_retry_delay=10,
+    queue='rag_queue'
+)
+def rag_process_batch(self, content_ids: List[int]):
+    # 一个任务处理一批内容，上传并发执行，解析状态统一由 readiness tracker 跟踪
+    worker_runtime.run(_handle_batch, content_ids)
+
+@celery_app.task(
+    bind=True,
+    queue='rag_queue'
+)
+def rag_backfill(self, limit: int = 2000):
+    # 把处理完成但尚未入库 RAG 的内容按批次分发
+    worker_runtime.run(_enqueue_backfill, limit)
+
+@celery_app.task(
+    bind=True,
+    queue='rag_queue'
+)
+def welcome_questions_refresh(self, content_ids: Optional[List[int]] = None, kb_ids: Optional[List[int]] = None):
+    # 内容 RAG 完成或知识库内容变化后预计算欢迎问题
+    worker_runtime.run(_refresh_welcome_questions, content_ids or [], kb_ids or [])
+
+@celery_app.task(
+    bind=True,
+    queue='rag_queue'
+)
+def welcome_questions_refresh_kb(self, kb_id: int):
+    # 去抖后的知识库欢迎问题刷新，一段时间内的多次变更只生成一次
+    worker_runtime.run(_refresh_kb_welcome_questions, kb_id)
+
+async def _refresh_welcome_questions(content_ids: List[int], kb_ids: List[int]):
+    contents = await content_repository.get_by_ids(content_ids, columns=CONTEXT_COLUMNS)
+    for content in contents:
+        try:
+            await welcome_questions.refresh_content(content)
+        except Exception as e:
+            logger.error(f"Failed to refresh welcome questions: {str(e)}")
+
+    # 内容就绪会改变包含它的知识库的内容集合
+    kbs = {kb.id: kb for kb in await knowledge_base_repository.get_knowledge_bases_by_content_ids(content_ids)}
+    kbs.update({kb.id: kb for kb in await knowledge_base_repository.get_knowledge_bases_by_ids(kb_ids)})
+    await schedule_kb_welcome_questions(kbs.values())
+
+async def schedule_kb_welcome_questions(kbs):
+    """每个知识库只保留一个延迟刷新任务，pending 键存在时说明已有任务在等待"""
+    for kb in kbs:
+        if await welcome_questions.claim_refresh("kb", kb.uid):
+            welcome_questions_refresh_kb.apply_async((kb.id,), countdown=settings.welcome_questions_kb_debounce)
+
+async def _refresh_kb_welcome_questions(kb_id: int):
+    kbs = await knowledge_base_repository.get_knowledge_bases_by_ids([kb_id])
+    if not kbs:
+        return
+    kb = kbs[0]
+    # 先释放 pending 键再读取版本，生成期间发生的变更会再调度一次刷新
+    await welcome_questions.release_refresh("kb", kb.uid)
+    try:
+        await welcome_questions.refresh_knowledge_base(kb)
+    except Exception as e:
+        logger.error(f"Failed to refresh welcome questions for knowledge base {kb_id}: {str(e)}")
+
+async def _enqueue_backfill(limit: int):
+    rows = await content_repository.get_all_completed_articles_without_dataset(limit=limit, columns=(Content.id,))
+    content_ids = [row.id for row in rows]
+    for start in range(0, len(content_ids), settings.rag_batch_size):
+        rag_process_batch.delay(content_ids[start:start + settings.rag_batch_size])
+    logger.info(f"Enqueued RAG backfill, contents: {len(content_ids)}, batch size: {settings.rag_batch_size}")
+
+async def _handle_batch(content_ids: List[int]):
+    logger.info(f"Processing RAG batch, content ids: {content_ids}")
+    contents = [
+        content
+        for content in await content_repository.get_by_ids(content_ids)
+        if content.rag_status == RAGProcessingStatus.waiting_init
+    ]
+    if not contents:
+        return
+
+    documents = {}
+    pending = []
+    for content in contents:
+        # 复用的文档在认领时已写入内容
+        reusable_document = await rag_utils.claim_reusable_document(content)
+        if reusable_document:
+            documents[content.id] = reusable_document
+        else:
+            pending.append(content)
+    uploaded = await rag_utils.process_and_upload_batch(pending)
+    documents.update(uploaded)
+
+    failed_ids = [content.id for content in contents if content.id not in documents]
+    if failed_ids:
+        # 保持 waiting_init，下次回填时重试
+        logger.warning(f"RAG batch upload failed, content ids: {failed_ids}")
+
+    for content_id, (dataset_id, doc_id) in uploaded.items():
+        await content_repository.update(
+            content_id,
+            dataset_id=dataset_id,
+            dataset_doc_id=doc_id,
+            rag_status=RAGProcessingStatus.processing,
+            returning=False,
+        )
+
+    # rag_status 由 readiness tracker 在文档解析结束后批量更新
+    results = await asyncio.gather(*(
+        rag_utils.wait_for_document_processing(dataset_id, doc_id, content_id=content_id)
+        for content_id, (dataset_id, doc_id) in documents.items()
+    ))
+    succeed_count = sum(1 for succeed, _ in results if succeed)
+    completed_ids = [content_id for content_id, (succeed, _) in zip(documents, results) if succeed]
+    if completed_ids:
+        welcome_questions_refresh.delay(content_ids=completed_ids)
+    logger.info(
+        f"RAG batch finished, completed: {succeed_count}, "
+        f"failed: {len(results) - succeed_count}, upload failed: {len(failed_ids)}"
+    )
 
 async def _handle_task(content_id: int):
     logger.info(f"Processing RAG, content id is: {content_id}")
@@ -44,7 +174,14 @@ async def _handle_task(content_id: int):
             logger.info(f"Content already processed, id: {content_id}")
             return
        
-        dataset_id, doc_id, started = await rag_utils.process_and_upload_file(content)
+        # 相同内容已上传过时直接共享其数据集和文档，不再重新切片和向量化
+        reusable_document = await rag_utils.claim_reusable_document(content)
+        if reusable_document:
+            dataset_id, doc_id = reusable_document
+            started = True
+            logger.info(f"Reuse RAG document for content {content_id}, dataset_id: {dataset_id}, doc_id: {doc_id}")
+        else:
+            dataset_id, doc_id, started = await rag_utils.process_and_upload_file(content)
 
         # if not dataset_id or not content.dataset_id:
         #     logger.error(f"Content dataset_id or dataset_doc_id is None, id: {content_id}")
@@ -52,19 +189,22 @@ async def _handle_task(content_id: int):
 
         if dataset_id and doc_id and started:
             logger.info(f"RAG process started, dataset_id: {dataset_id}, doc_id: {doc_id}")
-            await content_repository.update(
-                content_id,
-                dataset_id=dataset_id,
-                dataset_doc_id=doc_id,
-                rag_status=RAGProcessingStatus.processing,
-            )
+            if not reusable_document:
+                await content_repository.update(
+                    content_id,
+                    dataset_id=dataset_id,
+                    dataset_doc_id=doc_id,
+                    rag_status=RAGProcessingStatus.processing,
+                    returning=False,
+                )
         
-            succeed, message = await rag_utils.wait_for_document_processing(dataset_id, doc_id)
-            logger.info(f"RAG process result, succeed: {succeed}, message: {message}")
-            await content_repository.update(
-                content_id,
-                rag_status=RAGProcessingStatus.completed if succeed else RAGProcessingStatus.failed,
+            # rag_status 由 readiness tracker 在文档解析结束后批量更新
+            succeed, message = await rag_utils.wait_for_document_processing(
+                dataset_id, doc_id, content_id=content_id
             )
+            logger.info(f"RAG process result, succeed: {succeed}, message: {message}")
+            if succeed:
+                welcome_questions_refresh.delay(content_ids=[content_id])
         else:
             raise Exception("RAG process failed, dataset_id or doc_id is None")
     except Exception as e:
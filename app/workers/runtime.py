@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+from app import settings
+from app.database.session import get_engine
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerRuntime:
+    """
+    Celery worker 进程内的异步运行时。
+    每个进程只有一个常驻事件循环（运行在独立线程中）和一个共享的数据库引擎，
+    任务通过 run() 提交到这个循环上执行，连接池中的 asyncpg 连接可以跨任务复用。
+    同时运行的协程数由信号量限制；配合 threads 池，单个 worker 进程即可并发处理多个 I/O 密集型任务。
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pid: Optional[int] = None
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # fork 出的子进程不能沿用父进程的循环线程，需要重新启动
+            if self._loop is not None and self._pid == os.getpid():
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=self._run_loop, args=(loop,), name="worker-event-loop", daemon=True
+            )
+            thread.start()
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            self._semaphore = None
+            logger.info(f"Worker event loop started, pid: {self._pid}, concurrency: {self.concurrency}")
+            return loop
+
+    async def _run_bounded(self, coro_fn: Callable[..., Awaitable[Any]], *args, **kwargs):
+        # 信号量在事件循环线程内创建，保证绑定到当前循环
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await coro_fn(*args, **kwargs)
+
+    def run(self, coro_fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """在进程的事件循环上执行协程函数，阻塞调用线程直到完成，并返回结果或抛出异常"""
+        loop = self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(
+            self._run_bounded(coro_fn, *args, **kwargs), loop
+        )
+        return future.result()
+
+    def shutdown(self):
+        """释放连接池并停止事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or self._pid != os.getpid():
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(get_engine().dispose(), loop).result(timeout=10)
+            except Exception as e:
+                logger.warning(f"Failed to dispose database engine: {str(e)}")
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=10)
+            self._loop = self._thread = self._semaphore = None
+            logger.info(f"Worker event loop stopped, pid: {self._pid}")
+
+
+worker_runtime = WorkerRuntime(settings.worker_async_concurrency)
+
+
+@worker_process_init.connect
+def _on_worker_process_init(**kwargs):
+    # 丢弃 fork 时从父进程继承的连接，子进程在自己的事件循环上重新建立
+    get_engine().sync_engine.dispose(close=False)
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _on_worker_shutdown(**kwargs):
+    worker_runtime.shutdown()
@@ -0,0 +1,94 @@
+"""
+Latency and memory of loading a user's contents: full rows vs list view vs slim tuples.
+
+Loads the latest --items contents of --user-id through ContentRepository.get_by_ids
+as full Content objects, as list-view objects with the large text/JSON columns
+deferred, and as slim row tuples of the columns a list card needs. Reports the
+median latency and the peak Python memory allocated while loading.
+
+Usage:
+    python -m benchmarks.content_list_projection --user-id 42 --items 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import select
+
+from app.database.models.content import Content
+from app.database.repositories.content_repository import content_repository
+from app.database.session import get_async_session
+
+SLIM_COLUMNS = (
+    Content.id,
+    Content.uid,
+    Content.title,
+    Content.cover,
+    Content.media_type,
+    Content.processing_status,
+    Content.rag_status,
+    Content.created_at,
+)
+
+MODES = {
+    "full": {},
+    "list_view": {"list_view": True},
+    "slim_tuples": {"columns": SLIM_COLUMNS},
+}
+
+
+async def load_content_ids(user_id: int, items: int) -> list:
+    async with get_async_session() as session:
+        result = await session.execute(
+            select(Content.id)
+            .where(Content.user_id == user_id)
+            .where(Content.is_deleted.is_(False))
+            .order_by(Content.created_at.desc())
+            .limit(items)
+        )
+        return list(result.scalars().all())
+
+
+async def measure(content_ids: list, options: dict, repeat: int):
+    latencies = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        contents = await content_repository.get_by_ids(content_ids, **options)
+        latencies.append((time.perf_counter() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del contents
+    return statistics.median(latencies), peak
+
+
+async def run(user_id: int, items: int, repeat: int):
+    content_ids = await load_content_ids(user_id, items)
+    if not content_ids:
+        print(f"No contents for user {user_id}")
+        return
+
+    # 预热连接池
+    await content_repository.get_by_ids(content_ids[:1])
+
+    print(f"user {user_id}, {len(content_ids)} contents, {repeat} runs per mode")
+    print(f"{'mode':<16}{'p50_ms':>12}{'peak_mb':>12}")
+    for mode, options in MODES.items():
+        latency, peak = await measure(content_ids, options, repeat)
+        print(f"{mode:<16}{latency:>12.1f}{peak / 1024 / 1024:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.user_id, args.items, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
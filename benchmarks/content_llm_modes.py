@@ -0,0 +1,121 @@
+"""
+Per-artifact vs combined LLM calls for content AI artifacts.
+
+For every document, runs the current pipeline (summary, then structure,
+recommend reason and tags in parallel) and the single combined call, and
+reports wall-clock latency and input tokens sent to the model per mode.
+
+Usage:
+    python -m benchmarks.content_llm_modes --content-ids 12 34 56
+    python -m benchmarks.content_llm_modes --files article.txt transcript.txt
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from app.common import detect_lang
+from app.database.repositories.content_repository import content_repository
+from app.libs.llm.content import (
+    content_artifacts_prompt,
+    get_content_artifacts,
+    get_content_summary,
+    get_markdownmap,
+    get_recommend_reason,
+    get_tags,
+    markdownmap_prompt,
+    recommand_reason_prompt,
+    summary_prompt,
+    tags_prompt,
+)
+from app.libs.llm.llm_clients import llm
+from app.workers.content import get_summary_process_content
+
+
+async def count_input_tokens(prompts, content: str) -> int:
+    variables = {"content_text": content, "output_language": detect_lang(content)}
+    total = 0
+    for prompt in prompts:
+        prompt_value = await prompt.ainvoke(variables)
+        total += await asyncio.to_thread(llm.get_num_tokens, prompt_value.to_string())
+    return total
+
+
+async def run_per_artifact(content: str):
+    await get_content_summary(content)
+    await asyncio.gather(
+        get_markdownmap(content),
+        get_recommend_reason(content),
+        get_tags(content),
+    )
+
+
+async def run_combined(content: str):
+    await get_content_artifacts(content)
+
+
+MODES = {
+    "per-artifact": (
+        run_per_artifact,
+        [summary_prompt, markdownmap_prompt, recommand_reason_prompt, tags_prompt],
+    ),
+    "combined": (run_combined, [content_artifacts_prompt]),
+}
+
+
+async def load_documents(content_ids, files):
+    documents = []
+    for content_id in content_ids or []:
+        content = await content_repository.get_by_id(content_id)
+        text = get_summary_process_content(content) if content else None
+        if text:
+            documents.append((f"content:{content_id}", text))
+    for file in files or []:
+        documents.append((Path(file).name, Path(file).read_text(encoding="utf-8")))
+    return documents
+
+
+async def run(content_ids, files):
+    documents = await load_documents(content_ids, files)
+    if not documents:
+        print("No documents to benchmark")
+        return
+
+    totals = {mode: {"latency": 0.0, "tokens": 0, "failed": 0} for mode in MODES}
+    print(f"{'document':<32}{'mode':<16}{'latency_s':>12}{'input_tokens':>14}")
+    for name, text in documents:
+        for mode, (runner, prompts) in MODES.items():
+            tokens = await count_input_tokens(prompts, text)
+            start = time.perf_counter()
+            try:
+                await runner(text)
+                status = ""
+            except Exception as e:
+                totals[mode]["failed"] += 1
+                status = f"  failed: {e}"
+            elapsed = time.perf_counter() - start
+            totals[mode]["latency"] += elapsed
+            totals[mode]["tokens"] += tokens
+            print(f"{name[:31]:<32}{mode:<16}{elapsed:>12.2f}{tokens:>14}{status}")
+
+    print()
+    print(f"{'mode':<16}{'avg_latency_s':>16}{'avg_input_tokens':>18}{'failed':>8}")
+    for mode, total in totals.items():
+        print(
+            f"{mode:<16}"
+            f"{total['latency'] / len(documents):>16.2f}"
+            f"{total['tokens'] / len(documents):>18.0f}"
+            f"{total['failed']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--content-ids", type=int, nargs="*")
+    parser.add_argument("--files", nargs="*")
+    args = parser.parse_args()
+    asyncio.run(run(args.content_ids, args.files))
+
+
+if __name__ == "__main__":
+    main()
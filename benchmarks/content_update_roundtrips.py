@@ -0,0 +1,118 @@
+"""
+Round-trips per processed content: legacy UPDATE + SELECT vs UPDATE ... RETURNING.
+
+Replays the status/AI-field writes one content goes through in the pipeline
+(processor -> content worker -> rag worker) against the configured database
+and counts the statements and commits each mode issues.
+
+Usage:
+    python -m benchmarks.content_update_roundtrips --contents 50
+"""
+import argparse
+import asyncio
+import time
+
+import nanoid
+from sqlalchemy import delete, event, select, update
+
+from app.database.models.content import Content, ProcessingStatus, RAGProcessingStatus
+from app.database.repositories.content_repository import content_repository
+from app.database.session import get_async_session, get_engine
+
+# 一条内容在处理流水线中依次经历的写操作
+PIPELINE_WRITES = [
+    dict(processing_status=ProcessingStatus.COMPLETED, text_content="text"),
+    dict(ai_summary="summary"),
+    dict(ai_structure="structure"),
+    dict(ai_recommend_reason="reason"),
+    dict(ai_tags=["a", "b"]),
+    dict(rag_status=RAGProcessingStatus.processing),
+    dict(rag_status=RAGProcessingStatus.completed),
+]
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+    def install(self, sync_engine):
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _on_execute(*args, **kwargs):
+            self.statements += 1
+
+        @event.listens_for(sync_engine, "commit")
+        def _on_commit(*args, **kwargs):
+            self.commits += 1
+
+
+async def legacy_update(content_id: int, **kwargs):
+    """Previous ContentRepository.update: UPDATE, COMMIT, then SELECT"""
+    async with get_async_session() as session:
+        result = await session.execute(
+            update(Content).where(Content.id == content_id).values(**kwargs)
+        )
+        await session.commit()
+        if result.rowcount > 0:
+            updated = await session.execute(select(Content).where(Content.id == content_id))
+            return updated.scalar()
+        return None
+
+
+async def returning_update(content_id: int, **kwargs):
+    return await content_repository.update(content_id, **kwargs)
+
+
+async def fire_and_forget_update(content_id: int, **kwargs):
+    return await content_repository.update(content_id, returning=False, **kwargs)
+
+
+MODES = {
+    "legacy (update + select)": legacy_update,
+    "returning=True": returning_update,
+    "returning=False": fire_and_forget_update,
+}
+
+
+async def run(contents: int):
+    counter = RoundTripCounter()
+    counter.install(get_engine().sync_engine)
+
+    created_ids = []
+    for _ in range(contents):
+        content = await content_repository.create(uid=nanoid.generate().lower(), source="benchmark")
+        created_ids.append(content.id)
+
+    try:
+        print(f"{'mode':<28}{'stmts/content':>16}{'commits/content':>18}{'ms/content':>14}")
+        for name, write in MODES.items():
+            counter.reset()
+            start = time.perf_counter()
+            for content_id in created_ids:
+                for values in PIPELINE_WRITES:
+                    await write(content_id, **values)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<28}"
+                f"{counter.statements / contents:>16.1f}"
+                f"{counter.commits / contents:>18.1f}"
+                f"{elapsed * 1000 / contents:>14.2f}"
+            )
+    finally:
+        async with get_async_session() as session:
+            await session.execute(delete(Content).where(Content.id.in_(created_ids)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--contents", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.contents))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Middleware stack overhead: BaseHTTPMiddleware vs pure ASGI (req/s and streaming chunk latency).
+
+Serves the same small app with uvicorn twice: once wrapped in the previous
+BaseHTTPMiddleware versions of the CORS, request logging and request context
+middlewares, once in the pure ASGI versions from app.http_middleware and
+app.middleware.trace_middleware. Measures plain JSON requests per second under
+--concurrency clients, then time to first byte, inter-chunk latency and total
+time of --streams concurrent NDJSON streams of --chunks chunks each.
+
+Usage:
+    python -m benchmarks.middleware_streaming --duration 10 --concurrency 50 --chunks 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import statistics
+import threading
+import time
+import uuid
+from typing import Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from app.http_middleware import CORSMiddleware, RequestLoggingMiddleware
+from app.middleware.trace_middleware import RequestContextMiddleware, trace_id_ctx, ua_info_ctx
+
+logger = logging.getLogger(__name__)
+ua_parser = RequestContextMiddleware(None)
+
+
+class LegacyCORSMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if request.method == "OPTIONS":
+            response = Response()
+        else:
+            response = await call_next(request)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "*"
+        return response
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if request.url.path != "/api/health":
+            logger.info(f"Incoming request: {request.method} {request.url}")
+        return await call_next(request)
+
+
+class LegacyRequestContextMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        trace_id = str(uuid.uuid4())
+        trace_token = trace_id_ctx.set(trace_id)
+        ua_token = ua_info_ctx.set(ua_parser._parse_ua(request.headers.get("user-agent", "")))
+        try:
+            response = await call_next(request)
+            response.headers["X-Trace-ID"] = trace_id
+            return response
+        finally:
+            trace_id_ctx.reset(trace_token)
+            ua_info_ctx.reset(ua_token)
+
+
+STACKS = {
+    "base_http": (LegacyCORSMiddleware, LegacyRequestLoggingMiddleware, LegacyRequestContextMiddleware),
+    "pure_asgi": (CORSMiddleware, RequestLoggingMiddleware, RequestContextMiddleware),
+}
+
+
+def build_app(stack: tuple, chunks: int, chunk_interval: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/bench/json")
+    async def bench_json():
+        return {"status": "ok"}
+
+    @app.get("/bench/stream")
+    async def bench_stream():
+        async def generate():
+            for index in range(chunks):
+                yield json.dumps({"index": index, "content": "x" * 64}) + "\n"
+                await asyncio.sleep(chunk_interval)
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    # 和 main.py 相同的注册顺序
+    for middleware in stack:
+        app.add_middleware(middleware)
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: FastAPI) -> Tuple[uvicorn.Server, str]:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def measure_requests(base_url: str, duration: float, concurrency: int) -> float:
+    count = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal count
+        while time.perf_counter() < deadline:
+            response = await client.get("/bench/json")
+            response.raise_for_status()
+            count += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return count / duration
+
+
+async def measure_streams(base_url: str, streams: int) -> dict:
+    ttfb, gaps, totals = [], [], []
+
+    async def consume(client: httpx.AsyncClient):
+        start = time.perf_counter()
+        last = None
+        async with client.stream("GET", "/bench/stream") as response:
+            async for _ in response.aiter_lines():
+                now = time.perf_counter()
+                if last is None:
+                    ttfb.append(now - start)
+                else:
+                    gaps.append(now - last)
+                last = now
+        totals.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=streams, max_keepalive_connections=streams)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None) as client:
+        await asyncio.gather(*(consume(client) for _ in range(streams)))
+
+    gaps.sort()
+    return {
+        "ttfb_p50_ms": statistics.median(ttfb) * 1000,
+        "chunk_p50_ms": statistics.median(gaps) * 1000,
+        "chunk_p99_ms": gaps[int(len(gaps) * 0.99) - 1] * 1000 if gaps else 0.0,
+        "stream_p50_ms": statistics.median(totals) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10, help="seconds of JSON load per stack")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--streams", type=int, default=50, help="concurrent streaming requests")
+    parser.add_argument("--chunks", type=int, default=200, help="chunks per stream")
+    parser.add_argument("--chunk-interval-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    print(f"{'stack':<12}{'req/s':>10}{'ttfb_p50':>12}{'chunk_p50':>12}{'chunk_p99':>12}{'stream_p50':>12}")
+    for name, stack in STACKS.items():
+        server, base_url = start_server(build_app(stack, args.chunks, args.chunk_interval_ms / 1000))
+        try:
+            rps = asyncio.run(measure_requests(base_url, args.duration, args.concurrency))
+            streaming = asyncio.run(measure_streams(base_url, args.streams))
+        finally:
+            server.should_exit = True
+        print(
+            f"{name:<12}{rps:>10.0f}{streaming['ttfb_p50_ms']:>12.2f}{streaming['chunk_p50_ms']:>12.3f}"
+            f"{streaming['chunk_p99_ms']:>12.3f}{streaming['stream_p50_ms']:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+RAG ingestion throughput (docs/min): one content per upload vs batch ingestion.
+
+Starts a local stub of the RAGFlow dataset/document API that answers every
+request after a fixed latency, then uploads the same synthetic articles with
+process_and_upload_file one by one (previous worker behaviour) and with
+process_and_upload_batch in batches of --batch-size.
+
+Usage:
+    python -m benchmarks.rag_ingestion_throughput --contents 200 --latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.database.models.content import Content, ContentMediaType
+from app.libs.rag.rag_utils import RAGUtils
+from app.libs.rag.ragflow_sdk.async_ragflow import AsyncRAGFlow
+from app.libs.rag.ragflow_sdk.ragflow import RAGFlow
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def _reply(self, payload: dict):
+        time.sleep(self.latency)
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        # 数据集都不存在，走创建流程
+        self._reply({"code": 102, "message": "Dataset not found"})
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.split("?")[0]
+        if path.endswith("/datasets"):
+            self._reply({"code": 0, "data": {"id": uuid.uuid4().hex, "name": "benchmark"}})
+        elif path.endswith("/documents"):
+            files = body.count(b'name="file"')
+            self._reply({"code": 0, "data": [{"id": uuid.uuid4().hex} for _ in range(files)]})
+        else:
+            self._reply({"code": 0})
+
+    def do_DELETE(self):
+        self._read_body()
+        self._reply({"code": 0})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_contents(prefix: str, count: int, size: int) -> list:
+    text = ("Benchmark paragraph for RAG ingestion throughput. " * (size // 50 + 1))[:size]
+    return [
+        Content(
+            id=index + 1,
+            uid=f"{prefix}-{index}",
+            title=f"Benchmark article {index}",
+            media_type=ContentMediaType.article,
+            content=text,
+        )
+        for index in range(count)
+    ]
+
+
+async def run_sequential(utils: RAGUtils, contents: list, batch_size: int) -> int:
+    started = 0
+    for content in contents:
+        _, _, ok = await utils.process_and_upload_file(content)
+        started += int(ok)
+    return started
+
+
+async def run_batch(utils: RAGUtils, contents: list, batch_size: int) -> int:
+    started = 0
+    for start in range(0, len(contents), batch_size):
+        started += len(await utils.process_and_upload_batch(contents[start:start + batch_size]))
+    return started
+
+
+MODES = {
+    "per-content": run_sequential,
+    "batch": run_batch,
+}
+
+
+async def run(args, base_url: str):
+    client = RAGFlow(api_key="benchmark", base_url=base_url, pool_size=max(10, args.batch_size))
+    async_client = AsyncRAGFlow(api_key="benchmark", base_url=base_url, pool_size=max(10, args.batch_size))
+    utils = RAGUtils(client, async_client)
+    print(f"{'mode':<16}{'docs':>8}{'elapsed_s':>12}{'docs_per_min':>14}")
+    try:
+        for mode, runner in MODES.items():
+            contents = build_contents(mode, args.contents, args.size)
+            start = time.perf_counter()
+            started = await runner(utils, contents, args.batch_size)
+            elapsed = time.perf_counter() - start
+            print(f"{mode:<16}{started:>8}{elapsed:>12.2f}{started / elapsed * 60:>14.0f}")
+    finally:
+        client.close()
+        await async_client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--contents", type=int, default=200)
+    parser.add_argument("--size", type=int, default=20000, help="characters per article")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        asyncio.run(run(args, f"http://127.0.0.1:{server.server_address[1]}"))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Per-call latency of the RAGFlow SDK client: one connection per call vs pooled session.
+
+Starts a local keep-alive stub of the RAGFlow API and issues the same GET
+through module-level requests.get (previous client behaviour) and through
+the pooled RAGFlow client.
+
+Usage:
+    python -m benchmarks.ragflow_client_pooling --calls 500
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from app.libs.rag.ragflow_sdk.ragflow import RAGFlow
+
+RESPONSE_BODY = json.dumps({"code": 0, "data": []}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(call, calls: int) -> list:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    client = RAGFlow(api_key="benchmark", base_url=base_url)
+    url = client.api_url + "/datasets"
+
+    modes = {
+        "requests.get per call": lambda: requests.get(url, headers=client.authorization_header),
+        "pooled session": lambda: client.get("/datasets"),
+    }
+
+    print(f"{'mode':<24}{'mean_ms':>10}{'p50_ms':>10}{'p99_ms':>10}")
+    try:
+        for name, call in modes.items():
+            call()  # warm up
+            latencies = sorted(measure(call, args.calls))
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(
+                f"{name:<24}"
+                f"{statistics.mean(latencies):>10.3f}"
+                f"{statistics.median(latencies):>10.3f}"
+                f"{p99:>10.3f}"
+            )
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
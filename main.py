@@ -11,6 +11,7 @@ from app.libs.firebase.index import init_firebase_credential
 from app.database.models.content import Content, RAGProcessingStatus
 from app.database.repositories.content_repository import content_repository
 from app.libs.rag.rag_utils import rag_utils
+from app.libs.rag.rag_object import async_rag_object
 
 from app.http_middleware import CORSMiddleware, RequestLoggingMiddleware
 from app import (
@@ -148,7 +149,7 @@ async def startup():
 
 @app.on_event("shutdown")
 async def shutdown():
-    pass
+    await async_rag_object.aclose()
 
 if __name__ == "__main__":
     """Run the app in development mode."""